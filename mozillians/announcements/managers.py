@@ -1,8 +1,12 @@
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Q
+from django.db.models import Min, Q
 from django.utils.timezone import now
 
 
+PUBLISHED_CACHE_KEY = 'announcements_published'
+
+
 class AnnouncementManager(models.Manager):
     """Announcements Manager."""
     use_for_related_fields = True
@@ -15,6 +19,33 @@ class AnnouncementManager(models.Manager):
                             (Q(publish_until__isnull=False) &
                              Q(publish_until__gt=_now))))
 
+    def published_cached(self):
+        """Return the list of published announcements, latest first.
+
+        The list is cached until the next publish_from or publish_until
+        boundary, or until an announcement is saved or deleted.
+        """
+        _now = now()
+        cached = cache.get(PUBLISHED_CACHE_KEY)
+        if (cached and cached['computed'] <= _now and
+                (cached['valid_until'] is None or _now < cached['valid_until'])):
+            return cached['announcements']
+
+        announcements = list(self.published().order_by('-publish_from'))
+        for announcement in announcements:
+            announcement.prepare_rendering()
+        boundaries = [
+            self.filter(publish_from__gt=_now).aggregate(boundary=Min('publish_from')),
+            self.filter(publish_until__gt=_now).aggregate(boundary=Min('publish_until')),
+        ]
+        boundaries = [b['boundary'] for b in boundaries if b['boundary'] is not None]
+        cache.set(PUBLISHED_CACHE_KEY, {
+            'announcements': announcements,
+            'computed': _now,
+            'valid_until': min(boundaries) if boundaries else None,
+        }, timeout=None)
+        return announcements
+
     def unpublished(self):
         """Return unpublished announcements."""
         _now = now()
@@ -2,7 +2,9 @@ import os
 import uuid
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 
@@ -10,10 +12,12 @@ import bleach
 from jinja2 import Markup
 from sorl.thumbnail import ImageField
 
-from mozillians.announcements.managers import AnnouncementManager
+from mozillians.announcements.managers import PUBLISHED_CACHE_KEY, AnnouncementManager
+from mozillians.common.templatetags.helpers import get_image_variants
 
 
 ALLOWED_TAGS = ['em', 'strong', 'a', 'u']
+IMAGE_GEOMETRY = '60x60'
 
 
 def _calculate_image_filename(instance, filename):
@@ -48,8 +52,27 @@ class Announcement(models.Model):
         return ((self.publish_from <= _now) and
                 (self.publish_until > _now if self.publish_until else True))
 
+    def get_image_variants(self, geometry=IMAGE_GEOMETRY):
+        """Return the WebP and JPEG variants of the image, or None without an image."""
+        if not self.image:
+            return None
+        if geometry == IMAGE_GEOMETRY and hasattr(self, '_image_variants'):
+            return self._image_variants
+        return get_image_variants(self.image, geometry)
+
+    def prepare_rendering(self):
+        """Compute the image variants and the text markup ahead of rendering.
+
+        Used before caching announcements so that rendering them
+        needs no queries.
+        """
+        self._image_variants = self.get_image_variants()
+        self._template_text = self.get_template_text()
+
     def get_template_text(self):
         """Mark text as template safe so html tags are not escaped."""
+        if hasattr(self, '_template_text'):
+            return self._template_text
         return Markup(self.text)
 
     def __unicode__(self):
@@ -58,3 +81,9 @@ class Announcement(models.Model):
     class Meta:
         ordering = ['-publish_from']
         get_latest_by = 'publish_from'
+
+
+@receiver(models.signals.post_save, sender=Announcement)
+@receiver(models.signals.post_delete, sender=Announcement)
+def invalidate_published_announcements(sender, **kwargs):
+    cache.delete(PUBLISHED_CACHE_KEY)
@@ -6,7 +6,5 @@ from mozillians.announcements.models import Announcement
 @library.global_function
 def latest_announcement():
     """Return the latest published announcement or None."""
-
-    if Announcement.objects.published().count():
-        return Announcement.objects.published().latest()
-    return None
+    announcements = Announcement.objects.published_cached()
+    return announcements[0] if announcements else None
@@ -4,6 +4,7 @@ from datetime import datetime
 from mock import patch
 from nose.tools import eq_
 
+from django.core.cache import cache
 from django.utils.timezone import make_aware
 
 from mozillians.announcements.models import Announcement
@@ -57,3 +58,40 @@ class AnnouncementManagerTests(TestCase):
 
         mock_obj.return_value = make_aware(datetime(2013, 2, 24), pytz.UTC)
         eq_(Announcement.objects.unpublished().count(), 3)
+
+    @patch('mozillians.announcements.managers.now')
+    def test_published_cached(self, mock_obj):
+        """Test published_cached() of Announcement Manager."""
+        cache.clear()
+        mock_obj.return_value = make_aware(datetime(2013, 2, 13), pytz.UTC)
+        eq_(len(Announcement.objects.published_cached()), 1)
+
+        mock_obj.return_value = make_aware(datetime(2013, 2, 14), pytz.UTC)
+        with self.assertNumQueries(0):
+            eq_(len(Announcement.objects.published_cached()), 1)
+
+        # The next publish_from boundary expires the cached list
+        mock_obj.return_value = make_aware(datetime(2013, 2, 16), pytz.UTC)
+        announcements = Announcement.objects.published_cached()
+        eq_([a.publish_from.day for a in announcements], [15, 12])
+
+        # Going back before the cached list was computed
+        mock_obj.return_value = make_aware(datetime(2013, 2, 10), pytz.UTC)
+        eq_(Announcement.objects.published_cached(), [])
+
+        mock_obj.return_value = make_aware(datetime(2013, 2, 24), pytz.UTC)
+        eq_(Announcement.objects.published_cached(), [])
+        with self.assertNumQueries(0):
+            eq_(Announcement.objects.published_cached(), [])
+
+    @patch('mozillians.announcements.managers.now')
+    def test_published_cached_invalidation(self, mock_obj):
+        """Test that saving or deleting an announcement invalidates the cache."""
+        mock_obj.return_value = make_aware(datetime(2013, 2, 13), pytz.UTC)
+        announcement = Announcement.objects.published_cached()[0]
+        announcement.title = 'Changed'
+        announcement.save()
+        eq_(Announcement.objects.published_cached()[0].title, 'Changed')
+
+        announcement.delete()
+        eq_(Announcement.objects.published_cached(), [])
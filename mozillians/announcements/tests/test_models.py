@@ -32,3 +32,10 @@ class AnnouncementTests(TestCase):
         announcement = AnnouncementFactory.create(publish_from=datetime(2013, 2, 12))
         text = announcement.get_template_text()
         ok_(isinstance(text, Markup))
+
+    def test_prepare_rendering(self):
+        announcement = AnnouncementFactory.create(publish_from=datetime(2013, 2, 12))
+        announcement.prepare_rendering()
+        with self.assertNumQueries(0):
+            ok_(announcement.get_image_variants() is None)
+            ok_(isinstance(announcement.get_template_text(), Markup))
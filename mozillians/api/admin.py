@@ -29,10 +29,12 @@ class APIv2AppForm(forms.ModelForm):
 
 class APIv2AppAdmin(MozilliansAdminExportMixin, admin.ModelAdmin):
     """APIv2App Admin."""
-    list_display = ['name', 'owner', 'owner_email', 'privacy_level', 'enabled', 'last_used']
+    list_display = ['name', 'owner', 'owner_email', 'privacy_level', 'enabled', 'last_used',
+                    'requests_count', 'throttled_count', 'average_response_time']
     list_filter = ['privacy_level', 'enabled']
     search_fields = ['name', 'key', 'owner__user__username']
-    readonly_fields = ['last_used', 'created']
+    readonly_fields = ['last_used', 'created', 'requests_count', 'throttled_count',
+                       'average_response_time']
 
     def owner_email(self, obj):
         return obj.owner.email
@@ -40,6 +42,11 @@ class APIv2AppAdmin(MozilliansAdminExportMixin, admin.ModelAdmin):
     owner_email.admin_order_field = 'owner__user__email'
     owner_email.short_description = 'Email'
 
+    def average_response_time(self, obj):
+        return '{0} ms'.format(obj.average_response_time)
+
+    average_response_time.short_description = 'Avg response time'
+
     form = APIv2AppForm
     resource_class = APIv2AppResource
 
@@ -53,6 +60,9 @@ class APIv2AppAdmin(MozilliansAdminExportMixin, admin.ModelAdmin):
         ('Important dates', {
             'fields': ('created', 'last_used')
         }),
+        ('Usage', {
+            'fields': ('requests_count', 'throttled_count', 'average_response_time')
+        }),
         ('Key', {
             'fields': ('key',),
             'classes': ('collapse',)
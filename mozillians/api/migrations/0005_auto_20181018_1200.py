@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_auto_20171020_0219'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiv2app',
+            name='requests_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='apiv2app',
+            name='throttled_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='apiv2app',
+            name='total_response_time',
+            field=models.BigIntegerField(default=0, help_text=b'Total response time in ms.'),
+        ),
+    ]
@@ -25,6 +25,11 @@ class APIv2App(models.Model):
     privacy_level = PrivacyField(default=PUBLIC, choices=API_PRIVACY_CHOICES)
     created = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(auto_now_add=True)
+    # Usage counters, flushed periodically from the cache by flush_api_usage
+    requests_count = models.PositiveIntegerField(default=0)
+    throttled_count = models.PositiveIntegerField(default=0)
+    total_response_time = models.BigIntegerField(default=0,
+                                                 help_text='Total response time in ms.')
 
     class Meta:
         verbose_name_plural = 'APIv2 Apps'
@@ -41,6 +46,13 @@ class APIv2App(models.Model):
 
         return super(APIv2App, self).save(*args, **kwargs)
 
+    @property
+    def average_response_time(self):
+        """Return the average response time of the app requests in ms."""
+        if not self.requests_count:
+            return 0
+        return self.total_response_time / self.requests_count
+
     def generate_key(self):
         """Return a key."""
         new_uuid = uuid.uuid4()
@@ -0,0 +1,18 @@
+from django.db.models import F
+
+from mozillians.celery import app
+
+
+@app.task(ignore_result=True)
+def flush_api_usage():
+    """Persist the per key usage counters collected in the cache."""
+    from mozillians.api.models import APIv2App
+    from mozillians.api.v2.usage import pop_usage
+
+    app_ids = APIv2App.objects.values_list('id', flat=True)
+    for app_id, counters in pop_usage(list(app_ids)).items():
+        APIv2App.objects.filter(id=app_id).update(
+            requests_count=F('requests_count') + counters['requests'],
+            throttled_count=F('throttled_count') + counters['throttled'],
+            total_response_time=F('total_response_time') + counters['response_time']
+        )
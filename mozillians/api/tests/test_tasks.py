@@ -0,0 +1,42 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from mock import patch
+from nose.tools import eq_
+
+from mozillians.api.models import APIv2App
+from mozillians.api.tasks import flush_api_usage
+from mozillians.api.tests import APIv2AppFactory
+from mozillians.api.v2.usage import pop_usage, record_request, record_throttled
+from mozillians.common.tests import TestCase
+from mozillians.users.tests import UserFactory
+
+
+class FlushAPIUsageTests(TestCase):
+
+    def setUp(self):
+        cache = LocMemCache('usage', {})
+        patcher = patch('mozillians.api.v2.usage.cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush(self):
+        user = UserFactory.create()
+        app = APIv2AppFactory.create(owner=user.userprofile)
+        idle_app = APIv2AppFactory.create(owner=user.userprofile)
+
+        record_request(app.id, 100)
+        record_request(app.id, 50)
+        record_throttled(app.id)
+        flush_api_usage()
+
+        app = APIv2App.objects.get(id=app.id)
+        eq_(app.requests_count, 2)
+        eq_(app.throttled_count, 1)
+        eq_(app.average_response_time, 75)
+        eq_(APIv2App.objects.get(id=idle_app.id).requests_count, 0)
+
+        # Counters are reset after a flush
+        eq_(pop_usage([app.id]), {})
+        record_request(app.id, 30)
+        flush_api_usage()
+        eq_(APIv2App.objects.get(id=app.id).requests_count, 3)
@@ -0,0 +1,61 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.client import RequestFactory
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.api.tests import APIv2AppFactory
+from mozillians.api.v2.throttling import APIv2AppRateThrottle
+from mozillians.common.tests import TestCase
+from mozillians.users.managers import MOZILLIANS, PRIVATE, PUBLIC
+from mozillians.users.tests import UserFactory
+
+
+THROTTLE_RATES = {
+    'apiv2_private': None,
+    'apiv2_mozillians': '3/min',
+    'apiv2_public': '2/min',
+}
+
+
+@patch.object(APIv2AppRateThrottle, 'THROTTLE_RATES', THROTTLE_RATES)
+class APIv2AppRateThrottleTests(TestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('throttling', {})
+        self.user = UserFactory.create()
+
+    def _allow_request(self, app):
+        request = RequestFactory().get('/')
+        request.api_app = app
+        throttle = APIv2AppRateThrottle()
+        throttle.cache = self.cache
+        return throttle.allow_request(request, None)
+
+    def test_no_app(self):
+        request = RequestFactory().get('/')
+        ok_(APIv2AppRateThrottle().allow_request(request, None))
+
+    @patch('mozillians.api.v2.throttling.record_throttled')
+    def test_quota_per_privacy_level(self, record_throttled_mock):
+        public_app = APIv2AppFactory.create(owner=self.user.userprofile, privacy_level=PUBLIC)
+        mozillians_app = APIv2AppFactory.create(owner=self.user.userprofile,
+                                                privacy_level=MOZILLIANS)
+
+        eq_([self._allow_request(public_app) for i in range(3)], [True, True, False])
+        eq_([self._allow_request(mozillians_app) for i in range(4)], [True, True, True, False])
+        eq_(record_throttled_mock.call_count, 2)
+        record_throttled_mock.assert_called_with(mozillians_app.id)
+
+    def test_quota_per_key(self):
+        app = APIv2AppFactory.create(owner=self.user.userprofile, privacy_level=PUBLIC)
+        other_app = APIv2AppFactory.create(owner=self.user.userprofile, privacy_level=PUBLIC)
+
+        self._allow_request(app)
+        self._allow_request(app)
+        ok_(not self._allow_request(app))
+        ok_(self._allow_request(other_app))
+
+    def test_unlimited(self):
+        app = APIv2AppFactory.create(owner=self.user.userprofile, privacy_level=PRIVATE)
+        ok_(all(self._allow_request(app) for i in range(10)))
@@ -23,6 +23,7 @@ class MozilliansPermission(BasePermission):
                 return False
 
             request.privacy_level = app.privacy_level
+            request.api_app = app
 
             APIv2App.objects.filter(id=app.id).update(last_used=now())
 
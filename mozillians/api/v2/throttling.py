@@ -0,0 +1,45 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+from mozillians.api.v2.usage import record_throttled
+from mozillians.users.managers import MOZILLIANS, PRIVATE, PUBLIC
+
+
+PRIVACY_LEVEL_SCOPES = {
+    PRIVATE: 'apiv2_private',
+    MOZILLIANS: 'apiv2_mozillians',
+    PUBLIC: 'apiv2_public',
+}
+
+
+class APIv2AppRateThrottle(SimpleRateThrottle):
+    """Sliding window rate limit keyed on the APIv2App key.
+
+    The quota depends on the privacy level of the app and is configured
+    through the `apiv2_<level>` scopes of DEFAULT_THROTTLE_RATES. A rate of
+    None disables throttling for that level.
+    """
+
+    def __init__(self):
+        # The scope is only known once the API key is resolved,
+        # so the rate is parsed in allow_request().
+        pass
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.api_app.key
+        }
+
+    def allow_request(self, request, view):
+        app = getattr(request, 'api_app', None)
+        if not app:
+            return True
+
+        self.scope = PRIVACY_LEVEL_SCOPES.get(app.privacy_level, PRIVACY_LEVEL_SCOPES[PUBLIC])
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        allowed = super(APIv2AppRateThrottle, self).allow_request(request, view)
+        if not allowed:
+            record_throttled(app.id)
+        return allowed
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+
+
+USAGE_COUNTERS = ('requests', 'throttled', 'response_time')
+USAGE_CACHE_KEY = 'apiv2_usage_{counter}_{app_id}'
+
+
+def _usage_key(app_id, counter):
+    return USAGE_CACHE_KEY.format(counter=counter, app_id=app_id)
+
+
+def _incr(key, delta):
+    """Atomically increment a counter in the cache, creating it if missing."""
+    if not cache.add(key, delta, timeout=None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # The key expired between add() and incr()
+            cache.set(key, delta, timeout=None)
+
+
+def record_request(app_id, response_time):
+    """Record a request and its response time (in ms) for an APIv2App."""
+    _incr(_usage_key(app_id, 'requests'), 1)
+    _incr(_usage_key(app_id, 'response_time'), int(response_time))
+
+
+def record_throttled(app_id):
+    """Record a request rejected by the rate limiter for an APIv2App."""
+    _incr(_usage_key(app_id, 'throttled'), 1)
+
+
+def pop_usage(app_ids):
+    """Return and reset the pending usage counters of the given apps.
+
+    Counters are decremented by the value read instead of being
+    deleted, so requests recorded while flushing are not lost.
+    """
+    keys = dict(((app_id, counter), _usage_key(app_id, counter))
+                for app_id in app_ids for counter in USAGE_COUNTERS)
+    values = cache.get_many(keys.values())
+
+    usage = {}
+    for (app_id, counter), key in keys.items():
+        value = values.get(key)
+        if not value:
+            continue
+        cache.decr(key, value)
+        usage.setdefault(app_id, dict.fromkeys(USAGE_COUNTERS, 0))[counter] = value
+    return usage
@@ -1,12 +1,60 @@
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import never_cache
+import calendar
+import time
+from hashlib import md5
+
+from django.utils.cache import (add_never_cache_headers, get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from mozillians.api.v2.usage import record_request
+
+
+def make_etag(*parts):
+    """Return a quoted ETag computed from the given validator parts."""
+    return quote_etag(md5(':'.join(str(part) for part in parts)).hexdigest())
+
+
+def _timestamp(value):
+    return calendar.timegm(value.utctimetuple())
+
 
 class NoCacheReadOnlyModelViewSet(ReadOnlyModelViewSet):
-    """DRF ReadOnlyModelViewSet with non-cached responses."""
+    """DRF ReadOnlyModelViewSet with non-cached responses.
+
+    Responses carrying an ETag can be stored by clients but they must be
+    revalidated with a conditional request every time.
+    """
 
-    @method_decorator(never_cache)
     def dispatch(self, *args, **kwargs):
-        return super(NoCacheReadOnlyModelViewSet, self).dispatch(*args, **kwargs)
+        start = time.time()
+        response = super(NoCacheReadOnlyModelViewSet, self).dispatch(*args, **kwargs)
+
+        if response.has_header('ETag'):
+            patch_cache_control(response, private=True, no_cache=True,
+                                must_revalidate=True, max_age=0)
+            patch_vary_headers(response, ('X-API-KEY',))
+        else:
+            add_never_cache_headers(response)
+
+        # Meter the request against the APIv2App resolved by MozilliansPermission
+        app = getattr(self.request, 'api_app', None)
+        if app:
+            record_request(app.id, (time.time() - start) * 1000)
+        return response
+
+    def get_not_modified_response(self, etag, last_modified=None):
+        """Return a 304 response if the client copy is fresh, else None."""
+        timestamp = _timestamp(last_modified) if last_modified else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified=None):
+        """Add the ETag and Last-Modified headers to a response."""
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(_timestamp(last_modified))
+        return response
@@ -12,6 +12,8 @@ from django.conf import settings  # noqa
 RUN_DAILY = 60 * 60 * 24
 RUN_HOURLY = 60 * 60
 RUN_EVERY_SIX_HOURS = 6 * 60 * 60
+RUN_EVERY_FIFTEEN_MINUTES = 15 * 60
+RUN_EVERY_MINUTE = 60
 
 
 class Celery(BaseCelery):
@@ -56,9 +58,40 @@ app.conf.beat_schedule = {
     #     'schedule': RUN_EVERY_SIX_HOURS,
     #     'args': ()
     # },
+    'flush-api-usage': {
+        'task': 'mozillians.api.tasks.flush_api_usage',
+        'schedule': RUN_HOURLY,
+        'args': ()
+    },
     'remove-incomplete-accounts': {
         'task': 'mozillians.users.tasks.remove_incomplete_accounts',
         'schedule': RUN_HOURLY,
         'args': ()
+    },
+    'refresh-orgchart': {
+        'task': 'mozillians.phonebook.tasks.refresh_orgchart_task',
+        'schedule': RUN_EVERY_FIFTEEN_MINUTES,
+        'args': ()
+    },
+    'generate-missing-photo-thumbnails': {
+        'task': 'mozillians.users.tasks.generate_missing_photo_thumbnails',
+        'schedule': RUN_DAILY,
+        'args': ()
+    },
+    'update-funfact-values': {
+        'task': 'mozillians.funfacts.tasks.update_funfact_values',
+        'schedule': RUN_HOURLY,
+        'args': ()
+    },
+    # Sends retried emails and anything left by a failed drain
+    'drain-outbox': {
+        'task': 'mozillians.mailer.tasks.drain_outbox',
+        'schedule': RUN_EVERY_MINUTE,
+        'args': ()
+    },
+    'purge-outbox': {
+        'task': 'mozillians.mailer.tasks.purge_outbox',
+        'schedule': RUN_DAILY,
+        'args': ()
     }
 }
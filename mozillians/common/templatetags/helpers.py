@@ -26,6 +26,10 @@ from mozillians.common import utils
 from mozillians.users.managers import PUBLIC
 
 GRAVATAR_URL = 'https://secure.gravatar.com/avatar/{emaildigest}'
+# Encodings of image variants with their mime types, smallest first
+IMAGE_VARIANT_FORMATS = (('WEBP', 'image/webp'), ('JPEG', 'image/jpeg'))
+# Pixel densities of image variants
+IMAGE_VARIANT_DENSITIES = (1, 2)
 
 
 @library.global_function
@@ -64,7 +68,13 @@ def urlparams(url_, hash=None, **query):
 
 def gravatar(email, default_avatar_url=settings.DEFAULT_AVATAR_URL, size=175, rating='pg'):
     """Return the Gravatar URL for an email address."""
-    url = GRAVATAR_URL.format(emaildigest=md5(email).hexdigest())
+    return gravatar_url(md5(email).hexdigest(), default_avatar_url, size, rating)
+
+
+def gravatar_url(emaildigest, default_avatar_url=settings.DEFAULT_AVATAR_URL, size=175,
+                 rating='pg'):
+    """Return the Gravatar URL for the md5 digest of an email address."""
+    url = GRAVATAR_URL.format(emaildigest=emaildigest)
     url = urlparams(url, d=default_avatar_url, s=size, r=rating)
     return url
 
@@ -122,6 +132,46 @@ def thumbnail(img, geometry, **kwargs):
     return get_thumbnail(img, geometry, **kwargs)
 
 
+def _scale_geometry(geometry, density):
+    return 'x'.join(str(int(size) * density) if size else '' for size in geometry.split('x'))
+
+
+@library.global_function
+def get_image_variants(img, geometry, **kwargs):
+    """Return srcset-ready thumbnails of an image in every variant format.
+
+    The result holds the url of the 1x JPEG thumbnail under 'src' and the
+    srcset attribute values of each format keyed by mime type under
+    'srcset'.
+    """
+    variants = {'srcset': {}}
+    for image_format, mime_type in IMAGE_VARIANT_FORMATS:
+        urls = []
+        for density in IMAGE_VARIANT_DENSITIES:
+            url = get_thumbnail(img, _scale_geometry(geometry, density), format=image_format,
+                                **kwargs).url
+            if density == 1 and image_format == 'JPEG':
+                variants['src'] = url
+            urls.append('{0} {1}x'.format(url, density))
+        variants['srcset'][mime_type] = ', '.join(urls)
+    return variants
+
+
+@library.global_function
+def picture(variants, alt='', css_class=''):
+    """Render a <picture> element for the output of get_image_variants().
+
+    Browsers pick the smallest format they support at their pixel density.
+    """
+    sources = [Markup(u'<source type="{0}" srcset="{1}">').format(mime_type,
+                                                                  variants['srcset'][mime_type])
+               for image_format, mime_type in IMAGE_VARIANT_FORMATS
+               if mime_type != 'image/jpeg']
+    img = Markup(u'<img src="{0}" srcset="{1}" alt="{2}" class="{3}">').format(
+        variants['src'], variants['srcset']['image/jpeg'], alt, css_class)
+    return Markup(u'<picture>{0}{1}</picture>').format(Markup(u'').join(sources), img)
+
+
 def redirect(to, *args, **kwargs):
     """Redirect with locale support."""
     url = reverse(to, args=args, kwargs=kwargs)
@@ -306,19 +356,66 @@ def get_privacy_level(request):
     return privacy_level
 
 
+@library.global_function
+def get_privacy_aware_photo_variants(profile, privacy_level, geometry):
+    """Return the image variants of a visible profile photo, or None."""
+    cached_variants = getattr(profile, '_privacy_aware_photo_variants', {})
+    if (privacy_level, geometry) in cached_variants:
+        return cached_variants[(privacy_level, geometry)]
+
+    if profile.privacy_photo >= privacy_level and profile.photo:
+        return profile.get_photo_variants(geometry)
+    return None
+
+
 @library.global_function
 def get_privacy_aware_photo_url(profile, privacy_level, geometry, **kwargs):
     """Returns privacy aware profile photo url."""
+    cached_urls = getattr(profile, '_privacy_aware_photo_urls', {})
+    if not kwargs and (privacy_level, geometry) in cached_urls:
+        return cached_urls[(privacy_level, geometry)]
 
     if profile.privacy_photo >= privacy_level:
         if not profile.photo:
-            return gravatar(profile.email, size=geometry)
-        return profile.get_photo_thumbnail(geometry, **kwargs).url
+            return profile._get_gravatar_url(geometry)
+        return profile.get_photo_thumbnail_url(geometry, **kwargs)
 
     profile.photo = ''
     return profile.get_photo_thumbnail(geometry, **kwargs).url
 
 
+def set_privacy_aware_photo_urls(profiles, privacy_level, geometry):
+    """Compute the privacy aware photo urls and variants of a page of profiles at once.
+
+    The gravatar query string and the default avatar thumbnail are built
+    once for the page. get_privacy_aware_photo_url() and
+    get_privacy_aware_photo_variants() return the computed values.
+    """
+    # The digest is the last path segment of gravatar urls
+    gravatar_prefix, gravatar_query = gravatar_url('', size=geometry).split('?', 1)
+    default_url = None
+    for profile in profiles:
+        variants = None
+        if profile.privacy_photo < privacy_level:
+            if default_url is None:
+                default_url = get_thumbnail(settings.DEFAULT_AVATAR_PATH, geometry,
+                                            crop='center').url
+            url = default_url
+        elif profile.photo:
+            variants = profile.get_photo_variants(geometry)
+            url = variants['src'] if variants else profile.get_photo_thumbnail_url(geometry)
+        elif profile.gravatar_hash:
+            url = '{0}{1}?{2}'.format(gravatar_prefix, profile.gravatar_hash, gravatar_query)
+        else:
+            url = gravatar(profile.email, size=geometry)
+
+        if not hasattr(profile, '_privacy_aware_photo_urls'):
+            profile._privacy_aware_photo_urls = {}
+            profile._privacy_aware_photo_variants = {}
+        profile._privacy_aware_photo_urls[(privacy_level, geometry)] = url
+        profile._privacy_aware_photo_variants[(privacy_level, geometry)] = variants
+
+
 # Port from jingo.helpers
 
 
@@ -1,3 +1,5 @@
+import json
+
 from django.template import engines
 from django.test.utils import override_settings
 from django.utils.timezone import is_aware
@@ -5,12 +7,14 @@ from django.utils.timezone import is_aware
 from bleach import clean
 from datetime import datetime
 from markdown import markdown
-from mock import patch
+from mock import Mock, patch
 from nose.tools import eq_, ok_
 from pytz import utc
 
 from mozillians.common.templatetags import helpers
 from mozillians.common.tests import TestCase
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.tests import UserFactory
 
 
 class HelperTests(TestCase):
@@ -23,6 +27,57 @@ class HelperTests(TestCase):
                          '39b808083f0031a56e9872?s=80&r=bar&d='
                          '%2Fmedia%2Fimg%2Fdefault_avatar.png'))
 
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    def test_set_privacy_aware_photo_urls(self, get_thumbnail_mock):
+        get_thumbnail_mock.return_value.url = '/default.png'
+        public = UserFactory.create(userprofile={'privacy_photo': PUBLIC}).userprofile
+        private = UserFactory.create(userprofile={'privacy_photo': MOZILLIANS}).userprofile
+
+        helpers.set_privacy_aware_photo_urls([public, private], PUBLIC, '70x70')
+        eq_(get_thumbnail_mock.call_count, 1)
+        eq_(helpers.get_privacy_aware_photo_url(public, PUBLIC, '70x70'),
+            helpers.gravatar(public.email, size='70x70'))
+        eq_(helpers.get_privacy_aware_photo_url(private, PUBLIC, '70x70'), '/default.png')
+        eq_(get_thumbnail_mock.call_count, 1)
+
+    @patch('mozillians.users.models.UserProfile.get_photo_thumbnail_url')
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    def test_set_privacy_aware_photo_variants(self, get_thumbnail_mock, thumbnail_url_mock):
+        thumbnail_url_mock.return_value = '/pending.jpeg'
+        variants = {'src': '/70.jpeg', 'srcset': {'image/webp': '/70.webp 1x',
+                                                  'image/jpeg': '/70.jpeg 1x'}}
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            stored = UserFactory.create(userprofile={
+                'privacy_photo': PUBLIC, 'photo': 'foo',
+                'photo_thumbnails': json.dumps({'photo': 'foo', 'variants': {'70x70': variants}})
+            }).userprofile
+            pending = UserFactory.create(userprofile={'privacy_photo': PUBLIC,
+                                                      'photo': 'bar'}).userprofile
+
+        helpers.set_privacy_aware_photo_urls([stored, pending], PUBLIC, '70x70')
+        eq_(helpers.get_privacy_aware_photo_variants(stored, PUBLIC, '70x70'), variants)
+        eq_(helpers.get_privacy_aware_photo_url(stored, PUBLIC, '70x70'), '/70.jpeg')
+        # Variants are not generated at render time
+        eq_(helpers.get_privacy_aware_photo_variants(pending, PUBLIC, '70x70'), None)
+        eq_(helpers.get_privacy_aware_photo_url(pending, PUBLIC, '70x70'), '/pending.jpeg')
+        eq_(thumbnail_url_mock.call_count, 1)
+        ok_(not get_thumbnail_mock.called)
+
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    def test_image_variants(self, get_thumbnail_mock):
+        get_thumbnail_mock.side_effect = lambda source, geometry, format, **kwargs: Mock(
+            url='/{0}.{1}'.format(geometry, format.lower()))
+        variants = helpers.get_image_variants('foo', '60', crop='center')
+        eq_(variants, {'src': '/60.jpeg',
+                       'srcset': {'image/webp': '/60.webp 1x, /120.webp 2x',
+                                  'image/jpeg': '/60.jpeg 1x, /120.jpeg 2x'}})
+        get_thumbnail_mock.assert_called_with('foo', '120', format='JPEG', crop='center')
+
+        eq_(helpers.picture(variants, alt='<foo>', css_class='photo'),
+            '<picture><source type="image/webp" srcset="/60.webp 1x, /120.webp 2x">'
+            '<img src="/60.jpeg" srcset="/60.jpeg 1x, /120.jpeg 2x" alt="&lt;foo&gt;" '
+            'class="photo"></picture>')
+
     @patch('mozillians.common.templatetags.helpers.markdown_module.markdown', wraps=markdown)
     @patch('mozillians.common.templatetags.helpers.bleach.clean', wraps=clean)
     def test_markdown(self, clean_mock, markdown_mock):
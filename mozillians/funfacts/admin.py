@@ -5,7 +5,7 @@ from models import FunFact
 
 
 class FunFactAdmin(MozilliansAdminExportMixin, admin.ModelAdmin):
-    readonly_fields = ['result', 'created', 'updated']
+    readonly_fields = ['result', 'value', 'value_updated', 'created', 'updated']
     list_display = ['name', 'created', 'updated', 'result', 'is_published']
 
     def is_published(self, obj):
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funfacts', '0003_auto_20180110_0726'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funfact',
+            name='value',
+            field=models.CharField(default='', max_length=255, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='funfact',
+            name='value_updated',
+            field=models.DateTimeField(null=True, editable=False),
+        ),
+    ]
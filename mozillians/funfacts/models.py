@@ -1,6 +1,11 @@
-# Unused imports for user-defined queries to execute.
+import random
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.dispatch import receiver
+from django.utils.timezone import now
+# Unused imports for user-defined queries to execute.
 from django.db.models import Count, Avg, Min, Max  # noqa
 
 import bleach
@@ -10,6 +15,7 @@ from mozillians.mozspaces.models import MozSpace  # noqa
 from mozillians.users.models import Language, UserProfile  # noqa
 
 ALLOWED_TAGS = ['em', 'strong']
+PUBLISHED_IDS_CACHE_KEY = 'funfacts_published_ids'
 
 
 def _validate_query(query):
@@ -35,12 +41,31 @@ class FunFactManager(models.Manager):
         """Return unpublished funfacts."""
         return FunFact.objects.filter(published=False)
 
+    def published_ids(self):
+        """Return the ids of the published funfacts with a computed value.
+
+        The list is cached until a funfact is saved or deleted.
+        """
+        ids = cache.get(PUBLISHED_IDS_CACHE_KEY)
+        if ids is None:
+            ids = list(self.published().exclude(value_updated=None).values_list('id', flat=True))
+            cache.set(PUBLISHED_IDS_CACHE_KEY, ids, timeout=None)
+        return ids
+
     def random(self):
-        """Return random picked fact or None."""
-        query = FunFact.objects.filter(published=True).order_by('?')
-        if query.count():
-            return query[0]
-        return None
+        """Return random picked fact or None.
+
+        Until the values of the published facts are first computed, for
+        example right after deploying the value fields, a fact is computed
+        on the spot.
+        """
+        ids = self.published_ids()
+        if not ids:
+            fact = self.published().order_by('?').first()
+            if fact:
+                fact.update_value()
+            return fact
+        return FunFact.objects.filter(pk=random.choice(ids)).first()
 
 
 class FunFact(models.Model):
@@ -57,6 +82,9 @@ class FunFact(models.Model):
                               blank=True, default='')
     divisor = models.TextField(max_length=1000, blank=True, null=True,
                                validators=[_validate_query])
+    # Result of execute(), computed periodically by update_funfact_values
+    value = models.CharField(max_length=255, blank=True, default='', editable=False)
+    value_updated = models.DateTimeField(null=True, editable=False)
 
     class Meta:
         ordering = ['created']
@@ -79,3 +107,29 @@ class FunFact(models.Model):
                     return '%d' % eval(self.number)['number']
             except Exception, exp:
                 return 'Error: %s' % exp
+
+    def update_value(self):
+        """Execute the fact queries and store the result."""
+        first_value = self.value_updated is None
+        self.value = (self.execute() or '')[:255]
+        self.value_updated = now()
+        # Avoid bumping `updated` and the save signals
+        FunFact.objects.filter(pk=self.pk).update(value=self.value,
+                                                  value_updated=self.value_updated)
+        if first_value:
+            cache.delete(PUBLISHED_IDS_CACHE_KEY)
+
+
+@receiver(models.signals.post_save, sender=FunFact)
+def update_published_funfact(sender, instance, raw, **kwargs):
+    cache.delete(PUBLISHED_IDS_CACHE_KEY)
+    if instance.published and not raw:
+        # Avoid circular imports
+        from mozillians.funfacts.tasks import update_funfact_value
+
+        update_funfact_value.delay(instance.id)
+
+
+@receiver(models.signals.post_delete, sender=FunFact)
+def delete_published_funfact(sender, instance, **kwargs):
+    cache.delete(PUBLISHED_IDS_CACHE_KEY)
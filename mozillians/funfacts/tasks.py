@@ -0,0 +1,20 @@
+from mozillians.celery import app
+
+
+@app.task(ignore_result=True)
+def update_funfact_value(fact_id):
+    """Compute the value of a single funfact."""
+    from mozillians.funfacts.models import FunFact
+
+    fact = FunFact.objects.filter(pk=fact_id, published=True).first()
+    if fact:
+        fact.update_value()
+
+
+@app.task(ignore_result=True)
+def update_funfact_values():
+    """Recompute the values of all published funfacts."""
+    from mozillians.funfacts.models import FunFact
+
+    for fact in FunFact.objects.published():
+        fact.update_value()
@@ -6,7 +6,4 @@ from mozillians.funfacts.models import FunFact
 @library.global_function
 def random_funfact():
     """Returns random funfact or None."""
-
-    if FunFact.objects.published().count():
-        return FunFact.objects.random()
-    return None
+    return FunFact.objects.random()
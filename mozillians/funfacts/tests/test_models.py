@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.test import TestCase
@@ -40,11 +41,39 @@ class FunFactManagerTests(TestCase):
         facts = FunFact.objects.unpublished()
         eq_(set(facts), set([self.unpublished_1]))
 
-    @patch('mozillians.funfacts.models.FunFact')
-    def test_random(self, funfact_mock):
-        FunFact.objects.random()
-        funfact_mock.objects.filter.assert_called_once_with(published=True)
-        funfact_mock.objects.filter.return_value.order_by.assert_called_once_with('?')
+    def test_random(self):
+        ok_(FunFact.objects.random() in [self.published_1, self.published_2])
+
+    def test_random_no_aggregate_queries(self):
+        FunFact.objects.published_ids()
+        with self.assertNumQueries(1):
+            FunFact.objects.random()
+
+    def test_random_none(self):
+        FunFact.objects.all().delete()
+        eq_(FunFact.objects.random(), None)
+
+    def test_published_ids_invalidated(self):
+        eq_(set(FunFact.objects.published_ids()),
+            set([self.published_1.id, self.published_2.id]))
+        self.published_1.published = False
+        self.published_1.save()
+        eq_(FunFact.objects.published_ids(), [self.published_2.id])
+        self.published_2.delete()
+        eq_(FunFact.objects.published_ids(), [])
+
+    def test_published_ids_without_value(self):
+        cache.clear()
+        FunFact.objects.update(value_updated=None)
+        eq_(FunFact.objects.published_ids(), [])
+
+    def test_random_without_value(self):
+        cache.clear()
+        FunFact.objects.update(value='', value_updated=None)
+        fact = FunFact.objects.random()
+        ok_(fact in [self.published_1, self.published_2])
+        eq_(fact.value, fact.execute())
+        eq_(FunFact.objects.published_ids(), [fact.id])
 
 
 class FunFactTests(TestCase):
@@ -64,6 +93,25 @@ class FunFactTests(TestCase):
         fact.execute()
         transaction_mock.atomic.assert_called_once_with()
 
+    def test_update_value(self):
+        fact = FunFactFactory.create(published=True)
+        FunFact.objects.filter(pk=fact.pk).update(value='', value_updated=None)
+        updated = FunFact.objects.get(pk=fact.pk).updated
+        fact = FunFact.objects.get(pk=fact.pk)
+        fact.update_value()
+        fact = FunFact.objects.get(pk=fact.pk)
+        eq_(fact.value, '0')
+        ok_(fact.value_updated)
+        eq_(fact.updated, updated)
+
+    @patch('mozillians.funfacts.tasks.update_funfact_value.delay')
+    def test_save_queues_value_update(self, task_mock):
+        fact = FunFactFactory.create()
+        ok_(not task_mock.called)
+        fact.published = True
+        fact.save()
+        task_mock.assert_called_once_with(fact.id)
+
     @patch('mozillians.funfacts.models.transaction', wraps=transaction)
     def test_execute_invalid_funfact(self, transaction_mock):
         fact = FunFactFactory.create(number='number')
@@ -0,0 +1,17 @@
+from django.test import TestCase
+
+from nose.tools import eq_
+
+from mozillians.funfacts.models import FunFact
+from mozillians.funfacts.tasks import update_funfact_values
+from mozillians.funfacts.tests import FunFactFactory
+
+
+class UpdateFunFactValuesTests(TestCase):
+    def test_update_published(self):
+        published = FunFactFactory.create(published=True)
+        unpublished = FunFactFactory.create()
+        FunFact.objects.update(value='', value_updated=None)
+        update_funfact_values()
+        eq_(FunFact.objects.get(pk=published.pk).value, '0')
+        eq_(FunFact.objects.get(pk=unpublished.pk).value_updated, None)
@@ -0,0 +1,139 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull
+from graphql.utils.get_operation_ast import get_operation_ast
+
+from mozillians.graphql.snapshot import get_profile_snapshot
+from mozillians.users.schema import LOCAL_PROFILES_LIMIT
+
+
+COST_BUDGET_CACHE_KEY = 'graphql_cost_{client}_{window}'
+
+
+class QueryAnalysis(object):
+    """Static estimation of the depth and cost of a GraphQL query.
+
+    Every resolved field costs one unit. Fields below a list are counted
+    once per estimated list item.
+    """
+
+    def __init__(self, schema, document_ast, operation_name=None, variables=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = dict((definition.name.value, definition)
+                              for definition in document_ast.definitions
+                              if isinstance(definition, ast.FragmentDefinition))
+        self.depth = 0
+        self.cost = 0
+
+        operation = get_operation_ast(document_ast, operation_name)
+        if operation and operation.operation == 'query':
+            self.cost, self.depth = self._analyze(operation.selection_set,
+                                                  schema.get_query_type(), 1, 0)
+
+    def _argument_value(self, node):
+        if isinstance(node, ast.Variable):
+            return self.variables.get(node.name.value)
+        if isinstance(node, ast.ListValue):
+            return [self._argument_value(value) for value in node.values]
+        return getattr(node, 'value', None)
+
+    def _list_size(self, parent_type, field):
+        arguments = dict((argument.name.value, self._argument_value(argument.value))
+                         for argument in field.arguments or [])
+        estimator = LIST_SIZE_ESTIMATORS.get((parent_type.name, field.name.value))
+        if estimator:
+            return estimator(arguments)
+        return settings.GRAPHQL_DEFAULT_LIST_SIZE
+
+    def _analyze(self, selection_set, parent_type, multiplier, depth):
+        cost = 0
+        max_depth = depth
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                name = selection.name.value
+                # Introspection is served from the schema and is free
+                if name.startswith('__'):
+                    continue
+                field = getattr(parent_type, 'fields', {}).get(name)
+                if field is None:
+                    continue
+
+                cost += multiplier
+                max_depth = max(max_depth, depth + 1)
+                if selection.selection_set:
+                    field_type, is_list = field.type, False
+                    while isinstance(field_type, (GraphQLList, GraphQLNonNull)):
+                        is_list = is_list or isinstance(field_type, GraphQLList)
+                        field_type = field_type.of_type
+                    size = self._list_size(parent_type, selection) if is_list else 1
+                    sub_cost, sub_depth = self._analyze(selection.selection_set, field_type,
+                                                        multiplier * size, depth + 1)
+                    cost += sub_cost
+                    max_depth = max(max_depth, sub_depth)
+                continue
+
+            if isinstance(selection, ast.FragmentSpread):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                type_condition, sub_selection_set = fragment.type_condition, fragment.selection_set
+            else:
+                type_condition, sub_selection_set = (selection.type_condition,
+                                                     selection.selection_set)
+            fragment_type = parent_type
+            if type_condition:
+                fragment_type = self.schema.get_type(type_condition.name.value)
+            sub_cost, sub_depth = self._analyze(sub_selection_set, fragment_type,
+                                                multiplier, depth)
+            cost += sub_cost
+            max_depth = max(max_depth, sub_depth)
+
+        return cost, max_depth
+
+
+def _profiles_list_size(arguments):
+    if arguments.get('userId'):
+        return 1
+    if arguments.get('userIds') is not None:
+        return len(arguments['userIds'])
+    profiles = get_profile_snapshot().profiles
+    if profiles is not None:
+        return len(profiles)
+    return settings.GRAPHQL_PROFILES_LIST_SIZE
+
+
+def _local_profiles_list_size(arguments):
+    return min(arguments.get('limit') or LOCAL_PROFILES_LIMIT, LOCAL_PROFILES_LIMIT)
+
+
+# Estimated number of items of list fields, keyed by (parent type, field)
+LIST_SIZE_ESTIMATORS = {
+    ('Query', 'profiles'): _profiles_list_size,
+    ('Query', 'localProfiles'): _local_profiles_list_size,
+}
+
+
+def charge_cost_budget(client, cost):
+    """Charge cost to the budget of a client for the current window.
+
+    Return False, without charging, if the budget would be exceeded.
+    """
+    window = settings.GRAPHQL_COST_BUDGET_WINDOW
+    key = COST_BUDGET_CACHE_KEY.format(client=client, window=int(time.time() / window))
+    cache.add(key, 0, timeout=window)
+    try:
+        total = cache.incr(key, cost)
+    except ValueError:
+        # The key expired between add() and incr()
+        cache.set(key, cost, timeout=window)
+        total = cost
+
+    if total > settings.GRAPHQL_COST_BUDGET:
+        cache.decr(key, cost)
+        return False
+    return True
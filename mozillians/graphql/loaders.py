@@ -0,0 +1,21 @@
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from mozillians.graphql.snapshot import get_profile_snapshot
+
+
+class ProfileLoader(DataLoader):
+    """Batch and cache V2 profile lookups by user_id for a single request."""
+
+    def batch_load_fn(self, user_ids):
+        snapshot = get_profile_snapshot()
+        return Promise.resolve([snapshot.get_profile(user_id) for user_id in user_ids])
+
+
+def get_profile_loader(context):
+    """Return the ProfileLoader of the request, creating it on first use."""
+    loader = getattr(context, '_profile_loader', None)
+    if loader is None:
+        loader = ProfileLoader()
+        context._profile_loader = loader
+    return loader
@@ -0,0 +1,114 @@
+"""
+Benchmark the GraphQL profiles query against a synthetic V2 profile set.
+
+Measures a narrow query, selecting two attributes, and a full query over
+the whole profile list without touching the upstream endpoint.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from mozillians.graphql import snapshot as snapshot_module
+from mozillians.graphql.snapshot import ProfileSnapshot
+from mozillians.graphql.utils import json2obj
+from mozillians.schema import schema
+
+
+NARROW_QUERY = '{ profiles { userId { value } primaryEmail { value } } }'
+
+FULL_QUERY = '''{
+  profiles {
+    userId { value metadata { created lastModified classification verified } }
+    primaryEmail { value metadata { created lastModified } }
+    firstName { value } lastName { value }
+    created { value } lastModified { value }
+    identities { values { githubIdV3 LDAP bugzilla google firefoxaccounts emails } }
+    accessInformation { ldap { values } mozilliansorg { values } }
+    usernames { values } tags { values } timezone { value }
+  }
+}'''
+
+
+def _attribute(value, timestamp):
+    return {
+        'value': value,
+        'signature': {'publisher': {'alg': 'RS256', 'typ': 'JWT', 'value': ''}, 'additional': []},
+        'metadata': {'classification': 'PUBLIC', 'created': timestamp,
+                     'last_modified': timestamp, 'verified': True,
+                     'publisher_authority': 'mozilliansorg'},
+    }
+
+
+def _values(values, timestamp):
+    attribute = _attribute(None, timestamp)
+    del attribute['value']
+    attribute['values'] = values
+    return attribute
+
+
+def generate_profiles(count):
+    """Return a V2 document, encoded like the upstream endpoint, with count profiles."""
+    timestamp = '2018-10-18T12:00:00.000Z'
+    profiles = []
+    for i in range(count):
+        profiles.append({
+            'user_id': _attribute('ad|Mozilla-LDAP|user{0}'.format(i), timestamp),
+            'primary_email': _attribute('user{0}@example.com'.format(i), timestamp),
+            'first_name': _attribute('First{0}'.format(i), timestamp),
+            'last_name': _attribute('Last{0}'.format(i), timestamp),
+            'created': _attribute(timestamp, timestamp),
+            'last_modified': _attribute(timestamp, timestamp),
+            'identities': _values({'github_id_v3': str(i), 'LDAP': 'user{0}'.format(i),
+                                   'emails': ['user{0}@example.com'.format(i)]}, timestamp),
+            'access_information': {
+                'ldap': _values({'team_{0}'.format(i % 50): None}, timestamp),
+                'mozilliansorg': _values({'group_{0}'.format(i % 200): None}, timestamp),
+            },
+            'usernames': _values({'mozilliansorg': 'user{0}'.format(i)}, timestamp),
+            'tags': _values(['tag{0}'.format(i % 10)], timestamp),
+            'timezone': _attribute('UTC', timestamp),
+        })
+    return json.dumps(json.dumps(profiles))
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks narrow and full GraphQL profile queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=10000, type=int,
+                            help='Number of synthetic profiles, defaults to 10000.')
+        parser.add_argument('--repeat', default=3, type=int,
+                            help='Number of runs per query, the best run is reported.')
+
+    def _load(self, document):
+        snapshot = ProfileSnapshot(endpoint=None, ttl=float('inf'))
+        snapshot.profiles = json2obj(json.loads(document))
+        snapshot.index = dict((profile['user_id']['value'], profile)
+                              for profile in snapshot.profiles)
+        snapshot.fetched = time.time()
+        return snapshot
+
+    def handle(self, *args, **options):
+        document = generate_profiles(options['profiles'])
+        request = RequestFactory().post('/graphql/')
+        original = snapshot_module._snapshot
+        try:
+            for name, query in [('narrow', NARROW_QUERY), ('full', FULL_QUERY)]:
+                timings = []
+                for i in range(options['repeat']):
+                    # Every run starts from a freshly parsed snapshot
+                    start = time.time()
+                    snapshot_module._snapshot = self._load(document)
+                    parsed = time.time()
+                    result = schema.execute(query, context_value=request)
+                    timings.append((parsed - start, time.time() - parsed))
+                    if result.errors:
+                        self.stderr.write('{0} query failed: {1}'.format(name, result.errors))
+                        return
+                parse, execute = min(timings, key=sum)
+                self.stdout.write('{0}: parse {1:.3f}s, execute {2:.3f}s, total {3:.3f}s'.format(
+                    name, parse, execute, parse + execute))
+        finally:
+            snapshot_module._snapshot = original
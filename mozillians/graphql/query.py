@@ -1,27 +1,28 @@
 import graphene
-import requests
-
-from django.conf import settings
 
+from mozillians.graphql.loaders import get_profile_loader
 from mozillians.graphql.schema import CoreProfile
-from mozillians.graphql.utils import json2obj
+from mozillians.graphql.snapshot import get_profile_snapshot
 
 
 class Query(object):
     """GraphQL Query class for the V2 Profiles."""
 
-    profiles = graphene.List(CoreProfile, userId=graphene.String())
+    profiles = graphene.List(CoreProfile, userId=graphene.String(),
+                             userIds=graphene.List(graphene.String))
 
     def resolve_profiles(self, info, **kwargs):
         """GraphQL resolver for the profiles attribute."""
-        resp = requests.get(settings.V2_PROFILE_ENDPOINT).json()
+        loader = get_profile_loader(info.context)
 
-        data = json2obj(resp)
         # Query based on user_id
         user_id = kwargs.get('userId')
         if user_id:
-            for profile in data:
-                if profile['user_id']['value'] == user_id:
-                    return [profile]
-            return None
-        return data
+            return loader.load(user_id).then(lambda profile: [profile] if profile else None)
+
+        user_ids = kwargs.get('userIds')
+        if user_ids is not None:
+            return loader.load_many(user_ids).then(
+                lambda profiles: [profile for profile in profiles if profile])
+
+        return get_profile_snapshot().get_profiles()
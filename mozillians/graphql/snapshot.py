@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+import requests
+
+from mozillians.graphql.utils import json2obj
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileSnapshot(object):
+    """In process snapshot of the V2 profiles with an index by user_id.
+
+    The snapshot is refreshed with a conditional request once it is older
+    than `ttl` seconds, so an unchanged upstream dataset is not downloaded
+    again. If a refresh fails, the stale snapshot keeps being served.
+    """
+
+    def __init__(self, endpoint, ttl):
+        self.endpoint = endpoint
+        self.ttl = ttl
+        self.etag = None
+        self.profiles = None
+        self.index = {}
+        self.fetched = None
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return self.fetched is None or time.time() - self.fetched > self.ttl
+
+    def refresh(self):
+        """Fetch the upstream profiles unless they are not modified."""
+        headers = {}
+        if self.etag and self.profiles is not None:
+            headers['If-None-Match'] = self.etag
+        response = requests.get(self.endpoint, headers=headers,
+                                timeout=settings.V2_PROFILE_TIMEOUT)
+
+        if response.status_code != requests.codes.not_modified:
+            response.raise_for_status()
+            profiles = json2obj(response.json())
+            self.index = dict((profile['user_id']['value'], profile) for profile in profiles)
+            self.profiles = profiles
+            self.etag = response.headers.get('ETag')
+        self.fetched = time.time()
+
+    def _ensure_fresh(self):
+        if not self.is_stale():
+            return
+        # Only one thread refreshes, the others keep serving the current snapshot
+        if not self._lock.acquire(self.profiles is None):
+            return
+        try:
+            if self.is_stale():
+                self.refresh()
+        except (requests.RequestException, ValueError):
+            if self.profiles is None:
+                raise
+            logger.exception('Failed to refresh the V2 profiles, serving a stale snapshot.')
+            self.fetched = time.time()
+        finally:
+            self._lock.release()
+
+    def get_profiles(self):
+        """Return all the profiles."""
+        self._ensure_fresh()
+        return self.profiles
+
+    def get_profile(self, user_id):
+        """Return the profile matching user_id or None."""
+        self._ensure_fresh()
+        return self.index.get(user_id)
+
+
+_snapshot = None
+
+
+def get_profile_snapshot():
+    """Return the process wide snapshot of the V2 profiles."""
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = ProfileSnapshot(settings.V2_PROFILE_ENDPOINT, settings.V2_PROFILE_SNAPSHOT_TTL)
+    return _snapshot
@@ -0,0 +1,56 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import override_settings
+
+from graphql import parse
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.graphql.cost import QueryAnalysis, charge_cost_budget
+from mozillians.schema import schema
+
+
+@override_settings(GRAPHQL_PROFILES_LIST_SIZE=100, GRAPHQL_DEFAULT_LIST_SIZE=10)
+@patch('mozillians.graphql.cost.get_profile_snapshot')
+class QueryAnalysisTests(TestCase):
+    def _analyze(self, query, variables=None):
+        return QueryAnalysis(schema, parse(query), variables=variables)
+
+    def test_profiles_list(self, snapshot_mock):
+        snapshot_mock().profiles = None
+        analysis = self._analyze('{ profiles { userId { value } } }')
+        eq_(analysis.depth, 3)
+        eq_(analysis.cost, 1 + 100 * 2)
+
+        snapshot_mock().profiles = range(5)
+        eq_(self._analyze('{ profiles { userId { value } } }').cost, 1 + 5 * 2)
+
+    def test_profiles_arguments(self, snapshot_mock):
+        eq_(self._analyze('{ profiles(userId: "foo") { userId { value } } }').cost, 3)
+        query = 'query Q($ids: [String]) { profiles(userIds: $ids) { userId { value } } }'
+        eq_(self._analyze(query, {'ids': ['foo', 'bar']}).cost, 1 + 2 * 2)
+
+    def test_nested_lists_and_fragments(self, snapshot_mock):
+        query = '''
+            { profiles(userId: "foo") { ...Profile } }
+            fragment Profile on CoreProfile {
+                userId { signature { additional { value } } }
+            }'''
+        analysis = self._analyze(query)
+        eq_(analysis.depth, 5)
+        eq_(analysis.cost, 1 + 1 + 1 + 1 + 10)
+
+    def test_introspection(self, snapshot_mock):
+        analysis = self._analyze('{ __schema { types { name fields { name } } } }')
+        eq_(analysis.cost, 0)
+        eq_(analysis.depth, 0)
+
+
+@override_settings(GRAPHQL_COST_BUDGET=100, GRAPHQL_COST_BUDGET_WINDOW=60)
+class ChargeCostBudgetTests(TestCase):
+    def test_budget(self):
+        with patch('mozillians.graphql.cost.cache', LocMemCache('graphql', {})):
+            ok_(charge_cost_budget('foo', 60))
+            ok_(not charge_cost_budget('foo', 60))
+            ok_(charge_cost_budget('foo', 40))
+            ok_(charge_cost_budget('bar', 60))
@@ -0,0 +1,62 @@
+import json
+
+import requests
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.graphql.snapshot import ProfileSnapshot
+
+
+def _response(profiles=None, status_code=200, etag='"foo"'):
+    response = Mock(status_code=status_code, headers={'ETag': etag})
+    # The V2 endpoint returns a JSON document encoded as a JSON string
+    response.json.return_value = json.dumps(profiles)
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError()
+    return response
+
+
+PROFILES = [
+    {'user_id': {'value': 'ad|foo'}, 'primary_email': {'value': 'foo@example.com'}},
+    {'user_id': {'value': 'ad|bar'}, 'primary_email': {'value': 'bar@example.com'}},
+]
+
+
+class ProfileSnapshotTests(TestCase):
+    @patch('mozillians.graphql.snapshot.requests.get')
+    def test_get_profile(self, get_mock):
+        get_mock.return_value = _response(PROFILES)
+        snapshot = ProfileSnapshot('http://example.com', ttl=60)
+
+        eq_(snapshot.get_profile('ad|bar').primary_email.value, 'bar@example.com')
+        eq_(snapshot.get_profile('ad|baz'), None)
+        eq_(len(snapshot.get_profiles()), 2)
+        eq_(get_mock.call_count, 1)
+
+    @patch('mozillians.graphql.snapshot.requests.get')
+    def test_refresh_not_modified(self, get_mock):
+        get_mock.return_value = _response(PROFILES)
+        snapshot = ProfileSnapshot('http://example.com', ttl=0)
+        profiles = snapshot.get_profiles()
+
+        get_mock.return_value = _response(status_code=304)
+        snapshot.fetched -= 1
+        ok_(snapshot.get_profiles() is profiles)
+        eq_(get_mock.call_args[1]['headers'], {'If-None-Match': '"foo"'})
+
+    @patch('mozillians.graphql.snapshot.requests.get')
+    def test_refresh_failure(self, get_mock):
+        get_mock.return_value = _response(PROFILES)
+        snapshot = ProfileSnapshot('http://example.com', ttl=0)
+        profiles = snapshot.get_profiles()
+
+        get_mock.return_value = _response(status_code=500)
+        snapshot.fetched -= 1
+        ok_(snapshot.get_profiles() is profiles)
+
+    @patch('mozillians.graphql.snapshot.requests.get')
+    def test_initial_failure(self, get_mock):
+        get_mock.return_value = _response(status_code=500)
+        snapshot = ProfileSnapshot('http://example.com', ttl=60)
+        self.assertRaises(requests.HTTPError, snapshot.get_profiles)
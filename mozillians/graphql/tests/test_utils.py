@@ -0,0 +1,42 @@
+import json
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.graphql.utils import ProfileFactory, json2obj, parse_datetime_iso8601
+
+
+class ProfileFactoryTests(TestCase):
+    def test_lazy_wrapping(self):
+        profile = ProfileFactory({'user_id': {'value': 'foo', 'metadata': {'verified': True}}})
+        ok_(type(dict.__getitem__(profile, 'user_id')) is dict)
+
+        eq_(profile.user_id.value, 'foo')
+        ok_(isinstance(dict.__getitem__(profile, 'user_id'), ProfileFactory))
+        ok_(type(dict.__getitem__(profile.user_id, 'metadata')) is dict)
+        eq_(profile.user_id.get('metadata').verified, True)
+
+    def test_lists(self):
+        profile = ProfileFactory({'additional': [{'alg': 'RS256'}], 'values': ['foo']})
+        eq_(profile.additional[0].alg, 'RS256')
+        eq_(profile.get('values'), ['foo'])
+        eq_(profile.get('missing'), None)
+        self.assertRaises(AttributeError, getattr, profile, 'missing')
+
+    def test_json2obj(self):
+        data = json2obj(json.dumps([{'user_id': {'value': 'foo'}}]))
+        eq_(data[0].user_id.value, 'foo')
+
+
+class ParseDatetimeTests(TestCase):
+    @patch('mozillians.graphql.utils.parse_datetime')
+    def test_memoised(self, parse_datetime_mock):
+        parse_datetime_mock.return_value = 'parsed'
+        eq_(parse_datetime_iso8601('2018-10-18T12:00:00.123Z'), 'parsed')
+        eq_(parse_datetime_iso8601('2018-10-18T12:00:00.123Z'), 'parsed')
+        eq_(parse_datetime_mock.call_count, 1)
+
+    def test_invalid(self):
+        eq_(parse_datetime_iso8601(''), None)
+        eq_(parse_datetime_iso8601('foo'), None)
@@ -1,19 +1,32 @@
 import json
 from aniso8601 import parse_datetime
+from graphql.language import ast
+
+
+# Maximum number of memoised datetime strings
+DATETIME_CACHE_SIZE = 10000
+_datetime_cache = {}
 
 
 class ProfileFactory(dict):
-    """Allows to parse a dict structure with an object like notation (attributes)."""
+    """Allows to parse a dict structure with an object like notation (attributes).
+
+    Nested objects are wrapped lazily when they are first accessed, so only
+    the subtrees selected by a query are converted.
+    """
 
     def __init__(self, data={}):
-        super(ProfileFactory, self).__init__()
-        for k, v in data.items():
-            self.__setitem__(k, v)
+        super(ProfileFactory, self).__init__(data)
 
-    def __setitem__(self, key, value):
-        if isinstance(value, dict):
+    def __getitem__(self, key):
+        value = super(ProfileFactory, self).__getitem__(key)
+        if isinstance(value, dict) and not isinstance(value, ProfileFactory):
             value = ProfileFactory(value)
-        super(ProfileFactory, self).__setitem__(key, value)
+            super(ProfileFactory, self).__setitem__(key, value)
+        elif isinstance(value, list) and any(type(item) is dict for item in value):
+            value = [ProfileFactory(item) if type(item) is dict else item for item in value]
+            super(ProfileFactory, self).__setitem__(key, value)
+        return value
 
     def __getattr__(self, item):
         try:
@@ -21,27 +34,66 @@ class ProfileFactory(dict):
         except KeyError:
             raise AttributeError(item)
 
-    __setattr__ = __setitem__
-
+    def get(self, key, default=None):
+        try:
+            return self.__getitem__(key)
+        except KeyError:
+            return default
 
-def object_hook(dct):
-    """Transform every JSON object to Python objects."""
-    return ProfileFactory(dct)
+    __setattr__ = dict.__setitem__
 
 
 def json2obj(data):
     """Return a Python object from json."""
-    return json.loads(data, object_hook=object_hook)
+    data = json.loads(data)
+    if isinstance(data, list):
+        return [ProfileFactory(item) if isinstance(item, dict) else item for item in data]
+    if isinstance(data, dict):
+        return ProfileFactory(data)
+    return data
 
 
 def parse_datetime_iso8601(datetime):
-    """Parse a string in ISO8601 format."""
+    """Parse a string in ISO8601 format.
+
+    Results are memoised, profiles share most of their timestamps.
+    """
     if not datetime:
         return None
 
+    try:
+        return _datetime_cache[datetime]
+    except KeyError:
+        pass
+
     try:
         dt = parse_datetime(datetime)
     except ValueError:
-        return None
-    else:
-        return dt
+        dt = None
+
+    if len(_datetime_cache) >= DATETIME_CACHE_SIZE:
+        _datetime_cache.clear()
+    _datetime_cache[datetime] = dt
+    return dt
+
+
+def get_selected_fields(info):
+    """Return the names of the fields selected below the resolved field.
+
+    Fields selected through fragments are included.
+    """
+    names = set()
+
+    def _collect(selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                names.add(selection.name.value)
+            elif isinstance(selection, ast.FragmentSpread):
+                _collect(info.fragments[selection.name.value].selection_set)
+            else:
+                _collect(selection.selection_set)
+
+    for field_ast in info.field_asts:
+        if field_ast.selection_set:
+            _collect(field_ast.selection_set)
+    return names
@@ -1,8 +1,28 @@
+import logging
+import time
+
+from django.conf import settings
 from django.http import Http404
 from django.views.decorators.csrf import csrf_exempt
 
 import waffle
 from graphene_django.views import GraphQLView
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from ipware import get_client_ip
+
+from mozillians.graphql.cost import QueryAnalysis, charge_cost_budget
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_client_id(request):
+    """Return the identifier used to track the cost budget of a client."""
+    if request.user.is_authenticated():
+        return 'user{0}'.format(request.user.id)
+    ip, _ = get_client_ip(request)
+    return 'ip{0}'.format(ip)
 
 
 class MozilliansGraphQLView(GraphQLView):
@@ -14,3 +34,39 @@ class MozilliansGraphQLView(GraphQLView):
         if not waffle.flag_is_active(self.request, 'enable_graphql'):
             raise Http404()
         return super(MozilliansGraphQLView, self).dispatch(*args, **kwargs)
+
+    def get_response(self, request, data, show_graphiql=False):
+        result, status_code = super(MozilliansGraphQLView, self).get_response(
+            request, data, show_graphiql)
+        if getattr(request, 'graphql_throttled', False):
+            status_code = 429
+        return result, status_code
+
+    def execute(self, document_ast, **kwargs):
+        """Reject queries exceeding the depth, cost or budget limits."""
+        request = kwargs.get('context_value')
+        analysis = QueryAnalysis(self.schema, document_ast, kwargs.get('operation_name'),
+                                 kwargs.get('variable_values'))
+        client = get_client_id(request)
+
+        error = None
+        if analysis.depth > settings.GRAPHQL_MAX_DEPTH:
+            error = 'Query depth {0} exceeds the maximum of {1}.'.format(
+                analysis.depth, settings.GRAPHQL_MAX_DEPTH)
+        elif analysis.cost > settings.GRAPHQL_MAX_COST:
+            error = 'Query cost {0} exceeds the maximum of {1}.'.format(
+                analysis.cost, settings.GRAPHQL_MAX_COST)
+        elif not charge_cost_budget(client, analysis.cost):
+            request.graphql_throttled = True
+            error = 'Query cost budget exceeded, try again later.'
+
+        if error:
+            logger.warning('Rejected GraphQL query from %s: depth=%d cost=%d (%s)',
+                           client, analysis.depth, analysis.cost, error)
+            return ExecutionResult(errors=[GraphQLError(error)], invalid=True)
+
+        start = time.time()
+        result = super(MozilliansGraphQLView, self).execute(document_ast, **kwargs)
+        logger.info('GraphQL query from %s: depth=%d cost=%d time=%.3fs',
+                    client, analysis.depth, analysis.cost, time.time() - start)
+        return result
@@ -1,12 +1,14 @@
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 
 import django_filters
 from rest_framework import serializers
 from rest_framework.response import Response
 
-from mozillians.api.v2.viewsets import NoCacheReadOnlyModelViewSet
+from mozillians.api.v2.viewsets import NoCacheReadOnlyModelViewSet, make_etag
 from mozillians.common.templatetags.helpers import absolutify
 from mozillians.common.urlresolvers import reverse
+from mozillians.groups.managers import GroupQuerySet
 from mozillians.groups.models import Group, GroupMembership, Skill
 from mozillians.users.models import UserProfile
 
@@ -111,14 +113,44 @@ class GroupViewSet(NoCacheReadOnlyModelViewSet):
         queryset = Group.objects.filter(visible=True)
         return queryset
 
+    def get_validators(self, pk):
+        """Return the ETag and Last-Modified validators of a group.
+
+        A plain queryset is used to skip the member count annotation of
+        the default manager. Members are scoped by the privacy level of the
+        request.
+        """
+        last_updated = get_object_or_404(
+            GroupQuerySet(Group).visible().values_list('last_updated', flat=True), pk=pk)
+        stats = (GroupMembership.objects
+                 .filter(group_id=pk, status=GroupMembership.MEMBER,
+                         userprofile__privacy_groups__gte=self.request.privacy_level)
+                 .aggregate(memberships_updated=Max('updated_on'),
+                            profiles_updated=Max('userprofile__last_updated'),
+                            members=Count('id')))
+        curator_ids = sorted(Group.curators.through.objects.filter(group_id=pk)
+                             .values_list('userprofile_id', flat=True))
+
+        etag = make_etag('group', pk, self.request.privacy_level, last_updated,
+                         stats['memberships_updated'], stats['profiles_updated'],
+                         stats['members'], curator_ids)
+        last_modified = max(filter(None, [last_updated, stats['memberships_updated'],
+                                          stats['profiles_updated']]))
+        return etag, last_modified
+
     def retrieve(self, request, pk):
+        etag, last_modified = self.get_validators(pk)
+        not_modified = self.get_not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+
         group = get_object_or_404(self.get_queryset(), pk=pk)
 
         # Exclude members in 'pending' state
         group._members = group.members.filter(privacy_groups__gte=self.request.privacy_level,
                                               groupmembership__status=GroupMembership.MEMBER)
         serializer = GroupDetailedSerializer(group, context={'request': self.request})
-        return Response(serializer.data)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
 
 
 class SkillViewSet(NoCacheReadOnlyModelViewSet):
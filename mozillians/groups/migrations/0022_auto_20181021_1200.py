@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0042_auto_20181019_1400'),
+        ('groups', '0021_auto_20181018_1200'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipInvalidation',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('old_status', models.CharField(max_length=15, choices=[('member', 'Member'), ('pending_terms', 'Pending terms'), ('pending', 'Pending')])),
+                ('new_status', models.CharField(max_length=15, null=True, choices=[('member', 'Member'), ('pending_terms', 'Pending terms'), ('pending', 'Pending')])),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(to='groups.Group')),
+                ('userprofile', models.ForeignKey(to='users.UserProfile')),
+            ],
+        ),
+    ]
@@ -183,6 +183,23 @@ class GroupMembership(models.Model):
         return u'%s in %s' % (self.userprofile, self.group)
 
 
+class MembershipInvalidation(models.Model):
+    """
+    A membership removed or demoted by invalidate_group_membership whose
+    CIS update and email notification have not been sent yet.
+    """
+    userprofile = models.ForeignKey('users.UserProfile')
+    group = models.ForeignKey('groups.Group')
+    old_status = models.CharField(choices=GroupMembership.MEMBERSHIP_STATUS_CHOICES,
+                                  max_length=15)
+    new_status = models.CharField(choices=GroupMembership.MEMBERSHIP_STATUS_CHOICES,
+                                  max_length=15, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return u'%s in %s' % (self.userprofile, self.group)
+
+
 class Group(GroupBase):
     """Group class."""
     ALIAS_MODEL = GroupAlias
@@ -267,6 +284,7 @@ class Group(GroupBase):
     is_access_group = models.BooleanField(default=False,
                                           choices=ACCESS_GROUP_TYPES,
                                           verbose_name='Is this an access group?')
+    last_updated = models.DateTimeField(auto_now=True)
 
     objects = GroupManager.from_queryset(GroupQuerySet)()
 
@@ -1,9 +1,13 @@
+import logging
+import time
 from datetime import datetime, timedelta
+from itertools import chain
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.db.models import Count, Max
+from django.core.mail import EmailMessage, get_connection, send_mail, send_mass_mail
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, QuerySet
 from django.template.loader import get_template, render_to_string
 from django.utils.timezone import now
 from django.utils.translation import activate, ungettext
@@ -12,20 +16,48 @@ from django.utils.translation import ugettext as _
 from waffle import switch_is_active
 
 from mozillians.celery import app
-from mozillians.common.templatetags.helpers import get_object_or_none
 
 
 DAYS_BEFORE_INVALIDATION = 2 * 7  # 14 days
+MEMBERSHIP_INVALIDATION_BATCH_SIZE = 500
+REMOVE_EMPTY_GROUPS_BATCH_SIZE = 500
+RENEWAL_NOTIFICATION_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
 
 
 @app.task(ignore_result=True)
 def remove_empty_groups():
-    """Remove empty groups."""
+    """Remove empty groups.
 
-    from mozillians.groups.models import Group, Skill
+    Groups and skills without members are found with a NOT EXISTS
+    subquery and deleted in batches. Return the number of removed
+    groups and skills.
+    """
 
-    for model in [Group, Skill]:
-        model.objects.annotate(mcount=Count('members')).filter(mcount=0).delete()
+    from mozillians.groups.models import Group, GroupMembership, Skill
+
+    memberships = [
+        (Group, GroupMembership.objects.filter(group=OuterRef('pk'))),
+        (Skill, Skill.members.through.objects.filter(skill=OuterRef('pk'))),
+    ]
+    removed = {}
+    for model, model_memberships in memberships:
+        # A plain queryset skips the member count annotation of the group managers
+        empty = (QuerySet(model).annotate(has_members=Exists(model_memberships))
+                                .filter(has_members=False)
+                                .order_by())
+        removed[model] = 0
+        while True:
+            ids = list(empty.values_list('pk', flat=True)[:REMOVE_EMPTY_GROUPS_BATCH_SIZE])
+            if not ids:
+                break
+            # Members may have joined since the ids were selected
+            deleted = empty.filter(pk__in=ids).delete()[1]
+            removed[model] += deleted.get(model._meta.label, 0)
+
+    logger.info('Removed %d empty groups and %d empty skills', removed[Group], removed[Skill])
+    return removed[Group], removed[Skill]
 
 
 # TODO: Schedule this task nightly
@@ -34,48 +66,78 @@ def remove_empty_groups():
 def send_pending_membership_emails():
     """
     For each curated group that has pending memberships that the curators have
-    not yet been emailed about, send to all the curators an email with the count
+    not yet been emailed about, send the curators an email with the count
     of all pending memberships and a link to view and manage the requests.
+
+    Curators get a single digest email covering all their groups, all the
+    emails are sent over one mail connection.
     """
 
     from mozillians.groups.models import Group, GroupMembership
+    from mozillians.users.models import UserProfile
 
-    # Curated groups that have pending membership requests
-    groups = (Group.objects.exclude(curators__isnull=True)
-                           .exclude(accepting_new_members=Group.CLOSED))
-    groups = groups.filter(groupmembership__status=GroupMembership.PENDING).distinct()
+    # Pending requests of the open groups, newer than the last reminder
+    pending = (GroupMembership.objects.filter(status=GroupMembership.PENDING)
+                                      .exclude(group__accepting_new_members=Group.CLOSED)
+                                      .values('group')
+                                      .annotate(count=Count('pk'), max_pk=Max('pk'))
+                                      .filter(max_pk__gt=F('group__max_reminder')))
+    pending = dict((row['group'], row) for row in pending)
+    if not pending:
+        return
+
+    curated_groups = {}
+    curators = (Group.curators.through.objects.filter(group__in=pending)
+                                              .values_list('group', 'userprofile'))
+    for group_id, profile_id in curators:
+        curated_groups.setdefault(profile_id, []).append(group_id)
+    if not curated_groups:
+        return
+
+    # Mail the primary contact identity, the same address as UserProfile.email
+    profiles = (UserProfile.objects.filter(pk__in=curated_groups)
+                                   .select_related('user').prefetch_related('idp_profiles'))
+    emails = dict((profile.pk, profile.email) for profile in profiles)
+
+    groups = Group.objects.in_bulk(set(chain.from_iterable(curated_groups.values())))
+    for group in groups.values():
+        group.pending_count = pending[group.pk]['count']
+
+    # TODO: Switch locale to curator's preferred language so translation will occur
+    # Using English for now
+    activate('en-us')
 
-    for group in groups:
-        # what's the max pk of pending memberships?
-        pending_memberships = group.groupmembership_set.filter(status=GroupMembership.PENDING)
-        max_pk = pending_memberships.aggregate(max_pk=Max('pk'))['max_pk']
-        curators = group.curators.all()
-        # Only send reminder if there are newer requests than we'd previously reminded about
-        if max_pk > group.max_reminder and curators:
-            # TODO: Switch locale to curator's preferred language so translation will occur
-            # Using English for now
-            activate('en-us')
-
-            count = pending_memberships.count()
+    messages = []
+    for profile_id, group_ids in curated_groups.items():
+        curated = sorted((groups[group_id] for group_id in group_ids),
+                         key=lambda group: group.name)
+        count = sum(group.pending_count for group in curated)
+        if len(curated) == 1:
             subject = ungettext(
                 '%(count)d outstanding request to join Mozillians group "%(name)s"',
                 '%(count)d outstanding requests to join Mozillians group "%(name)s"',
                 count
             ) % {
                 'count': count,
-                'name': group.name
+                'name': curated[0].name
             }
-            body = render_to_string('groups/email/memberships_pending.txt', {
-                'group': group,
+        else:
+            subject = ungettext(
+                '%(count)d outstanding request to join your Mozillians groups',
+                '%(count)d outstanding requests to join your Mozillians groups',
+                count
+            ) % {
                 'count': count,
-            })
+            }
+        body = render_to_string('groups/email/memberships_pending.txt', {
+            'groups': curated,
+        })
+        messages.append((subject, body, settings.FROM_NOREPLY, [emails[profile_id]]))
 
-            send_mail(subject, body, settings.FROM_NOREPLY,
-                      [profile.email for profile in curators],
-                      fail_silently=False)
+    send_mass_mail(messages, fail_silently=False, connection=get_connection())
 
-            group.max_reminder = max_pk
-            group.save()
+    for group_id in groups:
+        Group.objects.filter(pk=group_id).update(max_reminder=pending[group_id]['max_pk'])
 
 
 @app.task(ignore_result=True)
@@ -132,6 +194,11 @@ def invalidate_group_membership():
     """
     For groups with defined `invalidation_days` we need to invalidate
     user membership after timedelta.
+
+    Memberships are removed, or made pending, with set based queries in
+    batches. Every change is recorded in the same transaction and the
+    CIS updates and emails are sent afterwards from these records, so
+    an interrupted run is completed by the next one.
     """
     from mozillians.groups.models import Group, GroupMembership
 
@@ -143,11 +210,84 @@ def invalidate_group_membership():
         memberships = (group.groupmembership_set.filter(updated_on__lte=last_update)
                                                 .exclude(userprofile__id__in=curator_ids))
 
-        for member in memberships:
-            status = None
-            if group.accepting_new_members != Group.OPEN:
-                status = GroupMembership.PENDING
-            group.remove_member(member.userprofile, status=status)
+        if group.name == settings.NDA_GROUP:
+            # Removing NDA members also cascades to the access groups
+            for member in memberships:
+                status = None
+                if group.accepting_new_members != Group.OPEN:
+                    status = GroupMembership.PENDING
+                group.remove_member(member.userprofile, status=status)
+        else:
+            while _invalidate_memberships(group, memberships):
+                pass
+
+    notify_invalidated_memberships()
+
+
+def _invalidate_memberships(group, memberships):
+    """Invalidate a batch of memberships, return the number of memberships invalidated."""
+    from mozillians.groups.models import Group, GroupMembership, Invite, MembershipInvalidation
+    from mozillians.users.models import UserProfile
+
+    with transaction.atomic():
+        batch = list(memberships.values_list('id', 'userprofile', 'status')
+                     [:MEMBERSHIP_INVALIDATION_BATCH_SIZE])
+        if not batch:
+            return 0
+
+        # Members of reviewed and closed groups need to be accepted again,
+        # every other membership is removed.
+        demote = group.accepting_new_members != Group.OPEN
+        demoted = [row for row in batch if demote and row[2] == GroupMembership.MEMBER]
+        removed = [row for row in batch if not demote or row[2] != GroupMembership.MEMBER]
+
+        MembershipInvalidation.objects.bulk_create([
+            MembershipInvalidation(group=group, userprofile_id=profile_id, old_status=status,
+                                   new_status=new_status)
+            for rows, new_status in [(demoted, GroupMembership.PENDING), (removed, None)]
+            for membership_id, profile_id, status in rows
+        ])
+
+        if demoted:
+            (GroupMembership.objects.filter(pk__in=[row[0] for row in demoted])
+                                    .update(status=GroupMembership.PENDING, needs_renewal=False,
+                                            updated_on=now()))
+        if removed:
+            # A raw delete skips the per membership post_delete signals,
+            # the CIS updates are sent in batches by notify_invalidated_memberships
+            (GroupMembership.objects.filter(pk__in=[row[0] for row in removed])
+                                    ._raw_delete(using=GroupMembership.objects.db))
+            Invite.objects.filter(group=group,
+                                  redeemer__in=[row[1] for row in removed]).delete()
+        UserProfile.objects.filter(pk__in=[row[1] for row in batch]).update(last_updated=now())
+    return len(batch)
+
+
+@app.task(ignore_result=True)
+def notify_invalidated_memberships():
+    """
+    Send the CIS updates and the emails of the invalidated memberships.
+
+    Each batch of records is deleted once sent, so a failed run resumes
+    with the remaining records.
+    """
+    from mozillians.groups.models import MembershipInvalidation
+    from mozillians.users.tasks import send_userprofile_to_cis
+
+    invalidations = MembershipInvalidation.objects.order_by('id')
+    while True:
+        batch = list(invalidations.values_list('id', 'group', 'userprofile',
+                                               'userprofile__user', 'old_status', 'new_status')
+                     [:MEMBERSHIP_INVALIDATION_BATCH_SIZE])
+        if not batch:
+            break
+
+        for profile_id in set(row[2] for row in batch):
+            send_userprofile_to_cis.delay(profile_id)
+        for invalidation_id, group_id, profile_id, user_id, old_status, new_status in batch:
+            email_membership_change.delay(group_id, user_id, old_status, new_status)
+
+        MembershipInvalidation.objects.filter(pk__in=[row[0] for row in batch]).delete()
 
 
 @app.task
@@ -157,73 +297,109 @@ def notify_membership_renewal():
     2 weeks prior invalidation that the membership is expiring.
     """
 
-    from mozillians.groups.models import Group, GroupMembership, Invite
+    from mozillians.groups.models import Group, GroupMembership
 
     groups = (Group.objects.filter(invalidation_days__isnull=False,
                                    invalidation_days__gte=DAYS_BEFORE_INVALIDATION)
                            .exclude(accepting_new_members=Group.OPEN).distinct())
 
-    for group in groups:
-        curator_ids = group.curators.all().values_list('id', flat=True)
-        memberships = (group.groupmembership_set.filter(status=GroupMembership.MEMBER)
-                       .exclude(userprofile__id__in=curator_ids))
-
-        # Filter memberships to be notified
-        # Switch is being used only for testing mail notifications
-        # It disables membership filtering based on date
-        if not switch_is_active('test_membership_renewal_notification'):
-            last_update_days = group.invalidation_days - DAYS_BEFORE_INVALIDATION
-            last_update = now() - timedelta(days=last_update_days)
-
-            query_start = datetime.combine(last_update.date(), datetime.min.time())
-            query_end = datetime.combine(last_update.date(), datetime.max.time())
-
-            query = {
-                'updated_on__range': [query_start, query_end],
-                'needs_renewal': False,
-            }
-            memberships = memberships.filter(**query)
-
-        member_template = get_template('groups/email/notify_member_renewal.txt')
-        curator_template = get_template('groups/email/notify_curator_renewal.txt')
-
-        for membership in memberships:
-            ctx = {
-                'member_full_name': membership.userprofile.full_name,
-                'group_name': membership.group.name,
-                'group_url': membership.group.get_absolute_url(),
-                'member_profile_url': membership.userprofile.get_absolute_url(),
-                'inviter': None
-            }
-
-            invite = get_object_or_none(Invite, group=group, redeemer=membership.userprofile)
-            if invite:
-                ctx['inviter'] = invite.inviter
+    start = time.time()
+    sent = 0
+    connection = get_connection()
+    connection.open()
+    try:
+        for group in groups:
+            curator_ids = group.curators.all().values_list('id', flat=True)
+            memberships = (group.groupmembership_set.filter(status=GroupMembership.MEMBER)
+                           .exclude(userprofile__id__in=curator_ids))
+
+            # Filter memberships to be notified
+            # Switch is being used only for testing mail notifications
+            # It disables membership filtering based on date
+            if not switch_is_active('test_membership_renewal_notification'):
+                last_update_days = group.invalidation_days - DAYS_BEFORE_INVALIDATION
+                last_update = now() - timedelta(days=last_update_days)
+
+                query_start = datetime.combine(last_update.date(), datetime.min.time())
+                query_end = datetime.combine(last_update.date(), datetime.max.time())
+
+                query = {
+                    'updated_on__range': [query_start, query_end],
+                    'needs_renewal': False,
+                }
+                memberships = memberships.filter(**query)
+
+            sent += _send_renewal_notifications(
+                group, list(memberships.select_related('userprofile__user')
+                                       .prefetch_related('userprofile__idp_profiles')
+                                       .order_by('pk')),
+                connection)
+
+            # Mark these memberships ready for an early renewal
+            memberships.update(needs_renewal=True)
+    finally:
+        connection.close()
+
+    elapsed = time.time() - start
+    logger.info('Sent %d membership renewal notifications in %.1fs (%.1f messages/s)',
+                sent, elapsed, sent / elapsed if elapsed else 0)
+    return sent
+
+
+def _send_renewal_notifications(group, memberships, connection):
+    """Send the renewal notifications of memberships of group, return the number sent.
+
+    Invites are fetched and emails are sent in chunks of
+    RENEWAL_NOTIFICATION_BATCH_SIZE memberships.
+    """
+    from mozillians.groups.models import Invite
 
-            subject_msg = unicode('[Mozillians] Your membership to Mozilla group "{0}" '
-                                  'is about to expire')
-            subject = _(subject_msg.format(membership.group.name))
-            message = member_template.render(ctx)
-            send_mail(subject, message, settings.FROM_NOREPLY, [membership.userprofile.email])
+    member_template = get_template('groups/email/notify_member_renewal.txt')
+    curator_template = get_template('groups/email/notify_curator_renewal.txt')
+    curators = list(group.curators.select_related('user').prefetch_related('idp_profiles'))
+    group_ctx = {
+        'group_name': group.name,
+        'group_url': group.get_absolute_url(),
+    }
+    member_subject = _(unicode('[Mozillians] Your membership to Mozilla group "{0}" '
+                               'is about to expire').format(group.name))
+
+    sent = 0
+    for i in range(0, len(memberships), RENEWAL_NOTIFICATION_BATCH_SIZE):
+        chunk = memberships[i:i + RENEWAL_NOTIFICATION_BATCH_SIZE]
+        invites = (Invite.objects.filter(group=group,
+                                         redeemer__in=[m.userprofile_id for m in chunk])
+                                 .select_related('inviter__user'))
+        inviters = dict((invite.redeemer_id, invite.inviter) for invite in invites)
+
+        messages = []
+        for membership in chunk:
+            userprofile = membership.userprofile
+            ctx = dict(group_ctx, **{
+                'member_full_name': userprofile.full_name,
+                'member_profile_url': userprofile.get_absolute_url(),
+                'inviter': inviters.get(userprofile.id)
+            })
+            messages.append(EmailMessage(member_subject, member_template.render(ctx),
+                                         settings.FROM_NOREPLY, [userprofile.email]))
 
             subject_msg = unicode('[Mozillians][{0}] Membership of "{1}" is about to expire')
-            format_args = [membership.group.name, membership.userprofile.full_name]
-            subject = _(subject_msg.format(*format_args))
+            subject = _(subject_msg.format(group.name, userprofile.full_name))
 
             # In case the membership was created after an invitation we notify inviters only
             # Else we fallback to all group curators
-            curators = group.curators.all()
             inviter = ctx['inviter']
-            if inviter and curators.filter(pk=inviter.id).exists():
-                curators = [inviter]
+            recipients = [curator for curator in curators if inviter and curator.id == inviter.id]
+            if not recipients:
+                recipients = curators
 
-            for curator in curators:
+            for curator in recipients:
                 ctx['curator_full_name'] = curator.full_name
-                message = curator_template.render(ctx)
-                send_mail(subject, message, settings.FROM_NOREPLY, [curator.email])
+                messages.append(EmailMessage(subject, curator_template.render(ctx),
+                                             settings.FROM_NOREPLY, [curator.email]))
 
-        # Mark these memberships ready for an early renewal
-        memberships.update(needs_renewal=True)
+        sent += connection.send_messages(messages) or 0
+    return sent
 
 
 @app.task(ignore_result=True)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.http import Http404
+from django.test import RequestFactory
+from django.utils.timezone import now
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.groups.api.v2 import GroupViewSet
+from mozillians.groups.models import Group
+from mozillians.groups.tests import GroupFactory
+from mozillians.users.managers import MOZILLIANS, PRIVATE
+from mozillians.users.tests import UserFactory
+
+
+class GroupViewSetTests(TestCase):
+    def _get_viewset(self, privacy_level=MOZILLIANS, **headers):
+        viewset = GroupViewSet()
+        viewset.request = RequestFactory().get('/', **headers)
+        viewset.request.privacy_level = privacy_level
+        return viewset
+
+    def test_retrieve_not_modified(self):
+        group = GroupFactory.create()
+        viewset = self._get_viewset()
+        response = viewset.retrieve(viewset.request, group.id)
+        eq_(response.status_code, 200)
+        ok_(response['Last-Modified'])
+
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=response['ETag'])
+        with patch('mozillians.groups.api.v2.GroupDetailedSerializer') as serializer_mock:
+            not_modified = viewset.retrieve(viewset.request, group.id)
+        eq_(not_modified.status_code, 304)
+        eq_(not_modified['ETag'], response['ETag'])
+        ok_(not serializer_mock.called)
+
+    def test_retrieve_modified_member(self):
+        group = GroupFactory.create()
+        viewset = self._get_viewset()
+        etag = viewset.retrieve(viewset.request, group.id)['ETag']
+
+        group.add_member(UserFactory.create().userprofile)
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=etag)
+        response = viewset.retrieve(viewset.request, group.id)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_retrieve_modified_group(self):
+        group = GroupFactory.create()
+        viewset = self._get_viewset()
+        etag = viewset.retrieve(viewset.request, group.id)['ETag']
+
+        Group.objects.filter(pk=group.pk).update(name='renamed',
+                                                 last_updated=now() + timedelta(seconds=1))
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=etag)
+        response = viewset.retrieve(viewset.request, group.id)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_etag_privacy_level(self):
+        group = GroupFactory.create()
+        viewset = self._get_viewset(privacy_level=MOZILLIANS)
+        etag, _ = viewset.get_validators(group.id)
+        viewset = self._get_viewset(privacy_level=PRIVATE)
+        ok_(viewset.get_validators(group.id)[0] != etag)
+
+    def test_retrieve_invisible(self):
+        group = GroupFactory.create(visible=False)
+        viewset = self._get_viewset()
+        with self.assertRaises(Http404):
+            viewset.retrieve(viewset.request, group.id)
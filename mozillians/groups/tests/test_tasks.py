@@ -2,6 +2,7 @@
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.core import mail
 from django.template.loader import get_template
 from django.test import override_settings
 from django.utils.timezone import now
@@ -11,10 +12,11 @@ from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.groups import tasks
-from mozillians.groups.models import Group, GroupMembership, Skill
+from mozillians.groups.models import Group, GroupMembership, MembershipInvalidation, Skill
 from mozillians.groups.tasks import (invalidate_group_membership, email_membership_change,
                                      notify_membership_renewal)
 from mozillians.groups.tests import GroupFactory, InviteFactory, SkillFactory
+from mozillians.users.models import IdpProfile
 from mozillians.users.tests import UserFactory
 
 
@@ -37,6 +39,18 @@ class SendPendingMembershipEmailsTests(TestCase):
         eq_(Skill.objects.all().count(), 1)
         ok_(Skill.objects.filter(id=skill_1.id).exists())
 
+    @patch('mozillians.groups.tasks.REMOVE_EMPTY_GROUPS_BATCH_SIZE', 1)
+    def test_remove_empty_groups_in_batches(self):
+        user = UserFactory.create()
+        group = GroupFactory.create()
+        GroupFactory.create_batch(3)
+        SkillFactory.create()
+        group.add_member(user.userprofile, GroupMembership.PENDING)
+
+        eq_(tasks.remove_empty_groups(), (3, 1))
+        eq_(list(Group.objects.values_list('id', flat=True)), [group.id])
+        eq_(Skill.objects.count(), 0)
+
     def test_sending_pending_email(self):
         # If a curated group has a pending membership, added since the reminder email
         # was last sent, send the curator an email.  It should contain the count of
@@ -49,24 +63,26 @@ class SendPendingMembershipEmailsTests(TestCase):
         group.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
         group.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
 
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
             tasks.send_pending_membership_emails()
         ok_(mock_send_mail.called)
         # Should only have been called once
         eq_(1, len(mock_send_mail.call_args_list))
 
         # The message body should mention that there are 2 pending memberships
-        subject, body, from_addr, to_list = mock_send_mail.call_args[0]
+        messages = mock_send_mail.call_args[0][0]
+        eq_(1, len(messages))
+        subject, body, from_addr, to_list = messages[0]
         eq_('2 outstanding requests to join Mozillians group "%s"' % group.name, subject)
         ok_('There are 2 outstanding requests' in body)
         # Full path to group page is in the message
         ok_(group.get_absolute_url() in body)
-        ok_(curator.email in to_list)
+        eq_([curator.email], to_list)
 
         # Add another pending membership
         group.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
         # Should send email again
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
             tasks.send_pending_membership_emails()
         ok_(mock_send_mail.called)
 
@@ -81,17 +97,61 @@ class SendPendingMembershipEmailsTests(TestCase):
         # Add one pending membership
         group.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
 
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
             tasks.send_pending_membership_emails()
         ok_(mock_send_mail.called)
 
         # The message body should mention that there is 1 pending memberships
-        subject, body, from_addr, to_list = mock_send_mail.call_args[0]
+        subject, body, from_addr, to_list = mock_send_mail.call_args[0][0][0]
         eq_('1 outstanding request to join Mozillians group "%s"' % group.name, subject)
         ok_('There is 1 outstanding request' in body)
         # Full path to group page is in the message
         ok_(group.get_absolute_url() in body)
-        ok_(curator.email in to_list)
+        eq_([curator.email], to_list)
+
+    def test_sending_pending_email_digest(self):
+        # Curators of several groups get a single email covering all of them,
+        # every curator gets their own email.
+        curator = UserFactory.create()
+        other_curator = UserFactory.create()
+        group_1 = GroupFactory.create(name='a group')
+        group_2 = GroupFactory.create(name='b group')
+        group_1.curators.add(curator.userprofile, other_curator.userprofile)
+        group_2.curators.add(curator.userprofile)
+        group_1.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
+        group_2.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
+        group_2.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
+
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
+            tasks.send_pending_membership_emails()
+        eq_(1, len(mock_send_mail.call_args_list))
+
+        messages = dict((to_list[0], (subject, body))
+                        for subject, body, from_addr, to_list in mock_send_mail.call_args[0][0])
+        eq_(set([curator.email, other_curator.email]), set(messages))
+        subject, body = messages[curator.email]
+        eq_('3 outstanding requests to join your Mozillians groups', subject)
+        ok_('There is 1 outstanding request to join your group "a group"' in body)
+        ok_('There are 2 outstanding requests to join your group "b group"' in body)
+        subject, body = messages[other_curator.email]
+        eq_('1 outstanding request to join Mozillians group "a group"', subject)
+        ok_('b group' not in body)
+
+        eq_(Group.objects.get(pk=group_2.pk).max_reminder,
+            GroupMembership.objects.filter(group=group_2).latest('pk').pk)
+
+    def test_sending_pending_email_contact_identity(self):
+        curator = UserFactory.create(email='foo@example.com')
+        IdpProfile.objects.create(profile=curator.userprofile, auth0_user_id='email|bar',
+                                  email='bar@example.com', primary_contact_identity=True)
+        group = GroupFactory.create()
+        group.curators.add(curator.userprofile)
+        group.add_member(UserFactory.create().userprofile, GroupMembership.PENDING)
+
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
+            tasks.send_pending_membership_emails()
+        subject, body, from_addr, to_list = mock_send_mail.call_args[0][0][0]
+        eq_(['bar@example.com'], to_list)
 
     def test_sending_pending_email_already_sent(self):
         # If a curated group has a pending membership, but it was added before the
@@ -108,14 +168,15 @@ class SendPendingMembershipEmailsTests(TestCase):
         membership.save()
 
         # Send email. This should update the field remembering the max pending request pk.
-        tasks.send_pending_membership_emails()
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True):
+            tasks.send_pending_membership_emails()
 
         # Non-pending membership
         user2 = UserFactory.create()
         group.add_member(user2.userprofile, GroupMembership.MEMBER)
 
         # None of this should trigger an email send
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
             tasks.send_pending_membership_emails()
         ok_(not mock_send_mail.called)
 
@@ -124,7 +185,7 @@ class SendPendingMembershipEmailsTests(TestCase):
         group = GroupFactory.create(accepting_new_members=Group.REVIEWED)
         user = UserFactory.create()
         group.add_member(user.userprofile, GroupMembership.PENDING)
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
+        with patch('mozillians.groups.tasks.send_mass_mail', autospec=True) as mock_send_mail:
             tasks.send_pending_membership_emails()
         ok_(not mock_send_mail.called)
 
@@ -206,7 +267,7 @@ class EmailMembershipChangeTests(TestCase):
 class MembershipInvalidationTests(TestCase):
     """ Test membership invalidation."""
 
-    @patch('mozillians.groups.models.email_membership_change')
+    @patch('mozillians.groups.tasks.email_membership_change')
     def test_invalidate_open_group(self, mail_task):
         member = UserFactory.create(vouched=True)
         curator = UserFactory.create(vouched=True)
@@ -233,7 +294,7 @@ class MembershipInvalidationTests(TestCase):
 
         mail_task.delay.assert_called_once_with(group.id, member.id, GroupMembership.MEMBER, None)
 
-    @patch('mozillians.groups.models.email_membership_change')
+    @patch('mozillians.groups.tasks.email_membership_change')
     def test_invalidate_group_by_request(self, mail_task):
         member = UserFactory.create(vouched=True)
         curator = UserFactory.create(vouched=True)
@@ -261,7 +322,7 @@ class MembershipInvalidationTests(TestCase):
         mail_task.delay.assert_called_once_with(group.id, member.id, GroupMembership.MEMBER,
                                                 GroupMembership.PENDING)
 
-    @patch('mozillians.groups.models.email_membership_change')
+    @patch('mozillians.groups.tasks.email_membership_change')
     def invalidate_closed_group(self, mail_task):
         member = UserFactory.create(vouched=True)
         curator = UserFactory.create(vouched=True)
@@ -289,7 +350,7 @@ class MembershipInvalidationTests(TestCase):
         mail_task.delay.assert_called_once_with(group.id, member.id, GroupMembership.MEMBER,
                                                 GroupMembership.PENDING)
 
-    @patch('mozillians.groups.models.email_membership_change')
+    @patch('mozillians.groups.tasks.email_membership_change')
     def test_invalidate_group_pending_membership(self, mail_task):
         """Invalidate a group where a user has not yet been accepted by a curator.
 
@@ -317,7 +378,7 @@ class MembershipInvalidationTests(TestCase):
         ok_(group.groupmembership_set.filter(userprofile=curator.userprofile).exists())
         ok_(not mail_task.called)
 
-    @patch('mozillians.groups.models.email_membership_change')
+    @patch('mozillians.groups.tasks.email_membership_change')
     def invalidate_group_pending_terms(self, mail_task):
         """Invalidate a group where a user has not yet accepted the terms.
 
@@ -345,6 +406,42 @@ class MembershipInvalidationTests(TestCase):
         ok_(group.groupmembership_set.filter(userprofile=curator.userprofile).exists())
         ok_(not mail_task.called)
 
+    @patch('mozillians.groups.tasks.MEMBERSHIP_INVALIDATION_BATCH_SIZE', 2)
+    @patch('mozillians.users.tasks.send_userprofile_to_cis.delay')
+    @patch('mozillians.groups.tasks.email_membership_change')
+    def test_invalidate_in_batches(self, mail_task, cis_task):
+        group = GroupFactory.create(invalidation_days=5, accepting_new_members=Group.REVIEWED)
+        members = UserFactory.create_batch(3, vouched=True)
+        for member in members:
+            group.add_member(member.userprofile)
+        pending = UserFactory.create(vouched=True)
+        group.add_member(pending.userprofile, GroupMembership.PENDING)
+        group.groupmembership_set.update(updated_on=datetime.now() - timedelta(days=10))
+
+        invalidate_group_membership()
+
+        eq_(group.groupmembership_set.filter(status=GroupMembership.PENDING).count(), 3)
+        ok_(not group.groupmembership_set.filter(userprofile=pending.userprofile).exists())
+        eq_(mail_task.delay.call_count, 4)
+        mail_task.delay.assert_any_call(group.id, pending.id, GroupMembership.PENDING, None)
+        eq_(cis_task.call_count, 4)
+        eq_(MembershipInvalidation.objects.count(), 0)
+
+    @patch('mozillians.users.tasks.send_userprofile_to_cis.delay')
+    @patch('mozillians.groups.tasks.email_membership_change')
+    def test_resume_notifications(self, mail_task, cis_task):
+        member = UserFactory.create(vouched=True)
+        group = GroupFactory.create()
+        MembershipInvalidation.objects.create(group=group, userprofile=member.userprofile,
+                                              old_status=GroupMembership.MEMBER)
+
+        # Nothing left to invalidate, the recorded notifications are still sent
+        invalidate_group_membership()
+
+        mail_task.delay.assert_called_once_with(group.id, member.id, GroupMembership.MEMBER, None)
+        cis_task.assert_called_once_with(member.userprofile.id)
+        eq_(MembershipInvalidation.objects.count(), 0)
+
 
 class InvitationEmailTests(TestCase):
     @patch('mozillians.groups.tasks.send_mail')
@@ -434,9 +531,8 @@ class InvitationEmailTests(TestCase):
 
 
 class MembershipRenewalNotificationTests(TestCase):
-    @patch('mozillians.groups.tasks.send_mail')
     @patch('mozillians.groups.tasks.now')
-    def test_send_renewal_notification_email(self, mock_now, mock_send_mail):
+    def test_send_renewal_notification_email(self, mock_now):
         """Test renewal notification functionality"""
         curator = UserFactory.create()
         member = UserFactory.create()
@@ -450,17 +546,16 @@ class MembershipRenewalNotificationTests(TestCase):
 
         notify_membership_renewal()
 
-        ok_(mock_send_mail.called)
-        eq_(2, len(mock_send_mail.call_args_list))
-        name, args, kwargs = mock_send_mail.mock_calls[0]
-        subject, body, from_addr, to_list = args
+        ok_(mail.outbox)
+        eq_(2, len(mail.outbox))
+        message = mail.outbox[0]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians] Your membership to Mozilla group "foobar" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(to_list, [member.userprofile.email])
 
-    @patch('mozillians.groups.tasks.send_mail')
     @patch('mozillians.groups.tasks.now')
-    def test_send_renewal_notification_curators_email(self, mock_now, mock_send_mail):
+    def test_send_renewal_notification_curators_email(self, mock_now):
         """Test renewal notification functionality for curators"""
         curator1 = UserFactory.create(email='foo@example.com')
         curator2 = UserFactory.create(email='foobar@example.com')
@@ -477,26 +572,25 @@ class MembershipRenewalNotificationTests(TestCase):
 
         notify_membership_renewal()
 
-        ok_(mock_send_mail.called)
-        eq_(3, len(mock_send_mail.mock_calls))
+        ok_(mail.outbox)
+        eq_(3, len(mail.outbox))
 
         # Check email for curator1
-        name, args, kwargs = mock_send_mail.mock_calls[1]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[1]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians][foobar] Membership of "Example Name" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(list(to_list), [u'foo@example.com'])
 
         # Check email for curator2
-        name, args, kwargs = mock_send_mail.mock_calls[2]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[2]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians][foobar] Membership of "Example Name" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(list(to_list), [u'foobar@example.com'])
 
-    @patch('mozillians.groups.tasks.send_mail')
     @patch('mozillians.groups.tasks.now')
-    def test_send_renewal_notification_inviters_email(self, mock_now, mock_send_mail):
+    def test_send_renewal_notification_inviters_email(self, mock_now):
         """Test renewal notification functionality for curators"""
         curator1 = UserFactory.create(email='foo@example.com')
         curator2 = UserFactory.create(email='foobar@example.com')
@@ -518,19 +612,18 @@ class MembershipRenewalNotificationTests(TestCase):
 
         notify_membership_renewal()
 
-        ok_(mock_send_mail.called)
-        eq_(2, len(mock_send_mail.mock_calls))
+        ok_(mail.outbox)
+        eq_(2, len(mail.outbox))
 
         # Check email for inviter
-        name, args, kwargs = mock_send_mail.mock_calls[1]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[1]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians][foobar] Membership of "Example Name" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(list(to_list), [u'bar@example.com'])
 
-    @patch('mozillians.groups.tasks.send_mail')
     @patch('mozillians.groups.tasks.now')
-    def test_send_renewal_notification_inviter_not_curator(self, mock_now, mock_send_mail):
+    def test_send_renewal_notification_inviter_not_curator(self, mock_now):
         """Test renewal notification functionality for curators"""
         curator1 = UserFactory.create(email='foo@example.com')
         curator2 = UserFactory.create(email='foobar@example.com')
@@ -551,26 +644,26 @@ class MembershipRenewalNotificationTests(TestCase):
 
         notify_membership_renewal()
 
-        ok_(mock_send_mail.called)
-        eq_(3, len(mock_send_mail.mock_calls))
+        ok_(mail.outbox)
+        eq_(3, len(mail.outbox))
 
         # Check email to mozillians
-        name, args, kwargs = mock_send_mail.mock_calls[0]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[0]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians] Your membership to Mozilla group "foobar" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(to_list, [member.userprofile.email])
 
         # Check email for curator1
-        name, args, kwargs = mock_send_mail.mock_calls[1]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[1]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians][foobar] Membership of "Example Name" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(list(to_list), [u'foo@example.com'])
 
         # Check email for curator2
-        name, args, kwargs = mock_send_mail.mock_calls[2]
-        subject, body, from_addr, to_list = args
+        message = mail.outbox[2]
+        subject, from_addr, to_list = message.subject, message.from_email, message.to
         eq_(subject, '[Mozillians][foobar] Membership of "Example Name" is about to expire')
         eq_(from_addr, settings.FROM_NOREPLY)
         eq_(list(to_list), [u'foobar@example.com'])
@@ -588,7 +681,25 @@ class MembershipRenewalNotificationTests(TestCase):
         datetime_now = now() + timedelta(days=10)
         mock_now.return_value = datetime_now
 
-        with patch('mozillians.groups.tasks.send_mail', autospec=True) as mock_send_mail:
-            notify_membership_renewal()
+        notify_membership_renewal()
+
+        eq_(mail.outbox, [])
 
-        ok_(not mock_send_mail.called)
+    @patch('mozillians.groups.tasks.RENEWAL_NOTIFICATION_BATCH_SIZE', 1)
+    @patch('mozillians.groups.tasks.now')
+    def test_send_renewal_notifications_in_batches(self, mock_now):
+        curator = UserFactory.create()
+        members = UserFactory.create_batch(2)
+        group = GroupFactory.create(name='foobar', invalidation_days=365,
+                                    accepting_new_members=Group.REVIEWED)
+        group.curators.add(curator.userprofile)
+        for member in members:
+            group.add_member(member.userprofile)
+
+        mock_now.return_value = now() + timedelta(days=351)
+
+        eq_(notify_membership_renewal(), 4)
+        eq_(len(mail.outbox), 4)
+        eq_([message.to for message in mail.outbox if message.subject.startswith('[Mozillians] ')],
+            [[member.email] for member in members])
+        eq_(group.groupmembership_set.filter(needs_renewal=True).count(), 2)
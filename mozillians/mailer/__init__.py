@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+default_app_config = 'mozillians.mailer.MailerConfig'
+
+
+class MailerConfig(AppConfig):
+    name = 'mozillians.mailer'
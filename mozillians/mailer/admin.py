@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from mozillians.mailer.models import OutboxMessage
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipient', 'status', 'attempts', 'created', 'next_attempt',
+                    'sent']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = ['created', 'dedupe_key', 'attempts', 'last_error', 'sent']
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+
+from mozillians.mailer.models import OutboxMessage
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Email backend storing messages in the outbox instead of sending them.
+
+    The messages are sent in the background by the drain_outbox task
+    with the MAILER_BACKEND email backend. Messages with attachments are
+    sent right away.
+    """
+
+    def send_messages(self, email_messages):
+        # Avoid circular imports
+        from mozillians.mailer.tasks import drain_outbox
+
+        count = 0
+        for email_message in email_messages:
+            if email_message.attachments:
+                connection = get_connection(settings.MAILER_BACKEND,
+                                            fail_silently=self.fail_silently)
+                count += connection.send_messages([email_message]) or 0
+            elif OutboxMessage.objects.queue(email_message):
+                count += 1
+        if count:
+            transaction.on_commit(drain_outbox.delay)
+        return count
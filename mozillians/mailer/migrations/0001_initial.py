@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('from_email', models.CharField(max_length=255)),
+                ('recipient', models.CharField(max_length=255)),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('alternatives', models.TextField(default='[]')),
+                ('headers', models.TextField(default='{}')),
+                ('dedupe_key', models.CharField(max_length=40, db_index=True)),
+                ('status', models.CharField(default='pending', max_length=10, choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')])),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(default='', blank=True)),
+                ('sent', models.DateTimeField(null=True, blank=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxmessage',
+            index_together=set([('status', 'next_attempt')]),
+        ),
+    ]
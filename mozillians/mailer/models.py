@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.utils.encoding import force_bytes
+from django.utils.timezone import now
+
+
+class OutboxMessageManager(models.Manager):
+
+    def due(self):
+        """Return the pending messages ready to be sent, oldest first."""
+        return (self.filter(status=OutboxMessage.PENDING, next_attempt__lte=now())
+                    .order_by('next_attempt', 'id'))
+
+    def queue(self, email_message):
+        """Store a message in the outbox, one row per recipient.
+
+        Recipients that were already queued the same message within
+        MAILER_DEDUPE_WINDOW are skipped. Return the number of rows created.
+        """
+        alternatives = json.dumps(getattr(email_message, 'alternatives', []))
+        headers = json.dumps(email_message.extra_headers)
+        messages = dict(
+            (self.model.get_dedupe_key(recipient, email_message), recipient)
+            for recipient in email_message.recipients()
+        )
+        if not messages:
+            return 0
+
+        window_start = now() - timedelta(seconds=settings.MAILER_DEDUPE_WINDOW)
+        duplicates = set(self.filter(dedupe_key__in=messages, created__gte=window_start)
+                             .exclude(status=OutboxMessage.FAILED)
+                             .values_list('dedupe_key', flat=True))
+        rows = [
+            self.model(from_email=email_message.from_email, recipient=recipient,
+                       subject=email_message.subject, body=email_message.body,
+                       alternatives=alternatives, headers=headers, dedupe_key=dedupe_key)
+            for dedupe_key, recipient in messages.items() if dedupe_key not in duplicates
+        ]
+        self.bulk_create(rows)
+        return len(rows)
+
+
+class OutboxMessage(models.Model):
+    """An email waiting to be sent, or recently sent, by drain_outbox."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    objects = OutboxMessageManager()
+
+    created = models.DateTimeField(auto_now_add=True)
+    from_email = models.CharField(max_length=255)
+    recipient = models.CharField(max_length=255)
+    subject = models.TextField()
+    body = models.TextField()
+    alternatives = models.TextField(default='[]')
+    headers = models.TextField(default='{}')
+    dedupe_key = models.CharField(max_length=40, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True, default='')
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        index_together = ('status', 'next_attempt')
+
+    def __unicode__(self):
+        return u'{0} to {1}'.format(self.subject, self.recipient)
+
+    @staticmethod
+    def get_dedupe_key(recipient, email_message):
+        parts = [recipient.lower(), email_message.from_email, email_message.subject,
+                 email_message.body]
+        return sha1(force_bytes(u'\0'.join(parts))).hexdigest()
+
+    def get_email_message(self):
+        """Return the message as an EmailMessage to the recipient of this row."""
+        email_message = EmailMultiAlternatives(self.subject, self.body, self.from_email,
+                                               [self.recipient],
+                                               headers=json.loads(self.headers))
+        for content, mimetype in json.loads(self.alternatives):
+            email_message.attach_alternative(content, mimetype)
+        return email_message
+
+    def failed(self, error):
+        """Schedule a retry with exponential backoff, or give up after MAILER_MAX_ATTEMPTS."""
+        self.attempts += 1
+        self.last_error = unicode(error)
+        if self.attempts >= settings.MAILER_MAX_ATTEMPTS:
+            self.status = OutboxMessage.FAILED
+        else:
+            delay = settings.MAILER_RETRY_DELAY * 2 ** (self.attempts - 1)
+            self.next_attempt = now() + timedelta(seconds=delay)
+        self.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt'])
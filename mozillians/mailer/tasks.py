@@ -0,0 +1,70 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.utils.timezone import now
+
+from mozillians.celery import app
+
+
+DRAIN_LOCK_CACHE_KEY = 'mailer_drain_lock'
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(ignore_result=True)
+def drain_outbox():
+    """Send the due outbox messages in batches over a single connection.
+
+    Only one worker drains the outbox at a time. Failed messages are
+    retried with exponential backoff.
+    """
+    from mozillians.mailer.models import OutboxMessage
+
+    if not cache.add(DRAIN_LOCK_CACHE_KEY, True, settings.MAILER_LOCK_TIMEOUT):
+        return
+
+    connection = get_connection(settings.MAILER_BACKEND)
+    try:
+        connection.open()
+        while True:
+            batch = list(OutboxMessage.objects.due()[:settings.MAILER_BATCH_SIZE])
+            if not batch:
+                break
+            _send_batch(connection, batch)
+    finally:
+        connection.close()
+        cache.delete(DRAIN_LOCK_CACHE_KEY)
+
+
+def _send_batch(connection, batch):
+    from mozillians.mailer.models import OutboxMessage
+
+    sent = []
+    try:
+        for message in batch:
+            try:
+                connection.send_messages([message.get_email_message()])
+            except Exception as exp:
+                logger.warning('Failed to send email %d: %s', message.id, exp)
+                message.failed(exp)
+                # Continue with a new connection, give up if that fails too
+                connection.close()
+                connection.open()
+            else:
+                sent.append(message.id)
+    finally:
+        OutboxMessage.objects.filter(pk__in=sent).update(status=OutboxMessage.SENT, sent=now())
+
+
+@app.task(ignore_result=True)
+def purge_outbox():
+    """Delete sent and failed messages older than MAILER_RETENTION_DAYS."""
+    from mozillians.mailer.models import OutboxMessage
+
+    last_kept = now() - timedelta(days=settings.MAILER_RETENTION_DAYS)
+    (OutboxMessage.objects.exclude(status=OutboxMessage.PENDING)
+                          .filter(created__lt=last_kept)
+                          .delete())
@@ -0,0 +1,52 @@
+from django.core import mail
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.test import TestCase, override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.mailer.models import OutboxMessage
+
+
+@override_settings(MAILER_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+@patch('mozillians.mailer.backends.transaction.on_commit', side_effect=lambda func: func())
+@patch('mozillians.mailer.tasks.drain_outbox.delay')
+class OutboxBackendTests(TestCase):
+    def _send(self, *messages):
+        return get_connection('mozillians.mailer.backends.OutboxBackend').send_messages(messages)
+
+    def test_queue_per_recipient(self, drain_mock, on_commit_mock):
+        message = EmailMultiAlternatives('Subject', 'Body', 'from@example.com',
+                                         ['foo@example.com', 'bar@example.com'],
+                                         headers={'Reply-To': 'reply@example.com'})
+        message.attach_alternative('<p>Body</p>', 'text/html')
+        eq_(self._send(message), 1)
+
+        eq_(sorted(OutboxMessage.objects.values_list('recipient', flat=True)),
+            ['bar@example.com', 'foo@example.com'])
+        outbox_message = OutboxMessage.objects.get(recipient='foo@example.com')
+        eq_(outbox_message.status, OutboxMessage.PENDING)
+        email_message = outbox_message.get_email_message()
+        eq_(email_message.to, ['foo@example.com'])
+        eq_(email_message.extra_headers, {'Reply-To': 'reply@example.com'})
+        eq_(email_message.alternatives, [('<p>Body</p>', 'text/html')])
+        ok_(drain_mock.called)
+
+    def test_dedupe(self, drain_mock, on_commit_mock):
+        message = EmailMessage('Subject', 'Body', 'from@example.com', ['foo@example.com'])
+        eq_(self._send(message), 1)
+        eq_(self._send(message), 0)
+        eq_(self._send(EmailMessage('Subject', 'Other', 'from@example.com',
+                                    ['FOO@example.com'])), 1)
+        eq_(OutboxMessage.objects.count(), 2)
+
+        # Failed messages can be sent again
+        OutboxMessage.objects.update(status=OutboxMessage.FAILED)
+        eq_(self._send(message), 1)
+
+    def test_attachments_sent_directly(self, drain_mock, on_commit_mock):
+        message = EmailMessage('Subject', 'Body', 'from@example.com', ['foo@example.com'])
+        message.attach('file.txt', 'content', 'text/plain')
+        eq_(self._send(message), 1)
+        eq_(OutboxMessage.objects.count(), 0)
+        eq_(len(mail.outbox), 1)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from mozillians.mailer.models import OutboxMessage
+from mozillians.mailer.tasks import DRAIN_LOCK_CACHE_KEY, drain_outbox, purge_outbox
+
+
+def _queue(count=1, subject='Subject'):
+    for i in range(count):
+        OutboxMessage.objects.queue(EmailMessage(subject, 'Body', 'from@example.com',
+                                                 ['foo{0}@example.com'.format(i)]))
+
+
+@override_settings(MAILER_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   MAILER_BATCH_SIZE=2, MAILER_RETRY_DELAY=60, MAILER_MAX_ATTEMPTS=2)
+class DrainOutboxTests(TestCase):
+    def setUp(self):
+        cache.delete(DRAIN_LOCK_CACHE_KEY)
+
+    def test_drain(self):
+        _queue(3)
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as open_mock:
+            drain_outbox()
+        eq_(open_mock.call_count, 1)
+        eq_(len(mail.outbox), 3)
+        eq_(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 3)
+        ok_(not OutboxMessage.objects.filter(sent=None).exists())
+
+    def test_retry_with_backoff(self):
+        _queue(2)
+        failing = OutboxMessage.objects.get(recipient='foo0@example.com')
+
+        def send_messages(messages):
+            if messages[0].to == [failing.recipient]:
+                raise SMTPException('Unavailable')
+            mail.outbox.extend(messages)
+            return 1
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=send_messages):
+            drain_outbox()
+        failing = OutboxMessage.objects.get(pk=failing.pk)
+        eq_(failing.status, OutboxMessage.PENDING)
+        eq_(failing.attempts, 1)
+        eq_(failing.last_error, 'Unavailable')
+        ok_(failing.next_attempt > now() + timedelta(seconds=50))
+        eq_(len(mail.outbox), 1)
+
+        # Not due yet
+        drain_outbox()
+        eq_(len(mail.outbox), 1)
+
+        OutboxMessage.objects.filter(pk=failing.pk).update(next_attempt=now())
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=SMTPException('Unavailable')):
+            drain_outbox()
+        eq_(OutboxMessage.objects.get(pk=failing.pk).status, OutboxMessage.FAILED)
+
+    def test_single_worker(self):
+        _queue()
+        cache.add(DRAIN_LOCK_CACHE_KEY, True)
+        drain_outbox()
+        eq_(len(mail.outbox), 0)
+
+
+class PurgeOutboxTests(TestCase):
+    def test_purge(self):
+        _queue(3)
+        OutboxMessage.objects.filter(recipient='foo0@example.com').update(
+            status=OutboxMessage.SENT)
+        OutboxMessage.objects.filter(recipient='foo1@example.com').update(
+            status=OutboxMessage.FAILED)
+        OutboxMessage.objects.update(created=now() - timedelta(days=8))
+        purge_outbox()
+        eq_(list(OutboxMessage.objects.values_list('recipient', flat=True)),
+            ['foo2@example.com'])
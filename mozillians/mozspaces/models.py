@@ -8,6 +8,8 @@ from product_details import product_details
 from pytz import common_timezones
 from sorl.thumbnail import ImageField
 
+from mozillians.common.templatetags.helpers import get_image_variants
+
 
 COUNTRIES = product_details.get_regions('en-US').items()
 COUNTRIES = sorted(COUNTRIES, key=lambda country: country[1])
@@ -56,5 +58,9 @@ class Photo(models.Model):
     photofile = ImageField(upload_to=_calculate_photo_filename)
     mozspace = models.ForeignKey(MozSpace, related_name='photos')
 
+    def get_photo_variants(self, geometry):
+        """Return the WebP and JPEG variants of the photo."""
+        return get_image_variants(self.photofile, geometry, crop='center')
+
     def __unicode__(self):
         return unicode(self.id)
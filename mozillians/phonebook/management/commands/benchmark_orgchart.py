@@ -0,0 +1,67 @@
+"""
+Benchmark the orgchart builder against the previous per-employee lookups.
+
+Both builders run on the same generate_orgchart_entries() data. The previous one is
+kept here for comparison only.
+"""
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from anytree import Node
+from anytree.exporter import DictExporter
+
+from mozillians.phonebook.utils import (build_orgchart, generate_orgchart_entries,
+                                        get_profile_link_by_email)
+
+
+def legacy_build_orgchart(entries):
+    """Build the orgchart with anytree and one profile lookup per employee."""
+    graph = {'root': []}
+    for entry in entries:
+        if 'WorkersManagersEmployeeID' not in entry:
+            graph['root'].append(entry['EmployeeID'])
+            continue
+        graph.setdefault(entry['WorkersManagersEmployeeID'], []).append(entry['EmployeeID'])
+
+    nodes = {'root': Node(name='root', title='root')}
+    for entry in entries:
+        name = u'{0} {1}'.format(entry['PreferredFirstName'], entry['Preferred_Name_-_Last_Name'])
+        href = get_profile_link_by_email(entry['PrimaryWorkEmail'])
+        nodes[entry['EmployeeID']] = Node(name=name, title=entry['businessTitle'], href=href)
+
+    for key in graph:
+        parent = nodes[key]
+        for child in graph[key]:
+            node = nodes[child]
+            node.parent = nodes['root'] if node == parent else parent
+
+    return DictExporter().export(nodes['root'])
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the orgchart builder on mock HR data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', default=10000, type=int,
+                            help='Number of mock employees, defaults to 10000.')
+
+    def handle(self, *args, **options):
+        entries = generate_orgchart_entries(options['employees'])
+        # Log every query, the default log is capped below the legacy query count
+        queries_log, force_debug_cursor = connection.queries_log, connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        try:
+            for name, builder in [('legacy', legacy_build_orgchart),
+                                  ('set-based', build_orgchart)]:
+                connection.queries_log = deque()
+                start = time.time()
+                builder(entries)
+                elapsed = time.time() - start
+                self.stdout.write('{0}: {1:.3f}s, {2} queries'.format(
+                    name, elapsed, len(connection.queries_log)))
+        finally:
+            connection.queries_log = queries_log
+            connection.force_debug_cursor = force_debug_cursor
@@ -0,0 +1,9 @@
+from mozillians.celery import app
+
+
+@app.task(ignore_result=True)
+def refresh_orgchart_task():
+    """Rebuild the cached orgchart from the HR data."""
+    from mozillians.phonebook.utils import refresh_orgchart
+
+    refresh_orgchart()
@@ -1,10 +1,22 @@
-from nose.tools import eq_
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
 
 from mozillians.common.tests import TestCase
 from mozillians.users.models import IdpProfile, UserProfile
 from mozillians.users.tests import UserFactory
 
-from mozillians.phonebook.utils import get_profile_link_by_email
+from mozillians.phonebook.utils import (ORGCHART_LOCK_CACHE_KEY, OrgchartIndex, build_orgchart,
+                                        generate_orgchart_entries, get_orgchart_index,
+                                        get_orgchart_json,
+                                        get_profile_link_by_email, get_profile_links_by_email,
+                                        refresh_orgchart)
 
 
 class UtilsTests(TestCase):
@@ -26,3 +38,184 @@ class UtilsTests(TestCase):
         profile = UserProfile.objects.get(pk=user.userprofile.pk)
         link = get_profile_link_by_email(user.email)
         eq_(link, profile.get_absolute_url())
+
+
+def _entry(employee_id, manager_id=None):
+    entry = {
+        'PreferredFirstName': 'First',
+        'Preferred_Name_-_Last_Name': employee_id,
+        'businessTitle': 'Title',
+        'EmployeeID': employee_id,
+        'PrimaryWorkEmail': '{0}@example.com'.format(employee_id),
+    }
+    if manager_id:
+        entry['WorkersManagersEmployeeID'] = manager_id
+    return entry
+
+
+def _names(node):
+    return [(child['name'], _names(child)) for child in node.get('children', [])]
+
+
+class BuildOrgchartTests(TestCase):
+    def test_tree(self):
+        entries = [_entry('a'), _entry('b', 'a'), _entry('c', 'a'), _entry('d', 'b')]
+        orgchart = build_orgchart(entries)
+        eq_(orgchart['name'], 'root')
+        eq_(_names(orgchart),
+            [('First a', [('First b', [('First d', [])]), ('First c', [])])])
+        eq_(orgchart['children'][0]['href'], '')
+        ok_('children' not in orgchart['children'][0]['children'][1])
+
+    def test_cycles(self):
+        entries = [_entry('a'), _entry('b', 'c'), _entry('c', 'b'), _entry('d', 'c'),
+                   _entry('e', 'e'), _entry('f', 'missing')]
+        orgchart = build_orgchart(entries)
+        eq_(_names(orgchart),
+            [('First a', []), ('First e', []), ('First f', []),
+             ('First b', [('First c', [('First d', [])])])])
+
+    def test_links_single_query(self):
+        user = UserFactory.create()
+        IdpProfile.objects.create(profile=user.userprofile, auth0_user_id='email|',
+                                  email='a@example.com', primary=True)
+        with self.assertNumQueries(1):
+            links = get_profile_links_by_email(['a@example.com', 'b@example.com'])
+        eq_(links, {'a@example.com': user.userprofile.get_absolute_url()})
+
+    def test_links_duplicate_email(self):
+        for i in range(2):
+            IdpProfile.objects.create(profile=UserFactory.create().userprofile,
+                                      auth0_user_id='email|{0}'.format(i),
+                                      email='a@example.com', primary=True)
+        eq_(get_profile_links_by_email(['a@example.com']), {})
+
+    def test_links_mixed_case(self):
+        user = UserFactory.create()
+        IdpProfile.objects.create(profile=user.userprofile, auth0_user_id='email|',
+                                  email='a@example.com', primary=True)
+        entry = _entry('a')
+        entry['PrimaryWorkEmail'] = 'A@Example.com'
+        orgchart = build_orgchart([entry])
+        eq_(orgchart['children'][0]['href'], user.userprofile.get_absolute_url())
+
+    def test_links_duplicate_email_mixed_case(self):
+        for i, email in enumerate(['A@example.com', 'a@example.com']):
+            IdpProfile.objects.create(profile=UserFactory.create().userprofile,
+                                      auth0_user_id='email|{0}'.format(i),
+                                      email=email, primary=True)
+        eq_(get_profile_links_by_email(['A@example.com']), {})
+
+    def test_generated_entries(self):
+        entries = generate_orgchart_entries(50)
+        eq_(len(entries), 50)
+        eq_(len(build_orgchart(entries)['children']), 1)
+        eq_(len(OrgchartIndex(build_orgchart(entries)).nodes), 51)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'orgchart'}}, ORGCHART_MAX_AGE=60)
+class CachedOrgchartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('mozillians.phonebook.tasks.refresh_orgchart_task.delay')
+    @patch('mozillians.phonebook.utils.create_orgchart')
+    def test_stale_while_revalidate(self, create_mock, task_mock):
+        eq_(get_orgchart_json(), None)
+        eq_(task_mock.call_count, 1)
+
+        create_mock.return_value = {'name': 'root'}
+        ok_(refresh_orgchart())
+        task_mock.reset_mock()
+        eq_(json.loads(get_orgchart_json()), {'name': 'root'})
+        ok_(not task_mock.called)
+
+        # A failed build keeps the last good version
+        create_mock.side_effect = Exception
+        with patch('mozillians.phonebook.utils.time.time', return_value=time.time() + 120):
+            ok_(not refresh_orgchart())
+            eq_(json.loads(get_orgchart_json()), {'name': 'root'})
+        eq_(task_mock.call_count, 1)
+
+    @patch('mozillians.phonebook.tasks.refresh_orgchart_task.delay')
+    @patch('mozillians.phonebook.utils.create_orgchart')
+    def test_single_flight(self, create_mock, task_mock):
+        cache.add(ORGCHART_LOCK_CACHE_KEY, True)
+        ok_(not refresh_orgchart())
+        ok_(not create_mock.called)
+        eq_(get_orgchart_json(), None)
+        ok_(not task_mock.called)
+
+    @patch('mozillians.phonebook.tasks.refresh_orgchart_task.delay')
+    @patch('mozillians.phonebook.utils.create_orgchart')
+    def test_single_refresh_queued(self, create_mock, task_mock):
+        create_mock.return_value = {'name': 'root'}
+        for i in range(5):
+            get_orgchart_json()
+            get_orgchart_index()
+        eq_(task_mock.call_count, 1)
+
+        # The first queued task builds the orgchart, later ones skip the build
+        ok_(refresh_orgchart())
+        ok_(not refresh_orgchart())
+        eq_(create_mock.call_count, 1)
+
+        # Once stale again, reads queue a new refresh
+        with patch('mozillians.phonebook.utils.time.time', return_value=time.time() + 120):
+            get_orgchart_json()
+            get_orgchart_json()
+        eq_(task_mock.call_count, 2)
+
+
+class OrgchartIndexTests(TestCase):
+    def setUp(self):
+        entries = [_entry('a'), _entry('b', 'a'), _entry('c', 'a'), _entry('d', 'b')]
+        entries[3]['businessTitle'] = 'Staff Engineer'
+        self.index = OrgchartIndex(build_orgchart(entries))
+
+    def test_children(self):
+        eq_([child['id'] for child in self.index.children('root')], ['a'])
+        eq_(self.index.children('a'), [
+            {'id': 'b', 'name': 'First b', 'title': 'Title', 'href': '', 'has_children': True},
+            {'id': 'c', 'name': 'First c', 'title': 'Title', 'href': '', 'has_children': False},
+        ])
+        eq_(self.index.children('d'), [])
+
+    def test_ancestors(self):
+        eq_([node['id'] for node in self.index.ancestors('d')], ['a', 'b'])
+        eq_(self.index.ancestors('a'), [])
+
+    def test_subtree(self):
+        subtree = self.index.subtree('root', 2)
+        eq_(_names(subtree), [('First a', [('First b', []), ('First c', [])])])
+        ok_('children' not in subtree['children'][0]['children'][0])
+        ok_(subtree['children'][0]['children'][0]['has_children'])
+        ok_('children' not in self.index.subtree('a', 0))
+
+    def test_search(self):
+        eq_([node['id'] for node in self.index.search('first')], ['a', 'b', 'c', 'd'])
+        eq_([node['id'] for node in self.index.search('ENG fir')], ['d'])
+        eq_(self.index.search('ENG fir')[0]['path'], ['First a', 'First b'])
+        eq_(self.index.search('first', limit=1)[0]['id'], 'a')
+        eq_(self.index.search('manager'), [])
+        eq_(self.index.search(''), [])
+
+    @patch('mozillians.phonebook.tasks.refresh_orgchart_task.delay')
+    @patch('mozillians.phonebook.utils.create_orgchart')
+    def test_index_rebuilt_on_refresh(self, create_mock, task_mock):
+        cache.clear()
+        eq_(get_orgchart_index(), None)
+
+        create_mock.return_value = build_orgchart([_entry('a')])
+        refresh_orgchart()
+        index = get_orgchart_index()
+        eq_(sorted(index.nodes), ['a', 'root'])
+        ok_(get_orgchart_index() is index)
+
+        create_mock.return_value = build_orgchart([_entry('a'), _entry('b', 'a')])
+        stale = time.time() + settings.ORGCHART_MAX_AGE + 1
+        with patch('mozillians.phonebook.utils.time.time', return_value=stale):
+            refresh_orgchart()
+        ok_('b' in get_orgchart_index().nodes)
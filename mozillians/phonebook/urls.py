@@ -64,4 +64,11 @@ urlpatterns = [
     # OrgChart
     url(r'^orgchart$', phonebook_views.orgchart, name='orgchart'),
     url(r'^orgchart/json$', phonebook_views.orgchart_json, name='orgchart_json'),
+    url(r'^orgchart/search$', phonebook_views.orgchart_search, name='orgchart_search'),
+    url(r'^orgchart/(?P<employee_id>[^/]+)/children$', phonebook_views.orgchart_children,
+        name='orgchart_children'),
+    url(r'^orgchart/(?P<employee_id>[^/]+)/ancestors$', phonebook_views.orgchart_ancestors,
+        name='orgchart_ancestors'),
+    url(r'^orgchart/(?P<employee_id>[^/]+)/subtree$', phonebook_views.orgchart_subtree,
+        name='orgchart_subtree'),
 ]
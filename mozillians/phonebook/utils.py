@@ -1,13 +1,19 @@
 import boto3
 import datetime
 import json
-import waffle
+import logging
+import random
+import re
+import time
+import zlib
+from bisect import bisect_left
 
-from anytree import Node
-from anytree.exporter import DictExporter
+import waffle
 
 from django.conf import settings
+from django.core.cache import cache
 
+from mozillians.common.urlresolvers import reverse
 from mozillians.phonebook.models import Invite
 from mozillians.users.models import IdpProfile
 
@@ -30,67 +36,322 @@ def redeem_invite(redeemer, code):
     invite.save()
 
 
-def create_orgchart():
-    """Generate orgchart dict from s3 json dump."""
+# Maximum number of emails per IN clause of the profile link lookup
+ORGCHART_EMAIL_BATCH_SIZE = 500
+ORGCHART_CACHE_KEY = 'orgchart_data'
+ORGCHART_BUILT_CACHE_KEY = 'orgchart_built'
+ORGCHART_LOCK_CACHE_KEY = 'orgchart_refresh_lock'
+ORGCHART_QUEUED_CACHE_KEY = 'orgchart_refresh_queued'
+ORGCHART_ROOT_ID = 'root'
 
-    s3 = boto3.resource('s3')
+logger = logging.getLogger(__name__)
 
+
+def fetch_orgchart_entries():
+    """Return the HR entries of the orgchart from the s3 json dump."""
     if waffle.switch_is_active('use_mock_hr'):
         # Do not import mock data in prod
         from mozillians.users.tests import MockOrgChart
         orgchart_json = MockOrgChart.generate_json()
     else:
+        s3 = boto3.resource('s3')
         orgchart_object = s3.Object(settings.ORGCHART_BUCKET, settings.ORGCHART_KEY).get()
         orgchart_json = orgchart_object['Body'].read()
 
-    data = json.loads(orgchart_json)
+    return json.loads(orgchart_json)['Report_Entry']
+
+
+def create_orgchart():
+    """Generate orgchart dict from s3 json dump."""
+    return build_orgchart(fetch_orgchart_entries())
+
+
+def refresh_orgchart():
+    """Build the orgchart and store it as the last good version.
+
+    Only one refresh runs at a time, return False if another one holds
+    the lock or if the stored version is not stale yet, for example when
+    it was built by a refresh queued at the same time. A failed build
+    keeps the previous version.
+    """
+    if not cache.add(ORGCHART_LOCK_CACHE_KEY, True, settings.ORGCHART_REFRESH_LOCK_TIMEOUT):
+        return False
+    try:
+        # Stale reads can queue a new refresh from now on
+        cache.delete(ORGCHART_QUEUED_CACHE_KEY)
+        if not _is_orgchart_stale(cache.get(ORGCHART_BUILT_CACHE_KEY)):
+            return False
+        orgchart = create_orgchart()
+        built = time.time()
+        # Stored as compressed JSON to stay below the cache item size limit.
+        # The build time is also stored on its own so that checking for a
+        # new version does not fetch the whole orgchart.
+        cache.set_many({
+            ORGCHART_CACHE_KEY: {'built': built, 'json': zlib.compress(json.dumps(orgchart))},
+            ORGCHART_BUILT_CACHE_KEY: built,
+        }, timeout=None)
+    except Exception:
+        logger.exception('Failed to build the orgchart')
+        return False
+    finally:
+        cache.delete(ORGCHART_LOCK_CACHE_KEY)
+    return True
+
+
+def get_orgchart_json():
+    """Return the JSON of the last built orgchart, or None if none was built yet.
+
+    A background refresh is queued when the orgchart is older than
+    ORGCHART_MAX_AGE, the stale version is returned in the meantime.
+    """
+    cached = cache.get(ORGCHART_CACHE_KEY)
+    _queue_stale_orgchart_refresh(cached and cached['built'])
+    if not cached:
+        return None
+    return zlib.decompress(cached['json'])
+
+
+def _is_orgchart_stale(built):
+    return not built or built + settings.ORGCHART_MAX_AGE < time.time()
+
+
+def _queue_stale_orgchart_refresh(built):
+    """Queue a background refresh if the orgchart built at `built` is stale.
+
+    Only one refresh is queued until a worker picks it up, the queued flag
+    expires in case the task is lost.
+    """
+    # Avoid circular imports
+    from mozillians.phonebook.tasks import refresh_orgchart_task
+
+    if (_is_orgchart_stale(built) and not cache.get(ORGCHART_LOCK_CACHE_KEY) and
+            cache.add(ORGCHART_QUEUED_CACHE_KEY, True, settings.ORGCHART_REFRESH_LOCK_TIMEOUT)):
+        refresh_orgchart_task.delay()
+
+
+class OrgchartIndex(object):
+    """Lookup tables over a built orgchart, keyed by employee id.
+
+    Nodes are returned as flat summaries, children are only included
+    up to the requested depth so that the tree can be loaded lazily.
+    """
+
+    def __init__(self, orgchart, built=None):
+        self.built = built
+        self.nodes = {}
+        self.parents = {}
+        terms = {}
+        stack = [(orgchart, None)]
+        while stack:
+            node, parent_id = stack.pop()
+            node_id = node['id']
+            self.nodes[node_id] = node
+            self.parents[node_id] = parent_id
+            if node_id != ORGCHART_ROOT_ID:
+                for term in _orgchart_terms(u'{0} {1}'.format(node['name'], node['title'])):
+                    terms.setdefault(term, set()).add(node_id)
+            stack.extend((child, node_id) for child in node.get('children', []))
+        self.terms = terms
+        self.vocabulary = sorted(terms)
+
+    def summary(self, node_id):
+        node = self.nodes[node_id]
+        return {
+            'id': node_id,
+            'name': node['name'],
+            'title': node['title'],
+            'href': node.get('href', ''),
+            'has_children': bool(node.get('children')),
+        }
 
-    entries = data['Report_Entry']
-    graph = {
-        'root': [],
-    }
+    def children(self, node_id):
+        """Return the summaries of the direct reports of node_id."""
+        return [self.summary(child['id']) for child in self.nodes[node_id].get('children', [])]
 
-    # Create adjacency list
+    def ancestors(self, node_id):
+        """Return the management chain of node_id, from the top down."""
+        chain = []
+        parent_id = self.parents[node_id]
+        while parent_id not in (None, ORGCHART_ROOT_ID):
+            chain.append(self.summary(parent_id))
+            parent_id = self.parents[parent_id]
+        chain.reverse()
+        return chain
+
+    def subtree(self, node_id, depth=1):
+        """Return the summary of node_id with its reports up to depth levels down."""
+        result = self.summary(node_id)
+        if depth > 0 and result['has_children']:
+            result['children'] = [self.subtree(child['id'], depth - 1)
+                                  for child in self.nodes[node_id]['children']]
+        return result
+
+    def search(self, query, limit=20):
+        """Return the summaries of the employees matching every word of query.
+
+        Words match as prefixes of the name and title words.
+        """
+        matches = None
+        for word in set(_orgchart_terms(query)):
+            ids = set()
+            i = bisect_left(self.vocabulary, word)
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(word):
+                ids.update(self.terms[self.vocabulary[i]])
+                i += 1
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+        if not matches:
+            return []
+
+        results = []
+        for node_id in sorted(matches, key=lambda node_id: self.nodes[node_id]['name'])[:limit]:
+            result = self.summary(node_id)
+            result['path'] = [ancestor['name'] for ancestor in self.ancestors(node_id)]
+            results.append(result)
+        return results
+
+
+def _orgchart_terms(text):
+    return re.findall(r'\w+', text.lower(), re.UNICODE)
+
+
+_orgchart_index = None
+
+
+def get_orgchart_index():
+    """Return the OrgchartIndex of the last built orgchart, or None if none was built yet.
+
+    The index is kept in memory and rebuilt only when a new orgchart
+    version shows up in the cache.
+    """
+    global _orgchart_index
+    built = cache.get(ORGCHART_BUILT_CACHE_KEY)
+    _queue_stale_orgchart_refresh(built)
+    if built is None:
+        return None
+    if _orgchart_index is None or _orgchart_index.built != built:
+        cached = cache.get(ORGCHART_CACHE_KEY)
+        if not cached:
+            return _orgchart_index
+        _orgchart_index = OrgchartIndex(json.loads(zlib.decompress(cached['json'])),
+                                        cached['built'])
+    return _orgchart_index
+
+
+def build_orgchart(entries):
+    """Build the nested orgchart dict from a list of HR entries.
+
+    Employees without a known manager and employees whose management
+    chain forms a cycle are attached to the root node.
+    """
+    links = get_profile_links_by_email(entry['PrimaryWorkEmail'] for entry in entries)
+    root = {'id': ORGCHART_ROOT_ID, 'name': 'root', 'title': 'root'}
+    nodes = {}
+    managers = {}
+
+    for entry in entries:
+        employee_id = entry['EmployeeID']
+        nodes[employee_id] = {
+            'id': employee_id,
+            'name': u'{0} {1}'.format(entry['PreferredFirstName'],
+                                      entry['Preferred_Name_-_Last_Name']),
+            'title': entry['businessTitle'],
+            'href': links.get(entry['PrimaryWorkEmail'].lower(), ''),
+        }
+        managers[employee_id] = entry.get('WorkersManagersEmployeeID')
+
+    # Link every node to its manager, in the order of the HR entries
+    for employee_id, manager_id in managers.items():
+        if manager_id not in nodes or manager_id == employee_id:
+            managers[employee_id] = None
     for entry in entries:
-        if 'WorkersManagersEmployeeID' not in entry:
-            graph['root'].append(entry['EmployeeID'])
+        employee_id = entry['EmployeeID']
+        parent = nodes.get(managers[employee_id], root)
+        parent.setdefault('children', []).append(nodes[employee_id])
+
+    # Nodes unreachable from the root are part of, or below, a cycle.
+    # Break each cycle by moving one of its nodes to the root.
+    reached = _reachable(root)
+    for entry in entries:
+        employee_id = entry['EmployeeID']
+        if id(nodes[employee_id]) in reached:
             continue
+        seen = set()
+        while employee_id not in seen:
+            seen.add(employee_id)
+            employee_id = managers[employee_id]
+        node = nodes[employee_id]
+        siblings = nodes[managers[employee_id]]['children']
+        siblings[:] = [sibling for sibling in siblings if sibling is not node]
+        managers[employee_id] = None
+        root.setdefault('children', []).append(node)
+        reached.update(_reachable(node))
 
-        if entry['WorkersManagersEmployeeID'] not in graph:
-            graph[entry['WorkersManagersEmployeeID']] = [entry['EmployeeID']]
-        else:
-            graph[entry['WorkersManagersEmployeeID']].append(entry['EmployeeID'])
+    return root
 
-    # Create nodes dict
-    nodes = {
-        'root': Node(name='root', title='root')
-    }
 
-    for entry in entries:
-        # Encode values to utf8
-        first_name = entry['PreferredFirstName'].encode('utf8')
-        last_name = entry['Preferred_Name_-_Last_Name'].encode('utf8')
-        name = '{} {}'.format(first_name, last_name)
-        title = entry['businessTitle'].encode('utf8')
-        href = get_profile_link_by_email(entry['PrimaryWorkEmail']).encode('utf8')
-
-        nodes[entry['EmployeeID']] = Node(name=name, title=title, href=href)
-
-    # Create graph
-    for key in graph:
-        parent = nodes[key]
-        for child in graph[key]:
-            node = nodes[child]
-
-            if node == parent:
-                # Workaround for data incosistency
-                node.parent = nodes['root']
-                continue
-
-            node.parent = parent
-
-    exporter = DictExporter()
-    return exporter.export(nodes['root'])
+def _reachable(node):
+    """Return the ids of the node dicts of the subtree of node."""
+    reached = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        reached.add(id(node))
+        stack.extend(node.get('children', []))
+    return reached
+
+
+def generate_orgchart_entries(count):
+    """Return count mock HR entries forming a random tree.
+
+    Used to benchmark the orgchart builder, every employee but the first
+    reports to a random previous one.
+    """
+    entries = []
+    for i in range(count):
+        entry = {
+            'PreferredFirstName': 'Employee',
+            'Preferred_Name_-_Last_Name': str(i),
+            'businessTitle': 'Title {0}'.format(i % 50),
+            'EmployeeID': str(i),
+            'PrimaryWorkEmail': 'employee{0}@example.com'.format(i),
+            'IsManager': False,
+        }
+        if entries:
+            manager = random.choice(entries)
+            manager['IsManager'] = True
+            entry.update({
+                'WorkersManager': u'{0} {1}'.format(manager['PreferredFirstName'],
+                                                    manager['Preferred_Name_-_Last_Name']),
+                'WorkersManagersEmployeeID': manager['EmployeeID'],
+            })
+        entries.append(entry)
+    return entries
+
+
+def get_profile_links_by_email(emails):
+    """Return a dict of profile links keyed by lower-cased primary identity email.
+
+    Emails are compared case-insensitively, emails matching more than one
+    primary identity are skipped.
+    """
+    # Keep the original spelling too, in case the database collation is case-sensitive
+    emails = list(set(email for original in emails for email in (original, original.lower())))
+    usernames = {}
+    duplicates = set()
+    for i in range(0, len(emails), ORGCHART_EMAIL_BATCH_SIZE):
+        identities = (IdpProfile.objects
+                      .filter(email__in=emails[i:i + ORGCHART_EMAIL_BATCH_SIZE], primary=True)
+                      .values_list('email', 'profile__user__username'))
+        for email, username in identities:
+            email = email.lower()
+            if email in usernames and usernames[email] != username:
+                duplicates.add(email)
+            usernames[email] = username
+
+    return dict((email, reverse('phonebook:profile_view', args=[username]))
+                for email, username in usernames.items() if email not in duplicates)
 
 
 def get_profile_link_by_email(email):
@@ -8,7 +8,6 @@ from django.contrib.auth.views import logout as auth_logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.http import (HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, Http404,
                          JsonResponse)
 from django.shortcuts import get_object_or_404, render
@@ -35,13 +34,14 @@ from waffle.decorators import waffle_flag
 from mozillians.api.models import APIv2App
 from mozillians.common.decorators import allow_public, allow_unvouched
 from mozillians.common.middleware import LOGIN_MESSAGE, GET_VOUCHED_MESSAGE
-from mozillians.common.templatetags.helpers import (get_object_or_none, nonprefixed_url, redirect,
-                                                    urlparams)
+from mozillians.common.templatetags.helpers import (get_object_or_none, get_privacy_level,
+                                                    nonprefixed_url, redirect,
+                                                    set_privacy_aware_photo_urls, urlparams)
 from mozillians.common.urlresolvers import reverse
 from mozillians.groups.models import Group
 import mozillians.phonebook.forms as forms
 from mozillians.phonebook.models import Invite
-from mozillians.phonebook.utils import create_orgchart, redeem_invite
+from mozillians.phonebook.utils import get_orgchart_index, get_orgchart_json, redeem_invite
 from mozillians.users.managers import EMPLOYEES, MOZILLIANS, PUBLIC, PRIVATE
 from mozillians.users.models import AbuseReport, ExternalAccount, IdpProfile, UserProfile
 from mozillians.users.tasks import (check_spam_account, send_userprofile_to_cis,
@@ -368,6 +368,7 @@ def change_primary_contact_identity(request, identity_pk):
     if alternate_identities.filter(primary_contact_identity=True).exists():
         alternate_identities.filter(pk=identity_pk).update(primary_contact_identity=True)
         alternate_identities.exclude(pk=identity_pk).update(primary_contact_identity=False)
+        profile.update_gravatar_hash()
 
         msg = _(u'Primary Contact Identity successfully updated.')
         messages.success(request, msg)
@@ -560,6 +561,18 @@ class PhonebookSearchView(SearchView):
         context_data['country'] = self.kwargs.get('country')
         context_data['region'] = self.kwargs.get('region')
         context_data['city'] = self.kwargs.get('city')
+
+        page_obj = context_data.get('page_obj')
+        if page_obj:
+            profiles = []
+            for result in page_obj.object_list:
+                if result.model_name == 'userprofile':
+                    profiles.append(result.object)
+                elif result.model_name == 'idpprofile' and result.object:
+                    profiles.append(result.object.profile)
+            # Same geometry as includes/search_result.html
+            set_privacy_aware_photo_urls([profile for profile in profiles if profile],
+                                         get_privacy_level(self.request), '70x70')
         return context_data
 
 
@@ -727,6 +740,9 @@ class VerifyIdentityCallbackView(View):
                 # Also update the primary email of the user
                 update_email_in_basket(profile.user.email, idp.email)
                 User.objects.filter(pk=profile.user.id).update(email=idp.email)
+                profile.user.email = idp.email
+                profile.sync_emails()
+                profile.update_gravatar_hash()
                 append_msg = ' You need to use this identity the next time you will login.'
 
             send_userprofile_to_cis.delay(profile.pk)
@@ -766,15 +782,63 @@ def orgchart(request):
 @waffle_flag('view-orgchart')
 @never_cache
 def orgchart_json(request):
-    """Expose mock orgchart json."""
+    """Expose the orgchart json, built in the background."""
+
+    data = get_orgchart_json()
+    if data is None:
+        return _orgchart_unavailable()
+
+    return HttpResponse(data, content_type='application/json')
+
+
+def _orgchart_unavailable():
+    response = JsonResponse({'error': 'The orgchart is being built.'}, status=503)
+    response['Retry-After'] = 60
+    return response
+
+
+def _orgchart_node_response(employee_id, lookup, *args):
+    """Return the result of the OrgchartIndex method `lookup` for employee_id as JSON."""
+    index = get_orgchart_index()
+    if index is None:
+        return _orgchart_unavailable()
+    if employee_id not in index.nodes:
+        raise Http404
+    return JsonResponse(getattr(index, lookup)(employee_id, *args), safe=False)
+
+
+@waffle_flag('view-orgchart')
+@never_cache
+def orgchart_children(request, employee_id):
+    """Expose the direct reports of an employee."""
+    return _orgchart_node_response(employee_id, 'children')
 
-    data = None
-    if settings.ORGCHART_ENABLE_CACHE:
-        data = cache.get('orgchart_data')
 
-    if not data:
-        data = create_orgchart()
-        if settings.ORGCHART_ENABLE_CACHE:
-            cache.set('orgchart_data', data, 60 * 5)
+@waffle_flag('view-orgchart')
+@never_cache
+def orgchart_ancestors(request, employee_id):
+    """Expose the management chain of an employee."""
+    return _orgchart_node_response(employee_id, 'ancestors')
+
 
-    return JsonResponse(data)
+@waffle_flag('view-orgchart')
+@never_cache
+def orgchart_subtree(request, employee_id):
+    """Expose an employee with the reports up to `depth` levels down."""
+    try:
+        depth = int(request.GET.get('depth', 1))
+    except ValueError:
+        depth = 1
+    depth = max(0, min(depth, settings.ORGCHART_MAX_DEPTH))
+    return _orgchart_node_response(employee_id, 'subtree', depth)
+
+
+@waffle_flag('view-orgchart')
+@never_cache
+def orgchart_search(request):
+    """Search the orgchart by employee name and title."""
+    index = get_orgchart_index()
+    if index is None:
+        return _orgchart_unavailable()
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse(index.search(query, settings.ORGCHART_SEARCH_LIMIT), safe=False)
@@ -1,9 +1,10 @@
 import graphene
 
 from mozillians.graphql import query
+from mozillians.users import schema as users_schema
 
 
-class Query(query.Query, graphene.ObjectType):
+class Query(query.Query, users_schema.Query, graphene.ObjectType):
     """Top level Query.
 
     This class inherits from multiple queries throughout the project.
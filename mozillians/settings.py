@@ -70,6 +70,7 @@ INSTALLED_APPS = (
     'mozillians.humans',
     'mozillians.geo',
     'mozillians.graphql',
+    'mozillians.mailer',
 
     'sorl.thumbnail',
     'import_export',
@@ -233,12 +234,31 @@ SUPPORTED_NONLOCALES = [
 
 # Email
 SERVER_EMAIL = config('SERVER_EMAIL', default='prod@mozillians.org')
-EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+# Backend delivering the emails. Unless MAILER_USE_OUTBOX is disabled, emails
+# are stored in the outbox and delivered with this backend by a celery task.
+# Use django.core.mail.backends.filebased.EmailBackend with EMAIL_FILE_PATH
+# to inspect the delivered emails locally.
+MAILER_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+MAILER_USE_OUTBOX = config('MAILER_USE_OUTBOX', default=True, cast=bool)
+if MAILER_USE_OUTBOX:
+    EMAIL_BACKEND = 'mozillians.mailer.backends.OutboxBackend'
+else:
+    EMAIL_BACKEND = MAILER_BACKEND
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default='/tmp/mozillians-emails')
+# Number of messages sent per outbox query
+MAILER_BATCH_SIZE = 100
+# Seconds before the first retry of a failed email, doubled on every attempt
+MAILER_RETRY_DELAY = 60
+MAILER_MAX_ATTEMPTS = 6
+# Seconds during which the same email to the same recipient is sent only once
+MAILER_DEDUPE_WINDOW = 60 * 60
+MAILER_LOCK_TIMEOUT = 10 * 60
+MAILER_RETENTION_DAYS = 7
 FROM_NOREPLY = config('FROM_NOREPLY', default='Mozillians.org <no-reply@mozillians.org>')
 FROM_NOREPLY_VIA = config('FROM_NOREPLY_VIA',
                           default='%s via Mozillians.org <noreply@mozillians.org>')
 
-if EMAIL_BACKEND == 'django_ses.SESBackend':
+if MAILER_BACKEND == 'django_ses.SESBackend':
     if config('AWS_SES_OVERRIDE_BOTO', default=False, cast=bool):
         AWS_SES_ACCESS_KEY_ID = config('AWS_SES_ACCESS_KEY_ID')
         AWS_SES_SECRET_ACCESS_KEY = config('AWS_SES_SECRET_ACCESS_KEY')
@@ -691,18 +711,44 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'mozillians.api.v2.throttling.APIv2AppRateThrottle',
+    ),
+    # Per APIv2App key quotas, based on the privacy level of the app
+    'DEFAULT_THROTTLE_RATES': {
+        'apiv2_private': config('API_V2_THROTTLE_RATE_PRIVATE', default='10000/hour'),
+        'apiv2_mozillians': config('API_V2_THROTTLE_RATE_MOZILLIANS', default='5000/hour'),
+        'apiv2_public': config('API_V2_THROTTLE_RATE_PUBLIC', default='2000/hour'),
+    },
 }
 
 # Orgchart s3
 ORGCHART_BUCKET = config('ORGCHART_BUCKET', default='mozillians-orgchart')
 ORGCHART_KEY = config('ORGCHART_KEY', default='org_chart.json')
-ORGCHART_ENABLE_CACHE = config('ORGCHART_ENABLE_CACHE', default=False, cast=bool)
+# Age in seconds after which a request queues a rebuild of the orgchart
+ORGCHART_MAX_AGE = config('ORGCHART_MAX_AGE', default=30 * 60, cast=int)
+ORGCHART_REFRESH_LOCK_TIMEOUT = config('ORGCHART_REFRESH_LOCK_TIMEOUT', default=10 * 60, cast=int)
+# Limits of the lazy loading orgchart endpoints
+ORGCHART_MAX_DEPTH = 5
+ORGCHART_SEARCH_LIMIT = 20
 
 # Django Graphene
 GRAPHENE = {
     'SCHEMA': 'mozillians.schema.schema'
 }
 V2_PROFILE_ENDPOINT = config('V2_PROFILE_ENDPOINT', default='')
+V2_PROFILE_TIMEOUT = config('V2_PROFILE_TIMEOUT', default=30, cast=int)
+# Seconds before the snapshot of the V2 profiles is revalidated
+V2_PROFILE_SNAPSHOT_TTL = config('V2_PROFILE_SNAPSHOT_TTL', default=300, cast=int)
+# GraphQL query limits, see mozillians.graphql.cost
+GRAPHQL_MAX_DEPTH = config('GRAPHQL_MAX_DEPTH', default=10, cast=int)
+GRAPHQL_MAX_COST = config('GRAPHQL_MAX_COST', default=500000, cast=int)
+# Cost units a client can spend per window (in seconds)
+GRAPHQL_COST_BUDGET = config('GRAPHQL_COST_BUDGET', default=2000000, cast=int)
+GRAPHQL_COST_BUDGET_WINDOW = config('GRAPHQL_COST_BUDGET_WINDOW', default=3600, cast=int)
+# Estimated list sizes used when the real size is unknown
+GRAPHQL_DEFAULT_LIST_SIZE = 10
+GRAPHQL_PROFILES_LIST_SIZE = 10000
 
 
 if DEV:
@@ -1,79 +1,86 @@
 $(document).ready(function() {
 
-  $.getJSON("/orgchart/json", function(data) {
+  var container = document.getElementById("chart-container");
+  var count = 0;
 
-    var container = document.getElementById("chart-container");
+  function url(node_id, endpoint) {
+    return "/orgchart/" + encodeURIComponent(node_id) + "/" + endpoint;
+  }
 
-    traverse(data);
+  function render(parent, node) {
+    var child = document.createElement("li");
+    var label = document.createElement("label");
+    var link;
+    var div = document.createElement("div");
+    var name = document.createTextNode(node.name);
 
+    if (node.href) {
+      link = document.createElement("a");
+      link.setAttribute("href", node.href);
+    } else {
+      link = document.createElement("span");
+    }
 
-    function render(parent, node, count) {
-      var child = document.createElement("li");
-      var label = document.createElement("label");
-      var link;
-      var div = document.createElement("div");
-      var name = document.createTextNode(node.name);
+    count++;
+    div.classList.add("toggle");
+    if (!node.has_children) {
+      child.classList.add("leaf");
+    } else {
+      var input = document.createElement("input");
+      input.setAttribute("id", count);
+      input.type = "checkbox";
+      parent.appendChild(input);
+      label.setAttribute("for", count);
 
-      if (node.href) {
-        link = document.createElement("a");
-        link.setAttribute("href", node.href);
+      if (node.children) {
+        renderChildren(div, node.children);
       } else {
-        link = document.createElement("span");
-      }
-
-      div.classList.add("toggle");
-      if (!node.children) {
-        child.classList.add("leaf");
-      } else {
-        var input = document.createElement("input");
-        input.setAttribute("id", count);
-        input.type = "checkbox";
-        parent.appendChild(input);
-        label.setAttribute("for", count);
+        // Reports are fetched the first time the node is expanded
+        $(input).one("change", function() {
+          $.getJSON(url(node.id, "children"), function(children) {
+            renderChildren(div, children);
+          });
+        });
       }
+    }
 
-      link.appendChild(name);
-      label.appendChild(link);
-      div.appendChild(label);
-      child.appendChild(div);
-      parent.appendChild(child);
-      return div;
-    };
-
-    function traverse(root) {
-      var queue = [root];
-      var count = 0;
+    link.appendChild(name);
+    label.appendChild(link);
+    div.appendChild(label);
+    child.appendChild(div);
+    parent.appendChild(child);
+    return div;
+  };
 
-      // Mark node as visited
-      root.visited = true;
-      root.dom_element = container;
-      root.level = 0;
-      count++;
+  function renderChildren(element, children) {
+    var list = document.createElement("ul");
+    element.appendChild(list);
+    children.forEach(function(node) {
+      render(list, node);
+    });
+  };
 
-      while (queue.length > 0) {
-        var curr = queue.shift();
-        parent = document.createElement("ul");
-
-
-        if (curr.children === undefined) {
-          continue;
-        }
-
-        curr.dom_element.appendChild(parent);
-        curr.children.forEach(function(elem) {
-          if (!elem.visited) {
-            // Render child node
-            child = render(parent, elem, count);
+  $.getJSON(url("root", "subtree"), {depth: 2}, function(root) {
+    renderChildren(container, root.children || []);
+  });
 
-            count++;
-            // Mark child node as visited
-            elem.visited = true;
-            elem.dom_element = child;
-            elem.level = curr.level + 1;
-            queue.push(elem);
-          };
-        });
-      };
-    };
+  var results = document.getElementById("orgchart-search-results");
+  $("#orgchart-search").on("input", function() {
+    var query = this.value;
+    if (query.length < 2) {
+      $(results).empty();
+      return;
+    }
+    $.getJSON("/orgchart/search", {q: query}, function(employees) {
+      $(results).empty();
+      employees.forEach(function(employee) {
+        var item = $("<li>");
+        var name = employee.href ? $("<a>").attr("href", employee.href) : $("<span>");
+        item.append(name.text(employee.name));
+        item.append($("<span>").addClass("title").text(employee.title));
+        item.append($("<span>").addClass("path").text(employee.path.join(" / ")));
+        $(results).append(item);
+      });
+    });
   });
 });
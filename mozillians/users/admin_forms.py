@@ -71,6 +71,8 @@ class UserProfileAdminForm(forms.ModelForm):
             self.instance.user.username = self.cleaned_data.get('username')
             self.instance.user.email = self.cleaned_data.get('email')
             self.instance.user.save()
+            # Keep the in-memory hash current, the profile is saved below
+            self.instance.update_gravatar_hash()
         return super(UserProfileAdminForm, self).save(*args, **kwargs)
 
     class Meta:
@@ -1,16 +1,40 @@
-from django.db.models import Q
+import base64
+import binascii
+import heapq
+from collections import OrderedDict
+
+from django.db.models import Count, Max, Prefetch, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
 
 import django_filters
 from rest_framework import serializers
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from mozillians.api.v2.viewsets import NoCacheReadOnlyModelViewSet
+from mozillians.api.v2.viewsets import NoCacheReadOnlyModelViewSet, make_etag
 from mozillians.common.templatetags.helpers import absolutify, markdown
 from mozillians.common.urlresolvers import reverse
 from mozillians.groups.models import Group, GroupMembership
 from mozillians.users.managers import PUBLIC
-from mozillians.users.models import ExternalAccount, IdpProfile, Language, UserProfile
+from mozillians.users.models import (ExternalAccount, IdpProfile, Language, UserProfile,
+                                     UserProfileTombstone)
+
+
+# Maximum number of entries returned by a page of the change feed
+CHANGES_PAGE_SIZE = 100
+
+# Maximum number of profiles returned by the bulk endpoint
+BULK_MAX_IDS = 200
+
+# Profiles sort before tombstones sharing the same timestamp. A position
+# ranked CHANGE_END is past every entry sharing its timestamp.
+CHANGE_PROFILE = 0
+CHANGE_TOMBSTONE = 1
+CHANGE_END = 2
 
 
 # Serializers
@@ -78,7 +102,27 @@ class UserProfileSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('username', 'is_vouched', '_url')
 
 
+class UserProfileChangeSerializer(serializers.HyperlinkedModelSerializer):
+    username = serializers.ReadOnlyField(source='user.username')
+    deleted = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserProfile
+        fields = ('id', 'username', 'is_vouched', 'last_updated', 'deleted', '_url')
+
+    def get_deleted(self, obj):
+        return False
+
+
 class UserProfileDetailedSerializer(serializers.HyperlinkedModelSerializer):
+    """Detailed profile representation.
+
+    All relations are read through all() or prefetch friendly model
+    properties, so serializing a queryset from prefetch_detailed() runs a
+    fixed number of queries regardless of the number of profiles.
+    """
+    PHOTO_GEOMETRIES = ('150x150', '300x300', '500x500')
+
     username = serializers.ReadOnlyField(source='user.username')
     email = serializers.ReadOnlyField()
     photo = serializers.SerializerMethodField()
@@ -87,9 +131,9 @@ class UserProfileDetailedSerializer(serializers.HyperlinkedModelSerializer):
     country = serializers.SerializerMethodField()
     region = serializers.SerializerMethodField()
     city = serializers.SerializerMethodField()
-    external_accounts = ExternalAccountSerializer(many=True, source='accounts')
+    external_accounts = ExternalAccountSerializer(many=True, source='_api_accounts')
     languages = LanguageSerializer(many=True)
-    websites = WebsiteSerializer(many=True)
+    websites = WebsiteSerializer(many=True, source='_api_websites')
     is_public = serializers.ReadOnlyField()
     url = serializers.SerializerMethodField()
 
@@ -101,33 +145,38 @@ class UserProfileDetailedSerializer(serializers.HyperlinkedModelSerializer):
                   'external_accounts', 'websites', 'tshirt', 'is_public', 'is_vouched',
                   '_url', 'url', 'city', 'region', 'country')
 
-    def _transform_privacy_wrapper(self, field):
+    @staticmethod
+    def _transform_privacy_wrapper(field):
 
-        def _transform_privacy(obj, value):
+        def _transform_privacy(serializer, obj, value):
             return {
                 'value': value,
                 'privacy': getattr(obj, 'get_privacy_{0}_display'.format(field))()
             }
         return _transform_privacy
 
-    def __init__(self, *args, **kwargs):
-        super(UserProfileDetailedSerializer, self).__init__(*args, **kwargs)
-
-        # If we don't define a custom transform method and if the
-        # field has a privacy setting, set the transform privacy
-        # wrapper.
-
-        for field in self.fields.keys():
-            method_name = 'transform_{0}'.format(field)
-
-            # Exclude `country`, `region`, `city` because they collide with the
-            # field aliases for `geo_country`, `geo_city`, `geo_region`
-            if field in ['country', 'region', 'city']:
-                return None
-
-            if ((not getattr(self, method_name, None) and
-                 getattr(UserProfile, 'get_privacy_{0}_display'.format(field), None))):
-                setattr(self, method_name, self._transform_privacy_wrapper(field))
+    @classmethod
+    def get_transforms(cls):
+        """Return the transform methods keyed by field, built once per class.
+
+        Fields without a custom transform method that have a privacy
+        setting are wrapped with their privacy.
+        """
+        if '_transforms' not in cls.__dict__:
+            transforms = {}
+            for field in cls.Meta.fields:
+                # Exclude `country`, `region`, `city` because they collide with the
+                # field aliases for `geo_country`, `geo_city`, `geo_region`
+                if field in ['country', 'region', 'city']:
+                    continue
+
+                method = getattr(cls, 'transform_{0}'.format(field), None)
+                if method is not None:
+                    transforms[field] = method
+                elif getattr(UserProfile, 'get_privacy_{0}_display'.format(field), None):
+                    transforms[field] = cls._transform_privacy_wrapper(field)
+            cls._transforms = transforms
+        return cls._transforms
 
     def get_url(self, obj):
         return absolutify(reverse('phonebook:profile_view',
@@ -148,12 +197,9 @@ class UserProfileDetailedSerializer(serializers.HyperlinkedModelSerializer):
         }
 
     def get_photo(self, obj):
-        return {
-            'value': obj.get_photo_url('300x300'),
-            '150x150': obj.get_photo_url('150x150'),
-            '300x300': obj.get_photo_url('300x300'),
-            '500x500': obj.get_photo_url('500x500'),
-        }
+        photo = obj.get_photo_urls(self.PHOTO_GEOMETRIES)
+        photo['value'] = photo['300x300']
+        return photo
 
     def transform_photo(self, obj, value):
         privacy_field = {'privacy': obj.get_privacy_photo_display()}
@@ -192,14 +238,30 @@ class UserProfileDetailedSerializer(serializers.HyperlinkedModelSerializer):
     def to_representation(self, instance):
         result = super(UserProfileDetailedSerializer, self).to_representation(instance)
 
-        for key, value in result.items():
-            method = getattr(self, 'transform_{}'.format(key), None)
-            if method is not None:
-                result[key] = method(self.instance, value)
+        for key, transform in self.get_transforms().items():
+            if key in result:
+                result[key] = transform(self, instance, result[key])
 
         return result
 
 
+def prefetch_detailed(queryset):
+    """Load the relations of UserProfileDetailedSerializer in bulk."""
+    memberships = (GroupMembership.objects.filter(status=GroupMembership.MEMBER)
+                   .select_related('group').order_by('group__name'))
+    return (queryset.select_related('user', 'country', 'region', 'city')
+            .prefetch_related('externalaccount_set', 'idp_profiles', 'language_set',
+                              Prefetch('groupmembership_set', queryset=memberships,
+                                       to_attr='_memberships')))
+
+
+def set_detailed_groups(profiles):
+    """Set the groups serialized by UserProfileDetailedSerializer on prefetched profiles."""
+    for profile in profiles:
+        profile._groups = [membership.group for membership in profile._memberships]
+    return profiles
+
+
 # Filters
 class UserProfileFilter(django_filters.FilterSet):
     city = django_filters.CharFilter(name='city__name')
@@ -221,25 +283,32 @@ class UserProfileFilter(django_filters.FilterSet):
 
     def filter_emails(self, queryset, name, value):
         """Return users with email matching either primary or alternate email address"""
-        legacy_qs = ExternalAccount.objects.filter(
-            type=ExternalAccount.TYPE_EMAIL,
-            identifier=value
-        )
-
-        idp_qs = IdpProfile.objects.filter(
-            email=value
-        )
-
-        legacy_users = legacy_qs.values_list('user__id', flat=True)
-        idp_users = idp_qs.values_list('profile__id', flat=True)
-        query = Q(id__in=legacy_users) | Q(id__in=idp_users) | Q(user__email=value)
-        return queryset.filter(query).distinct()
+        return queryset.filter(lookup_emails__email=value.lower())
 
     def filter_group(self, queryset, name, value):
         membership = GroupMembership.MEMBER
         return queryset.filter(groups__name=value, groupmembership__status=membership)
 
 
+# Change feed cursors
+def encode_change_cursor(timestamp, rank, pk):
+    value = '{0}|{1}|{2}'.format(timestamp.isoformat(), rank, pk)
+    return base64.urlsafe_b64encode(value)
+
+
+def decode_change_cursor(cursor):
+    """Return the (timestamp, rank, id) position encoded in a cursor."""
+    try:
+        timestamp, rank, pk = base64.urlsafe_b64decode(str(cursor)).split('|')
+        position = (parse_datetime(timestamp), int(rank), int(pk))
+    except (TypeError, ValueError, binascii.Error):
+        position = None
+    ranks = (CHANGE_PROFILE, CHANGE_TOMBSTONE, CHANGE_END)
+    if not position or not position[0] or position[1] not in ranks:
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+    return position
+
+
 # Views
 class UserProfileViewSet(NoCacheReadOnlyModelViewSet):
     """
@@ -260,10 +329,148 @@ class UserProfileViewSet(NoCacheReadOnlyModelViewSet):
         queryset = queryset.privacy_level(privacy_level)
         return queryset
 
+    def get_validators(self, pk):
+        """Return the ETag and Last-Modified validators of a profile.
+
+        The validators are computed with a single aggregate query over the
+        profile, its memberships, their groups and its identities and are
+        scoped by the privacy level of the request.
+        """
+        stats = (self.get_queryset().filter(pk=pk).order_by()
+                 .values('last_updated')
+                 .annotate(memberships_updated=Max('groupmembership__updated_on'),
+                           memberships=Count('groupmembership', distinct=True),
+                           groups_updated=Max('groupmembership__group__last_updated'),
+                           identities_updated=Max('idp_profiles__updated'),
+                           identities=Count('idp_profiles', distinct=True))).first()
+        if not stats:
+            raise Http404
+
+        etag = make_etag('userprofile', pk, self.request.privacy_level,
+                         stats['last_updated'], stats['memberships_updated'],
+                         stats['memberships'], stats['groups_updated'],
+                         stats['identities_updated'], stats['identities'])
+        last_modified = max(filter(None, [stats['last_updated'],
+                                          stats['memberships_updated'],
+                                          stats['groups_updated'],
+                                          stats['identities_updated']]))
+        return etag, last_modified
+
     def retrieve(self, request, pk):
-        user = get_object_or_404(self.get_queryset(), pk=pk)
-        group_ids = user.groupmembership_set.filter(
-            status=GroupMembership.MEMBER).values_list('group_id', flat=True)
-        user._groups = Group.objects.filter(id__in=group_ids)
+        etag, last_modified = self.get_validators(pk)
+        not_modified = self.get_not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+
+        user = get_object_or_404(prefetch_detailed(self.get_queryset()), pk=pk)
+        set_detailed_groups([user])
         serializer = UserProfileDetailedSerializer(user, context={'request': self.request})
-        return Response(serializer.data)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
+
+    @list_route(methods=['get'])
+    def bulk(self, request):
+        """Return the detailed representation of the profiles in `ids`.
+
+        `ids` is a comma separated list of up to BULK_MAX_IDS profile ids.
+        Profiles that do not exist or are not visible are omitted.
+        """
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk]
+        except ValueError:
+            raise ValidationError({'ids': 'A comma separated list of integers is required.'})
+        if not ids:
+            raise ValidationError({'ids': 'At least one id is required.'})
+        if len(ids) > BULK_MAX_IDS:
+            raise ValidationError({'ids': 'At most {0} ids are allowed.'.format(BULK_MAX_IDS)})
+
+        profiles = dict((profile.id, profile) for profile in set_detailed_groups(
+            prefetch_detailed(self.get_queryset().filter(id__in=ids))))
+        profiles = [profiles[pk] for pk in OrderedDict.fromkeys(ids) if pk in profiles]
+        serializer = UserProfileDetailedSerializer(profiles, many=True,
+                                                   context={'request': request})
+        return Response({'results': serializer.data})
+
+    def get_changes_position(self):
+        """Return the position after which the change feed starts."""
+        cursor = self.request.query_params.get('cursor')
+        if cursor:
+            return decode_change_cursor(cursor)
+
+        modified_since = self.request.query_params.get('modified_since')
+        if not modified_since:
+            raise ValidationError({'modified_since': 'Either modified_since or cursor '
+                                                     'is required.'})
+        try:
+            timestamp = parse_datetime(modified_since)
+        except ValueError:
+            timestamp = None
+        if not timestamp:
+            raise ValidationError({'modified_since': 'Invalid ISO 8601 datetime.'})
+        # modified_since is exclusive
+        return timestamp, CHANGE_END, 0
+
+    @list_route(methods=['get'])
+    def changes(self, request):
+        """Return profiles modified or deleted after a point in time.
+
+        Entries are ordered by (timestamp, id) and each page carries an
+        opaque cursor to resume the feed from its last entry. Deleted
+        profiles and profiles that are no longer visible to the caller are
+        reported with `deleted` set to true.
+        """
+        timestamp, rank, pk = self.get_changes_position()
+
+        profile_query = Q(last_updated__gt=timestamp)
+        if rank == CHANGE_PROFILE:
+            profile_query |= Q(last_updated=timestamp, id__gt=pk)
+        profiles = (self.get_queryset().filter(profile_query)
+                    .select_related('user').order_by('last_updated', 'id')
+                    [:CHANGES_PAGE_SIZE])
+
+        tombstone_query = Q(deleted__gt=timestamp)
+        if rank == CHANGE_PROFILE:
+            tombstone_query |= Q(deleted=timestamp)
+        elif rank == CHANGE_TOMBSTONE:
+            tombstone_query |= Q(deleted=timestamp, id__gt=pk)
+        # Same visibility rules as get_queryset()
+        tombstones = UserProfileTombstone.objects.filter(tombstone_query, is_complete=True)
+        if request.privacy_level == PUBLIC:
+            tombstones = tombstones.filter(is_public=True)
+        else:
+            tombstones = tombstones.filter(public_only=False)
+        tombstones = tombstones.order_by('deleted', 'id')[:CHANGES_PAGE_SIZE]
+
+        entries = heapq.merge(
+            ((profile.last_updated, CHANGE_PROFILE, profile.id, profile)
+             for profile in profiles),
+            ((tombstone.deleted, CHANGE_TOMBSTONE, tombstone.id, tombstone)
+             for tombstone in tombstones))
+
+        results = []
+        position = (timestamp, rank, pk)
+        serializer_context = {'request': request}
+        for timestamp, rank, pk, obj in entries:
+            if len(results) == CHANGES_PAGE_SIZE:
+                break
+            if rank == CHANGE_PROFILE:
+                results.append(UserProfileChangeSerializer(obj, context=serializer_context).data)
+            else:
+                results.append({
+                    'id': obj.profile_id,
+                    'username': obj.username,
+                    'last_updated': serializers.DateTimeField().to_representation(timestamp),
+                    'deleted': True,
+                })
+            position = (timestamp, rank, pk)
+
+        cursor = encode_change_cursor(*position)
+        next_url = None
+        if len(results) == CHANGES_PAGE_SIZE:
+            next_url = request.build_absolute_uri(
+                '{0}?{1}'.format(request.path, urlencode({'cursor': cursor})))
+
+        return Response({
+            'cursor': cursor,
+            'next': next_url,
+            'results': results,
+        })
@@ -0,0 +1,58 @@
+"""
+Report the bytes saved by WebP photo variants on the search and group pages.
+
+The first page of vouched profiles with a photo stands for the search
+page and the first page of members of the biggest group for the group
+page. Both render profile photos at 70x70 by default.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from sorl.thumbnail import get_thumbnail
+
+from mozillians.common.templatetags.helpers import IMAGE_VARIANT_FORMATS
+from mozillians.groups.models import GroupMembership
+from mozillians.users.models import UserProfile
+
+
+def page_bytes(profiles, geometry):
+    """Return the total thumbnail size of the profile photos keyed by format."""
+    sizes = dict.fromkeys([image_format for image_format, mime_type in IMAGE_VARIANT_FORMATS], 0)
+    for profile in profiles:
+        source = profile._get_photo_source()
+        for image_format in sizes:
+            thumbnail = get_thumbnail(source, geometry, crop='center', format=image_format)
+            sizes[image_format] += thumbnail.storage.size(thumbnail.name)
+    return sizes
+
+
+class Command(BaseCommand):
+    help = 'Reports the bytes saved per page by WebP profile photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--geometry', default='70x70',
+                            help='Thumbnail geometry, defaults to 70x70.')
+        parser.add_argument('--page-size', default=settings.ITEMS_PER_PAGE, type=int,
+                            help='Number of profiles per page.')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        profiles = UserProfile.objects.vouched().exclude(photo='').order_by('id')
+        pages = [('search', profiles[:page_size])]
+
+        biggest = (GroupMembership.objects.filter(status=GroupMembership.MEMBER)
+                   .values('group').annotate(members=Count('id')).order_by('-members').first())
+        if biggest:
+            members = profiles.filter(groupmembership__group=biggest['group'],
+                                      groupmembership__status=GroupMembership.MEMBER)
+            pages.append(('group', members[:page_size]))
+
+        for name, page in pages:
+            page = list(page)
+            sizes = page_bytes(page, options['geometry'])
+            saved = sizes['JPEG'] - sizes['WEBP']
+            self.stdout.write('{0}: {1} photos, JPEG {2} bytes, WebP {3} bytes, '
+                              'saved {4} bytes ({5:.0%})'.format(
+                                  name, len(page), sizes['JPEG'], sizes['WEBP'], saved,
+                                  float(saved) / sizes['JPEG'] if sizes['JPEG'] else 0))
@@ -0,0 +1,99 @@
+"""
+Export the directory as newline delimited JSON, one profile per line.
+
+Privacy controlled fields are masked according to --privacy-level, the
+same way the API masks them for an application of that level.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from mozillians.users.managers import EMPLOYEES, MOZILLIANS, PRIVATE, PUBLIC
+from mozillians.users.models import UserProfile
+
+
+PRIVACY_LEVELS = {
+    'private': PRIVATE,
+    'employees': EMPLOYEES,
+    'mozillians': MOZILLIANS,
+    'public': PUBLIC,
+}
+
+# Privacy controlled fields, masked by UserProfileValuesIterable
+EXPORT_FIELDS = ('full_name', 'full_name_local', 'ircname', 'bio', 'title', 'story_link',
+                 'timezone', 'date_mozillian', 'country', 'region', 'city')
+GEO_FIELDS = ('country', 'region', 'city')
+
+
+def export_profiles(privacy_level=PUBLIC, chunk_size=2000):
+    """Yield privacy filtered profiles as dictionaries, ordered by id.
+
+    Profiles are fetched with keyset pagination in chunks of chunk_size
+    rows so that memory usage does not depend on the size of the
+    directory.
+    """
+    queryset = UserProfile.objects.complete()
+    if privacy_level == PUBLIC:
+        queryset = queryset.public()
+    fields = ['id', 'is_vouched', 'last_updated', 'privacy_email']
+    for field in EXPORT_FIELDS:
+        fields += [field, 'privacy_{0}'.format(field)]
+    fields += ['{0}__name'.format(field) for field in GEO_FIELDS]
+    values = (queryset.privacy_level(privacy_level).order_by('id')
+              .values(*fields, username=F('user__username'), email=F('user__email')))
+
+    last_id = 0
+    while True:
+        rows = list(values.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            for field in GEO_FIELDS:
+                # Expose the name, unless the masked id shows the field is hidden
+                name = row.pop('{0}__name'.format(field))
+                row[field] = name if row[field] else ''
+            yield dict((key, value) for key, value in row.items()
+                       if not key.startswith('privacy_'))
+        last_id = rows[-1]['id']
+
+
+class Command(BaseCommand):
+    help = 'Exports privacy filtered profiles as newline delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--privacy-level', default='public', choices=sorted(PRIVACY_LEVELS),
+                            help='Privacy level of the export, defaults to public.')
+        parser.add_argument('--chunk-size', default=2000, type=int,
+                            help='Number of profiles fetched per query.')
+        parser.add_argument('--output', default=None,
+                            help='Path of the output file, defaults to stdout.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+
+        output = self.stdout
+        if options['output']:
+            try:
+                output = open(options['output'], 'w')
+            except IOError as e:
+                raise CommandError('Cannot open output file: {0}'.format(e))
+
+        start = time.time()
+        count = 0
+        profiles = export_profiles(PRIVACY_LEVELS[options['privacy_level']],
+                                   options['chunk_size'])
+        try:
+            for profile in profiles:
+                output.write(json.dumps(profile, cls=DjangoJSONEncoder, sort_keys=True) + '\n')
+                count += 1
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        elapsed = time.time() - start
+        self.stderr.write('Exported {0} profiles in {1:.2f}s ({2:.0f} rows/s)'.format(
+            count, elapsed, count / elapsed if elapsed else 0))
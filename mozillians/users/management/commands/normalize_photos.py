@@ -0,0 +1,87 @@
+"""
+Convert legacy RGBA profile photos to RGB JPEG images.
+
+Photos are processed in parallel worker processes and every photo checked
+is recorded in NormalizedPhoto, so an interrupted run resumes where it
+stopped.
+"""
+import time
+from multiprocessing import Pool
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from PIL import Image
+
+from mozillians.users.models import NormalizedPhoto, UserProfile
+
+
+def normalize_photo(name):
+    """Rewrite the photo as an RGB JPEG if it uses the RGBA mode.
+
+    Return a (name, converted) tuple, converted is None when the photo
+    cannot be read.
+    """
+    try:
+        with default_storage.open(name) as photo:
+            image = Image.open(photo)
+            image.load()
+    except IOError:
+        return name, None
+
+    if image.mode != 'RGBA':
+        return name, False
+
+    new_fh = default_storage.open(name, 'w')
+    image.convert('RGB').save(new_fh, 'JPEG')
+    new_fh.close()
+    return name, True
+
+
+def pending_photos():
+    """Return the names of the photos not normalized yet."""
+    done = set(NormalizedPhoto.objects.values_list('photo', flat=True))
+    photos = (UserProfile.objects.exclude(photo='').order_by('photo')
+              .values_list('photo', flat=True).distinct())
+    return [photo for photo in photos if photo not in done]
+
+
+class Command(BaseCommand):
+    help = 'Convert legacy RGBA profile photos to RGB.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4,
+                            help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of photos recorded at once.')
+
+    def handle(self, *args, **options):
+        photos = pending_photos()
+        batch_size = options['batch_size']
+
+        pool = None
+        if options['processes'] > 1:
+            # Workers don't use the database, don't share the connection with them
+            connections.close_all()
+            pool = Pool(options['processes'])
+
+        start = time.time()
+        counts = {True: 0, False: 0, None: 0}
+        try:
+            for offset in range(0, len(photos), batch_size):
+                batch = photos[offset:offset + batch_size]
+                results = pool.map(normalize_photo, batch) if pool else map(normalize_photo, batch)
+                NormalizedPhoto.objects.bulk_create(
+                    [NormalizedPhoto(photo=name, converted=converted)
+                     for name, converted in results])
+                for name, converted in results:
+                    counts[converted] += 1
+                self.stderr.write('{0}/{1} photos'.format(offset + len(batch), len(photos)))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stderr.write('Converted {0} photos, {1} already RGB, {2} unreadable in {3:.2f}s'
+                          .format(counts[True], counts[False], counts[None], time.time() - start))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0037_auto_20180720_0305'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfileTombstone',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('profile_id', models.PositiveIntegerField(db_index=True)),
+                ('username', models.CharField(default=b'', max_length=150, blank=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['deleted', 'id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
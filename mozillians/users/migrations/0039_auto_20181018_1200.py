@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_profile_emails(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    IdpProfile = apps.get_model('users', 'IdpProfile')
+    ExternalAccount = apps.get_model('users', 'ExternalAccount')
+    ProfileEmail = apps.get_model('users', 'ProfileEmail')
+
+    emails = set()
+    sources = [
+        UserProfile.objects.values_list('id', 'user__email'),
+        IdpProfile.objects.values_list('profile_id', 'email'),
+        ExternalAccount.objects.filter(type='EMAIL').values_list('user_id', 'identifier'),
+    ]
+    for source in sources:
+        emails.update((profile_id, email.lower()) for profile_id, email in source if email)
+
+    ProfileEmail.objects.bulk_create(
+        [ProfileEmail(profile_id=profile_id, email=email) for profile_id, email in emails],
+        batch_size=1000)
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0038_auto_20181018_1200'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileEmail',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('email', models.EmailField(max_length=254, db_index=True)),
+                ('profile', models.ForeignKey(related_name='lookup_emails', to='users.UserProfile')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='profileemail',
+            unique_together=set([('profile', 'email')]),
+        ),
+        migrations.RunPython(populate_profile_emails, backwards),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from hashlib import md5
+
+from django.db import migrations, models
+
+
+def populate_gravatar_hashes(apps, schema_editor):
+    UserProfile = apps.get_model('users', 'UserProfile')
+    IdpProfile = apps.get_model('users', 'IdpProfile')
+
+    contact_emails = dict(IdpProfile.objects.filter(primary_contact_identity=True)
+                          .values_list('profile_id', 'email'))
+    for profile_id, email in UserProfile.objects.values_list('id', 'user__email').iterator():
+        email = contact_emails.get(profile_id) or email
+        UserProfile.objects.filter(pk=profile_id).update(gravatar_hash=md5(email).hexdigest())
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0041_auto_20181019_1300'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='gravatar_hash',
+            field=models.CharField(default=b'', max_length=32, editable=False, blank=True),
+        ),
+        migrations.RunPython(populate_gravatar_hashes, backwards),
+    ]
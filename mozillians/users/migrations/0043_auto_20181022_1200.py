@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0042_auto_20181019_1400'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='normalizedphoto',
+            name='converted',
+            field=models.NullBooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0043_auto_20181022_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofiletombstone',
+            name='is_complete',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='userprofiletombstone',
+            name='public_only',
+            field=models.BooleanField(default=False),
+        ),
+    ]
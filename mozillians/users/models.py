@@ -1,6 +1,8 @@
+import json
 import logging
 import os
 import uuid
+from hashlib import md5
 from itertools import chain
 
 from django.conf import settings
@@ -21,7 +23,8 @@ from sorl.thumbnail import ImageField, get_thumbnail
 from django.utils.translation import ugettext as _, ugettext_lazy as _lazy
 
 from mozillians.common import utils
-from mozillians.common.templatetags.helpers import absolutify, gravatar
+from mozillians.common.templatetags.helpers import (absolutify, get_image_variants, gravatar,
+                                                    gravatar_url)
 from mozillians.common.templatetags.helpers import offset_of_timezone
 from mozillians.common.urlresolvers import reverse
 from mozillians.groups.models import (Group, GroupAlias, GroupMembership, Invite,
@@ -40,6 +43,8 @@ from mozillians.users.tasks import send_userprofile_to_cis
 
 COUNTRIES = product_details.get_regions('en-US')
 AVATAR_SIZE = (300, 300)
+# Thumbnails generated in the background when a photo is uploaded
+PHOTO_THUMBNAIL_GEOMETRIES = ('70x70', '160x160', '150x150', '300x300', '500x500')
 logger = logging.getLogger(__name__)
 ProfileManager = Manager.from_queryset(UserProfileQuerySet)
 
@@ -157,12 +162,16 @@ class UserProfile(UserProfilePrivacyModel):
     can_vouch = models.BooleanField(
         default=False,
         help_text='You can edit can_vouch status by editing invidual vouches')
-    last_updated = models.DateTimeField(auto_now=True)
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
     groups = models.ManyToManyField(Group, blank=True, related_name='members',
                                     through=GroupMembership)
     skills = models.ManyToManyField(Skill, blank=True, related_name='members')
     bio = models.TextField(verbose_name=_lazy(u'Bio'), default='', blank=True)
     photo = ImageField(default='', blank=True, upload_to=_calculate_photo_filename)
+    # JSON mapping of the photo name to the urls of its pre-generated thumbnails
+    photo_thumbnails = models.TextField(default='', blank=True, editable=False)
+    # md5 digest of the primary email, kept current by update_gravatar_hash()
+    gravatar_hash = models.CharField(max_length=32, default='', blank=True, editable=False)
     ircname = models.CharField(max_length=63, verbose_name=_lazy(u'IRC Nickname'),
                                default='', blank=True)
 
@@ -282,6 +291,30 @@ class UserProfile(UserProfilePrivacyModel):
         accounts = _getattr('externalaccount_set').filter(type=ExternalAccount.TYPE_EMAIL)
         return self._filter_accounts_privacy(accounts)
 
+    def _api_privacy_filter(self, objects):
+        """Filter related objects by privacy in python.
+
+        Unlike _filter_accounts_privacy() this evaluates related managers
+        with all(), so prefetched objects are used without extra queries.
+        """
+        privacy_level = self._privacy_level
+        return [obj for obj in objects if not privacy_level or obj.privacy >= privacy_level]
+
+    @property
+    def _api_accounts(self):
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        excluded_types = [ExternalAccount.TYPE_WEBSITE, ExternalAccount.TYPE_EMAIL]
+        accounts = [account for account in _getattr('externalaccount_set').all()
+                    if account.type not in excluded_types]
+        return self._api_privacy_filter(accounts)
+
+    @property
+    def _api_websites(self):
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        accounts = [account for account in _getattr('externalaccount_set').all()
+                    if account.type == ExternalAccount.TYPE_WEBSITE]
+        return self._api_privacy_filter(accounts)
+
     @property
     def _api_alternate_emails(self):
         """
@@ -290,19 +323,20 @@ class UserProfile(UserProfilePrivacyModel):
         and ExternalAccount objects. In conflicts/duplicates it returns
         the minimum privacy level defined.
         """
-        legacy_emails_qs = self._alternate_emails
-        idp_qs = self._identity_profiles
-
-        e_exclude = [e.id for e in legacy_emails_qs if
-                     idp_qs.filter(email=e.identifier, privacy__gte=e.privacy).exists()]
-        legacy_emails_qs = legacy_emails_qs.exclude(id__in=e_exclude)
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        legacy_emails = self._api_privacy_filter(
+            [account for account in _getattr('externalaccount_set').all()
+             if account.type == ExternalAccount.TYPE_EMAIL])
+        idps = self._api_privacy_filter(_getattr('idp_profiles').all())
 
-        idp_exclude = [i.id for i in idp_qs if
-                       legacy_emails_qs.filter(identifier=i.email,
-                                               privacy__gte=i.privacy).exists()]
-        idp_qs = idp_qs.exclude(id__in=idp_exclude)
+        legacy_emails = [e for e in legacy_emails
+                         if not any(i.email == e.identifier and i.privacy >= e.privacy
+                                    for i in idps)]
+        idps = [i for i in idps
+                if not any(e.identifier == i.email and e.privacy >= i.privacy
+                           for e in legacy_emails)]
 
-        return chain(legacy_emails_qs, idp_qs)
+        return chain(legacy_emails, idps)
 
     @property
     def _identity_profiles(self):
@@ -329,12 +363,15 @@ class UserProfile(UserProfilePrivacyModel):
         _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
 
         privacy_fields = UserProfile.privacy_fields()
+        # Evaluated with all() so that prefetched identities are used
+        idps = list(_getattr('idp_profiles').all())
+        contact_ids = [idp for idp in idps if idp.primary_contact_identity]
 
         if self._privacy_level:
             # Try IDP contact first
-            if self.idp_profiles.exists():
-                contact_ids = self.identity_profiles.filter(primary_contact_identity=True)
-                if contact_ids.exists():
+            if idps:
+                contact_ids = self._api_privacy_filter(contact_ids)
+                if contact_ids:
                     return contact_ids[0].email
                 return ''
 
@@ -343,8 +380,8 @@ class UserProfile(UserProfilePrivacyModel):
                 return privacy_fields['email']
 
         # In case we don't have a privacy aware attribute access
-        if self.idp_profiles.filter(primary_contact_identity=True).exists():
-            return self.idp_profiles.filter(primary_contact_identity=True)[0].email
+        if contact_ids:
+            return contact_ids[0].email
         return _getattr('user').email
 
     @property
@@ -431,6 +468,26 @@ class UserProfile(UserProfilePrivacyModel):
                 return True
         return False
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(UserProfile, cls).from_db(db, field_names, values)
+        # Remember how the stored profile was visible through the API, so that
+        # a profile dropping out of the change feed can be reported
+        instance._loaded_api_visibility = (None if instance.get_deferred_fields()
+                                           else instance.get_api_visibility())
+        return instance
+
+    def get_api_visibility(self):
+        """Return an (is_complete, is_public) tuple of the profile.
+
+        Same conditions as the complete() and public() queryset methods
+        used by the API.
+        """
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        is_public = any(_getattr('privacy_%s' % field) == PUBLIC
+                        for field in type(self).privacy_fields())
+        return _getattr('full_name') != '', is_public
+
     @property
     def is_manager(self):
         return self.user.is_superuser or self.user.groups.filter(name='Managers').exists()
@@ -489,6 +546,51 @@ class UserProfile(UserProfilePrivacyModel):
         if save:
             self.save()
 
+    def sync_emails(self, create=True):
+        """Sync the ProfileEmail lookup table with the emails of this profile.
+
+        Emails are collected from the user, the identity profiles and the
+        legacy email accounts. With create=False stale emails are only
+        removed, which is safe while related objects are being deleted.
+        """
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        emails = set([_getattr('user').email])
+        emails.update(_getattr('idp_profiles').values_list('email', flat=True))
+        emails.update(_getattr('externalaccount_set').filter(type=ExternalAccount.TYPE_EMAIL)
+                      .values_list('identifier', flat=True))
+        emails = set(email.lower() for email in emails if email)
+
+        existing = set(ProfileEmail.objects.filter(profile=self).values_list('email', flat=True))
+        if existing - emails:
+            ProfileEmail.objects.filter(profile=self, email__in=existing - emails).delete()
+        if create and emails - existing:
+            ProfileEmail.objects.bulk_create([ProfileEmail(profile=self, email=email)
+                                              for email in emails - existing])
+
+    def _compute_gravatar_hash(self):
+        _getattr = (lambda x: super(UserProfile, self).__getattribute__(x))
+        email = None
+        if self.pk:
+            email = (_getattr('idp_profiles').filter(primary_contact_identity=True)
+                     .values_list('email', flat=True).first())
+        return md5(email or _getattr('user').email).hexdigest()
+
+    def update_gravatar_hash(self):
+        """Store the gravatar hash of the primary email if it changed."""
+        gravatar_hash = self._compute_gravatar_hash()
+        if gravatar_hash != super(UserProfile, self).__getattribute__('gravatar_hash'):
+            self.gravatar_hash = gravatar_hash
+            UserProfile.objects.filter(pk=self.pk).update(gravatar_hash=gravatar_hash)
+
+    def _get_gravatar_url(self, size):
+        """Return the gravatar url of the primary email.
+
+        The stored hash is only used when the email is not privacy masked.
+        """
+        if not self._privacy_level and self.gravatar_hash:
+            return gravatar_url(self.gravatar_hash, size=size)
+        return gravatar(self.email, size=size)
+
     def set_membership(self, model, membership_list):
         """Alters membership to Groups and Skills."""
         if model is Group:
@@ -523,26 +625,93 @@ class UserProfile(UserProfilePrivacyModel):
         else:
             m2mfield.add(*groups_to_add)
 
+    def _get_photo_source(self):
+        """Return the image to create thumbnails from.
+
+        Legacy RGBA photos are converted once by the normalize_photos
+        management command. Photos found unreadable by
+        generate_photo_thumbnails() are replaced by the default avatar, the
+        storage is not checked here.
+        """
+        if not self.photo or self._get_stored_photo_thumbnails('unreadable'):
+            return settings.DEFAULT_AVATAR_PATH
+        return self.photo
+
+    def _photo_is_readable(self):
+        """Return True if the photo file can be opened as an image.
+
+        Only used in the background. Photos the normalize_photos command
+        could not read are not opened again.
+        """
+        if NormalizedPhoto.objects.filter(photo=self.photo.name, converted=None).exists():
+            return False
+        try:
+            with default_storage.open(self.photo.name) as photo:
+                Image.open(photo)
+        except (IOError, OSError):
+            return False
+        return True
+
     def get_photo_thumbnail(self, geometry='160x160', **kwargs):
         if 'crop' not in kwargs:
             kwargs['crop'] = 'center'
+        return get_thumbnail(self._get_photo_source(), geometry, **kwargs)
 
-        if self.photo and default_storage.exists(self.photo):
-            # Workaround for legacy images in RGBA model
+    def _get_stored_photo_thumbnails(self, key='urls'):
+        """Return the pre-generated thumbnails of the current photo.
 
-            try:
-                image_obj = Image.open(self.photo)
-            except IOError:
-                return get_thumbnail(settings.DEFAULT_AVATAR_PATH, geometry, **kwargs)
+        key selects the thumbnail urls ('urls') or the image variants
+        ('variants'), both keyed by geometry, or the 'unreadable' flag.
+        """
+        if not self.photo or not self.photo_thumbnails:
+            return {}
+        thumbnails = json.loads(self.photo_thumbnails)
+        if thumbnails.get('photo') != self.photo.name:
+            return {}
+        return thumbnails.get(key, {})
 
-            if image_obj.mode == 'RGBA':
-                new_fh = default_storage.open(self.photo.name, 'w')
-                converted_image_obj = image_obj.convert('RGB')
-                converted_image_obj.save(new_fh, 'JPEG')
-                new_fh.close()
+    def get_photo_thumbnail_url(self, geometry='160x160', **kwargs):
+        """Return the url of a photo thumbnail.
 
-            return get_thumbnail(self.photo, geometry, **kwargs)
-        return get_thumbnail(settings.DEFAULT_AVATAR_PATH.format(), geometry, **kwargs)
+        Pre-generated thumbnails are served without touching the storage.
+        """
+        if not kwargs or kwargs == {'crop': 'center'}:
+            url = self._get_stored_photo_thumbnails().get(geometry)
+            if url:
+                return url
+        return self.get_photo_thumbnail(geometry, **kwargs).url
+
+    def get_photo_variants(self, geometry='160x160'):
+        """Return the pre-generated WebP and JPEG variants of the photo, or None.
+
+        Variants are only generated in the background by
+        generate_photo_thumbnails(), callers fall back to get_photo_url()
+        until then. See get_image_variants() for the format of the result.
+        """
+        return self._get_stored_photo_thumbnails('variants').get(geometry)
+
+    def generate_photo_thumbnails(self):
+        """Generate the thumbnails and variants of the photo and store their urls.
+
+        Missing or unreadable photos get the thumbnails of the default avatar.
+        """
+        if not self.photo:
+            return
+        readable = self._photo_is_readable()
+        source = self.photo if readable else settings.DEFAULT_AVATAR_PATH
+
+        variants = dict((geometry, get_image_variants(source, geometry, crop='center'))
+                        for geometry in PHOTO_THUMBNAIL_GEOMETRIES)
+        urls = dict((geometry, variant['src']) for geometry, variant in variants.items())
+        thumbnails = {'photo': self.photo.name, 'urls': urls, 'variants': variants}
+        if not readable:
+            # Other geometries fall back to the default avatar too
+            thumbnails['unreadable'] = True
+        self.photo_thumbnails = json.dumps(thumbnails)
+        # Skip the post_save signals and ignore the result if the photo
+        # changed in the meantime.
+        (UserProfile.objects.filter(pk=self.pk, photo=self.photo.name)
+         .update(photo_thumbnails=self.photo_thumbnails))
 
     def get_photo_url(self, geometry='160x160', **kwargs):
         """Return photo url.
@@ -553,13 +722,41 @@ class UserProfile(UserProfilePrivacyModel):
         """
         privacy_level = getattr(self, '_privacy_level', MOZILLIANS)
         if (not self.photo and self.privacy_photo >= privacy_level):
-            return gravatar(self.email, size=geometry)
+            return self._get_gravatar_url(geometry)
 
-        photo_url = self.get_photo_thumbnail(geometry, **kwargs).url
+        photo_url = self.get_photo_thumbnail_url(geometry, **kwargs)
         if photo_url.startswith('https://') or photo_url.startswith('http://'):
             return photo_url
         return absolutify(photo_url)
 
+    def get_photo_urls(self, geometries, **kwargs):
+        """Return a dictionary of photo urls keyed by geometry.
+
+        Same as get_photo_url() but the photo is looked up once for all
+        the requested geometries.
+        """
+        privacy_level = getattr(self, '_privacy_level', MOZILLIANS)
+        if (not self.photo and self.privacy_photo >= privacy_level):
+            return dict((geometry, self._get_gravatar_url(geometry)) for geometry in geometries)
+
+        if 'crop' not in kwargs:
+            kwargs['crop'] = 'center'
+        stored = self._get_stored_photo_thumbnails() if kwargs == {'crop': 'center'} else {}
+        source = None
+
+        urls = {}
+        for geometry in geometries:
+            photo_url = stored.get(geometry)
+            if not photo_url:
+                if source is None:
+                    source = self._get_photo_source()
+                photo_url = get_thumbnail(source, geometry, **kwargs).url
+            if photo_url.startswith('https://') or photo_url.startswith('http://'):
+                urls[geometry] = photo_url
+            else:
+                urls[geometry] = absolutify(photo_url)
+        return urls
+
     def is_vouchable(self, voucher):
         """Check whether self can receive a vouch from voucher."""
         # If there's a voucher, they must be able to vouch.
@@ -773,6 +970,10 @@ class UserProfile(UserProfilePrivacyModel):
     def save(self, *args, **kwargs):
         self._privacy_level = None
         autovouch = kwargs.pop('autovouch', True)
+        # Later changes of the primary email are tracked by the User and
+        # IdpProfile signals through update_gravatar_hash()
+        if not self.pk or not super(UserProfile, self).__getattribute__('gravatar_hash'):
+            self.gravatar_hash = self._compute_gravatar_hash()
 
         super(UserProfile, self).save(*args, **kwargs)
         # Auto_vouch follows the first save, because you can't
@@ -863,6 +1064,8 @@ class IdpProfile(models.Model):
         if self.primary_contact_identity:
             profile = self.profile
             profile.privacy_email = self.privacy
+            # The contact email may have changed, don't save back a stale gravatar hash
+            profile.gravatar_hash = profile._compute_gravatar_hash()
             profile.save()
 
     def __unicode__(self):
@@ -908,6 +1111,56 @@ class AbuseReport(models.Model):
     updated = models.DateTimeField(auto_now=True)
 
 
+class UserProfileTombstone(models.Model):
+    """Record of a profile removed from the API v2 change feed.
+
+    The profile was either deleted or hidden from some API keys. The
+    visibility flags describe the profile before its removal, public_only
+    is set when the profile only stopped being public.
+    """
+    profile_id = models.PositiveIntegerField(db_index=True)
+    username = models.CharField(max_length=150, default='', blank=True)
+    is_public = models.BooleanField(default=False)
+    is_complete = models.BooleanField(default=True)
+    public_only = models.BooleanField(default=False)
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted', 'id']
+
+    def __unicode__(self):
+        return u'{0} deleted on {1}'.format(self.username, self.deleted)
+
+
+class ProfileEmail(models.Model):
+    """Indexed lookup of every email address of a profile.
+
+    Kept in sync with User, IdpProfile and email ExternalAccount objects
+    through UserProfile.sync_emails(). Emails are stored lowercase.
+    """
+    profile = models.ForeignKey(UserProfile, related_name='lookup_emails')
+    email = models.EmailField(max_length=254, db_index=True)
+
+    class Meta:
+        unique_together = ('profile', 'email')
+
+    def __unicode__(self):
+        return u'{0}|{1}'.format(self.profile, self.email)
+
+
+class NormalizedPhoto(models.Model):
+    """Record of a profile photo checked by the normalize_photos command.
+
+    converted is None for photos that could not be read.
+    """
+    photo = models.CharField(max_length=255, unique=True)
+    converted = models.NullBooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return self.photo
+
+
 class UsernameBlacklist(models.Model):
     value = models.CharField(max_length=30, unique=True)
     is_regex = models.BooleanField(default=False)
@@ -0,0 +1,168 @@
+from django.db.models import Prefetch
+
+import graphene
+from graphene_django import DjangoObjectType
+
+from mozillians.graphql.utils import get_selected_fields
+from mozillians.groups.models import GroupMembership
+from mozillians.users.managers import PUBLIC
+from mozillians.users.models import ExternalAccount, IdpProfile, UserProfile
+
+
+# Maximum number of profiles returned by a localProfiles query
+LOCAL_PROFILES_LIMIT = 100
+
+
+def get_privacy_level(request):
+    """Return the privacy level of the user performing a GraphQL request."""
+    user = request.user
+    if user.is_authenticated():
+        return user.userprofile.privacy_level
+    return PUBLIC
+
+
+class IdentityType(DjangoObjectType):
+    """Identity provider account of a local profile."""
+
+    provider = graphene.String()
+
+    class Meta:
+        model = IdpProfile
+        name = 'Identity'
+        only_fields = ('email', 'username', 'primary_contact_identity')
+
+    def resolve_provider(self, info, **kwargs):
+        return self.get_type_display()
+
+
+class ExternalAccountType(DjangoObjectType):
+    """External account of a local profile."""
+
+    type = graphene.String()
+    name = graphene.String()
+
+    class Meta:
+        model = ExternalAccount
+        name = 'ExternalAccount'
+        only_fields = ('identifier',)
+
+    def resolve_type(self, info, **kwargs):
+        return self.type.lower()
+
+    def resolve_name(self, info, **kwargs):
+        return self.get_type_display()
+
+
+class GroupMembershipType(DjangoObjectType):
+    """Group membership of a local profile."""
+
+    name = graphene.String()
+
+    class Meta:
+        model = GroupMembership
+        name = 'GroupMembership'
+        only_fields = ('updated_on',)
+
+    def resolve_name(self, info, **kwargs):
+        return self.group.name
+
+
+class LocalProfileType(DjangoObjectType):
+    """Profile stored in mozillians.org, filtered by privacy."""
+
+    username = graphene.String()
+    email = graphene.String()
+    timezone = graphene.String()
+    country = graphene.String()
+    region = graphene.String()
+    city = graphene.String()
+    identities = graphene.List(IdentityType)
+    external_accounts = graphene.List(ExternalAccountType)
+    memberships = graphene.List(GroupMembershipType)
+
+    class Meta:
+        model = UserProfile
+        name = 'LocalProfile'
+        only_fields = ('id', 'full_name', 'full_name_local', 'is_vouched', 'bio', 'ircname',
+                       'title', 'story_link', 'date_mozillian', 'timezone', 'last_updated')
+
+    def resolve_username(self, info, **kwargs):
+        return self.user.username
+
+    def resolve_country(self, info, **kwargs):
+        return self.country.name if self.country else None
+
+    def resolve_region(self, info, **kwargs):
+        return self.region.name if self.region else None
+
+    def resolve_city(self, info, **kwargs):
+        return self.city.name if self.city else None
+
+    def resolve_identities(self, info, **kwargs):
+        return self._api_privacy_filter(self.idp_profiles.all())
+
+    def resolve_external_accounts(self, info, **kwargs):
+        return self._api_accounts
+
+    def resolve_memberships(self, info, **kwargs):
+        if self._privacy_level and self.privacy_groups < self._privacy_level:
+            return []
+        if hasattr(self, '_memberships'):
+            return self._memberships
+        return (self.groupmembership_set.filter(status=GroupMembership.MEMBER)
+                .select_related('group').order_by('group__name'))
+
+
+def optimize_profiles(queryset, fields):
+    """Return queryset with the relations of the selected fields loaded in bulk.
+
+    fields are the GraphQL field names selected on LocalProfile.
+    """
+    select_related = set()
+    prefetch_related = []
+    if fields & set(['username', 'email']):
+        select_related.add('user')
+    for field in ('country', 'region', 'city'):
+        if field in fields:
+            select_related.add(field)
+    if fields & set(['identities', 'email']):
+        prefetch_related.append('idp_profiles')
+    if 'externalAccounts' in fields:
+        prefetch_related.append('externalaccount_set')
+    if 'memberships' in fields:
+        memberships = (GroupMembership.objects.filter(status=GroupMembership.MEMBER)
+                       .select_related('group').order_by('group__name'))
+        prefetch_related.append(Prefetch('groupmembership_set', queryset=memberships,
+                                         to_attr='_memberships'))
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class Query(object):
+    """GraphQL Query class for local profiles."""
+
+    local_profiles = graphene.List(LocalProfileType, username=graphene.String(),
+                                   is_vouched=graphene.Boolean(),
+                                   limit=graphene.Int(), offset=graphene.Int())
+
+    def resolve_local_profiles(self, info, **kwargs):
+        """GraphQL resolver for the local_profiles attribute."""
+        privacy_level = get_privacy_level(info.context)
+        queryset = UserProfile.objects.complete()
+        if privacy_level == PUBLIC:
+            queryset = queryset.public()
+        queryset = queryset.privacy_level(privacy_level)
+
+        if kwargs.get('username'):
+            queryset = queryset.filter(user__username=kwargs['username'])
+        if kwargs.get('is_vouched') is not None:
+            queryset = queryset.filter(is_vouched=kwargs['is_vouched'])
+
+        queryset = optimize_profiles(queryset.order_by('id'), get_selected_fields(info))
+        offset = max(kwargs.get('offset') or 0, 0)
+        limit = min(kwargs.get('limit') or LOCAL_PROFILES_LIMIT, LOCAL_PROFILES_LIMIT)
+        return queryset[offset:offset + limit]
@@ -3,11 +3,14 @@ from django.db.models import signals
 from django.dispatch import receiver
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils.timezone import now
 
 from mozillians.common.utils import bundle_profile_data
-from mozillians.groups.models import Group
-from mozillians.users.models import IdpProfile, UserProfile, Vouch
-from mozillians.users.tasks import subscribe_user_to_basket, unsubscribe_from_basket_task
+from mozillians.groups.models import Group, GroupMembership
+from mozillians.users.models import (ExternalAccount, IdpProfile, Language, UserProfile,
+                                     UserProfileTombstone, Vouch)
+from mozillians.users.tasks import (generate_photo_thumbnails, subscribe_user_to_basket,
+                                    unsubscribe_from_basket_task)
 
 
 # Signal to create a UserProfile.
@@ -57,6 +60,13 @@ def update_basket(sender, instance, **kwargs):
         unsubscribe_from_basket_task.delay(instance.email, newsletters)
 
 
+@receiver(signals.post_save, sender=UserProfile, dispatch_uid='generate_photo_thumbnails_sig')
+def queue_photo_thumbnails(sender, instance, raw, **kwargs):
+    """Generate the thumbnails of a newly uploaded photo in the background."""
+    if not raw and instance.photo and not instance._get_stored_photo_thumbnails():
+        generate_photo_thumbnails.delay(instance.id)
+
+
 @receiver(signals.pre_delete, sender=UserProfile, dispatch_uid='unsubscribe_from_basket_sig')
 def unsubscribe_from_basket(sender, instance, **kwargs):
     newsletters = [settings.BASKET_VOUCHED_NEWSLETTER, settings.BASKET_NDA_NEWSLETTER]
@@ -104,3 +114,107 @@ def add_employee_vouch(sender, instance, **kwargs):
     if kwargs.get('raw') or not instance.email:
         return
     instance.profile.auto_vouch()
+
+
+# Signals related to the API v2 change feed
+@receiver(signals.post_delete, sender=UserProfile, dispatch_uid='create_profile_tombstone_sig')
+def create_profile_tombstone(sender, instance, **kwargs):
+    """Keep a record of deleted profiles so that API consumers can sync deletions."""
+    try:
+        username = instance.user.username
+    except User.DoesNotExist:
+        username = ''
+    is_complete, is_public = instance.get_api_visibility()
+    UserProfileTombstone.objects.create(profile_id=instance.pk, username=username,
+                                        is_public=is_public, is_complete=is_complete)
+
+
+@receiver(signals.post_save, sender=UserProfile,
+          dispatch_uid='create_hidden_profile_tombstone_sig')
+def create_hidden_profile_tombstone(sender, instance, raw, **kwargs):
+    """Keep a record of profiles that are no longer visible to some API keys.
+
+    Profiles become hidden when they are no longer complete, or to public
+    keys when they are no longer public. Changes made through queryset
+    updates are not tracked.
+    """
+    loaded = getattr(instance, '_loaded_api_visibility', None)
+    if raw or not loaded:
+        return
+    was_complete, was_public = loaded
+    is_complete, is_public = instance.get_api_visibility()
+    instance._loaded_api_visibility = (is_complete, is_public)
+
+    if was_complete and not is_complete:
+        public_only = False
+    elif was_complete and was_public and not is_public:
+        public_only = True
+    else:
+        return
+    UserProfileTombstone.objects.create(profile_id=instance.pk, username=instance.user.username,
+                                        is_public=was_public, public_only=public_only)
+
+
+PROFILE_RELATED_FIELDS = {
+    GroupMembership: 'userprofile_id',
+    IdpProfile: 'profile_id',
+    ExternalAccount: 'user_id',
+    Language: 'userprofile_id',
+}
+
+
+def touch_userprofile(sender, instance, **kwargs):
+    """Bump last_updated of the profile owning a changed related object.
+
+    A queryset update is used to avoid the side effects of UserProfile.save().
+    """
+    if kwargs.get('raw'):
+        return
+    profile_id = getattr(instance, PROFILE_RELATED_FIELDS[sender])
+    UserProfile.objects.filter(pk=profile_id).update(last_updated=now())
+
+
+for model in PROFILE_RELATED_FIELDS:
+    name = model.__name__.lower()
+    signals.post_save.connect(touch_userprofile, sender=model,
+                              dispatch_uid='touch_userprofile_{0}_save_sig'.format(name))
+    signals.post_delete.connect(touch_userprofile, sender=model,
+                                dispatch_uid='touch_userprofile_{0}_delete_sig'.format(name))
+
+
+# Signals related to the email lookup table and the gravatar hash of the primary email
+@receiver(signals.post_save, sender=User, dispatch_uid='sync_user_emails_sig')
+def sync_user_emails(sender, instance, raw, update_fields=None, **kwargs):
+    # Skip saves that don't touch the email, like the last_login update on each login
+    if raw or (update_fields is not None and 'email' not in update_fields):
+        return
+    profile = UserProfile.objects.filter(user=instance).first()
+    if profile:
+        profile.sync_emails()
+        profile.update_gravatar_hash()
+
+
+@receiver(signals.post_save, sender=IdpProfile, dispatch_uid='sync_idp_emails_save_sig')
+@receiver(signals.post_save, sender=ExternalAccount, dispatch_uid='sync_account_emails_save_sig')
+def sync_related_emails(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    profile_id = getattr(instance, PROFILE_RELATED_FIELDS[sender])
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile:
+        profile.sync_emails()
+        if sender is IdpProfile:
+            profile.update_gravatar_hash()
+
+
+@receiver(signals.post_delete, sender=IdpProfile, dispatch_uid='sync_idp_emails_delete_sig')
+@receiver(signals.post_delete, sender=ExternalAccount,
+          dispatch_uid='sync_account_emails_delete_sig')
+def remove_related_emails(sender, instance, **kwargs):
+    # Only remove emails, the profile itself might be in the middle of a cascade delete
+    profile_id = getattr(instance, PROFILE_RELATED_FIELDS[sender])
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile:
+        profile.sync_emails(create=False)
+        if sender is IdpProfile:
+            profile.update_gravatar_hash()
@@ -6,6 +6,7 @@ from datetime import timedelta
 from django.conf import settings
 from django.core.mail import send_mail
 from django.core.management import call_command
+from django.db.models import Q
 from django.utils.timezone import now
 
 import basket
@@ -279,6 +280,28 @@ def check_spam_account(instance_id, **kwargs):
         AbuseReport.objects.get_or_create(**kwargs)
 
 
+@app.task
+def generate_photo_thumbnails(instance_id):
+    """Pre-generate the standard thumbnails of a profile photo."""
+    from mozillians.users.models import UserProfile
+
+    profile = get_object_or_none(UserProfile, id=instance_id)
+    if profile and profile.photo:
+        profile.generate_photo_thumbnails()
+
+
+@app.task
+def generate_missing_photo_thumbnails():
+    """Queue thumbnail generation for photos uploaded before pre-generation."""
+    from mozillians.users.models import UserProfile
+
+    missing = Q(photo_thumbnails='') | ~Q(photo_thumbnails__contains='"variants"')
+    profiles = (UserProfile.objects.exclude(photo='').filter(missing)
+                .values_list('id', flat=True))
+    for profile_id in profiles.iterator():
+        generate_photo_thumbnails.delay(profile_id)
+
+
 @app.task
 def delete_reported_spam_accounts():
     """Task to automatically delete spam accounts"""
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
+from datetime import timedelta
+
 from django.http import Http404
 from django.test import RequestFactory
+from django.utils.timezone import now
 
 from mock import ANY, Mock, patch
 from nose.tools import eq_, ok_
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
 
 from mozillians.common.tests import TestCase
 from mozillians.groups.models import Group
 from mozillians.groups.tests import GroupFactory
-from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.managers import MOZILLIANS, PRIVATE, PUBLIC
 from mozillians.users.models import (GroupMembership, ExternalAccount, IdpProfile,
                                      Language, UserProfile)
 from mozillians.users.tests import CityFactory, CountryFactory, RegionFactory, UserFactory
@@ -18,7 +23,9 @@ from mozillians.users.api.v2 import (ExternalAccountSerializer,
                                      UserProfileFilter,
                                      UserProfileSerializer,
                                      UserProfileViewSet,
-                                     WebsiteSerializer)
+                                     WebsiteSerializer,
+                                     prefetch_detailed,
+                                     set_detailed_groups)
 
 
 class ExternalAccountSerializerTests(TestCase):
@@ -103,9 +110,10 @@ class UserProfileDetailedSerializerTests(TestCase):
         user = UserFactory.create(userprofile={'timezone': 'Europe/Athens'})
         user.userprofile._groups = Group.objects.none()
         context = {'request': self.factory.get('/')}
-        get_photo_url_mock = Mock()
-        get_photo_url_mock.side_effect = _get_url
-        user.userprofile.get_photo_url = get_photo_url_mock
+        get_photo_urls_mock = Mock()
+        get_photo_urls_mock.side_effect = lambda geometries: dict(
+            (geometry, _get_url(geometry)) for geometry in geometries)
+        user.userprofile.get_photo_urls = get_photo_urls_mock
         serializer = UserProfileDetailedSerializer(user.userprofile, context=context)
         photo = {'value': '300x300',
                  '150x150': '150x150',
@@ -113,6 +121,7 @@ class UserProfileDetailedSerializerTests(TestCase):
                  '500x500': '500x500',
                  'privacy': 'Mozillians'}
         eq_(serializer.data['photo'], photo)
+        eq_(get_photo_urls_mock.call_count, 1)
 
     def test_get_country(self):
         context = {'request': self.factory.get('/')}
@@ -242,6 +251,31 @@ class UserProfileDetailedSerializerTests(TestCase):
         eq_(serializer.data['alternate_emails'][0]['email'], 'foo@bar.com')
         eq_(serializer.data['alternate_emails'][0]['privacy'], 'Mozillians')
 
+    def test_prefetched_many(self):
+        def _serialize():
+            profiles = set_detailed_groups(prefetch_detailed(UserProfile.objects.all()))
+            return UserProfileDetailedSerializer(profiles, many=True, context=context).data
+
+        context = {'request': self.factory.get('/')}
+        group = GroupFactory.create()
+        user = UserFactory.create()
+        group.add_member(user.userprofile)
+        ExternalAccount.objects.create(type=ExternalAccount.TYPE_EMAIL, user=user.userprofile,
+                                       identifier='foo@bar.com', privacy=MOZILLIANS)
+        with self.assertNumQueries(5):
+            data = _serialize()
+        eq_(data[0]['groups']['value'][0]['name'], group.name)
+        eq_(data[0]['alternate_emails'][0]['email'], 'foo@bar.com')
+
+        for i in range(3):
+            user = UserFactory.create()
+            group.add_member(user.userprofile)
+            IdpProfile.objects.create(profile=user.userprofile, email=user.email,
+                                      auth0_user_id='ad|{0}'.format(user.email),
+                                      primary_contact_identity=True)
+        with self.assertNumQueries(5):
+            eq_(len(_serialize()), 4)
+
 
 class UserProfileViewSetTests(TestCase):
     def test_get_queryset_public(self):
@@ -265,22 +299,186 @@ class UserProfileViewSetTests(TestCase):
         ok_(userprofile_mock.objects.complete.called)
         userprofile_mock.objects.complete().privacy_level.assert_called_with(MOZILLIANS)
 
-    def test_retrieve_base(self):
+    def _get_viewset(self, privacy_level=MOZILLIANS, **headers):
         viewset = UserProfileViewSet()
-        viewset.request = Mock()
-        viewset.request.privacy_level = MOZILLIANS
+        viewset.request = RequestFactory().get('/', **headers)
+        viewset.request.privacy_level = privacy_level
+        return viewset
+
+    def test_retrieve_base(self):
+        viewset = self._get_viewset()
         user = UserFactory.create()
         with patch('mozillians.users.api.v2.UserProfileDetailedSerializer') as serializer_mock:
-            viewset.retrieve(None, user.userprofile.id)
+            viewset.retrieve(viewset.request, user.userprofile.id)
 
         serializer_mock.assert_called_with(user.userprofile, context=ANY)
 
+    def test_retrieve_not_modified(self):
+        user = UserFactory.create()
+        viewset = self._get_viewset()
+        response = viewset.retrieve(viewset.request, user.userprofile.id)
+        eq_(response.status_code, 200)
+        ok_(response['Last-Modified'])
+
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=response['ETag'])
+        with patch('mozillians.users.api.v2.UserProfileDetailedSerializer') as serializer_mock:
+            not_modified = viewset.retrieve(viewset.request, user.userprofile.id)
+        eq_(not_modified.status_code, 304)
+        eq_(not_modified['ETag'], response['ETag'])
+        ok_(not serializer_mock.called)
+
+    def test_retrieve_modified(self):
+        user = UserFactory.create()
+        viewset = self._get_viewset()
+        etag = viewset.retrieve(viewset.request, user.userprofile.id)['ETag']
+
+        group = GroupFactory.create()
+        group.add_member(user.userprofile)
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=etag)
+        response = viewset.retrieve(viewset.request, user.userprofile.id)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_retrieve_group_renamed(self):
+        user = UserFactory.create()
+        group = GroupFactory.create()
+        group.add_member(user.userprofile)
+        viewset = self._get_viewset()
+        etag = viewset.retrieve(viewset.request, user.userprofile.id)['ETag']
+
+        Group.objects.filter(pk=group.pk).update(name='renamed',
+                                                 last_updated=now() + timedelta(seconds=1))
+        viewset = self._get_viewset(HTTP_IF_NONE_MATCH=etag)
+        response = viewset.retrieve(viewset.request, user.userprofile.id)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_etag_privacy_level(self):
+        user = UserFactory.create()
+        viewset = self._get_viewset(privacy_level=MOZILLIANS)
+        etag, _ = viewset.get_validators(user.userprofile.id)
+        viewset = self._get_viewset(privacy_level=PRIVATE)
+        ok_(viewset.get_validators(user.userprofile.id)[0] != etag)
+
     def test_retrieve_non_existent(self):
         viewset = UserProfileViewSet()
         viewset.request = Mock()
         viewset.request.privacy_level = MOZILLIANS
         self.assertRaises(Http404, viewset.retrieve, viewset.request, -1)
 
+    def _get_bulk(self, privacy_level=MOZILLIANS, **params):
+        viewset = UserProfileViewSet()
+        viewset.request = Request(RequestFactory().get('/api/v2/users/bulk/', params))
+        viewset.request.privacy_level = privacy_level
+        return viewset.bulk(viewset.request).data
+
+    def test_bulk(self):
+        profiles = [UserFactory.create().userprofile for i in range(3)]
+        incomplete = UserFactory.create(userprofile={'full_name': ''}).userprofile
+        ids = [profiles[2].id, profiles[0].id, incomplete.id, -1]
+        data = self._get_bulk(ids=','.join(str(pk) for pk in ids))
+        eq_([entry['username'] for entry in data['results']],
+            [profiles[2].user.username, profiles[0].user.username])
+        ok_('alternate_emails' in data['results'][0])
+
+    def test_bulk_invalid_ids(self):
+        self.assertRaises(ValidationError, self._get_bulk)
+        self.assertRaises(ValidationError, self._get_bulk, ids='1,foo')
+        with patch('mozillians.users.api.v2.BULK_MAX_IDS', 2):
+            self.assertRaises(ValidationError, self._get_bulk, ids='1,2,3')
+
+    def _get_changes(self, privacy_level=MOZILLIANS, **params):
+        viewset = UserProfileViewSet()
+        viewset.request = Request(RequestFactory().get('/api/v2/users/changes/', params))
+        viewset.request.privacy_level = privacy_level
+        return viewset.changes(viewset.request).data
+
+    def test_changes_modified_since(self):
+        UserFactory.create()
+        since = now()
+        other = UserFactory.create()
+        data = self._get_changes(modified_since=since.isoformat())
+
+        eq_([entry['id'] for entry in data['results']], [other.userprofile.id])
+        eq_(data['results'][0]['username'], other.username)
+        eq_(data['results'][0]['deleted'], False)
+        eq_(data['next'], None)
+        ok_(data['cursor'])
+
+    def test_changes_cursor(self):
+        since = now()
+        profiles = [UserFactory.create().userprofile for i in range(3)]
+
+        with patch('mozillians.users.api.v2.CHANGES_PAGE_SIZE', 2):
+            data = self._get_changes(modified_since=since.isoformat())
+            eq_([entry['id'] for entry in data['results']], [p.id for p in profiles[:2]])
+            ok_(data['next'])
+
+            data = self._get_changes(cursor=data['cursor'])
+            eq_([entry['id'] for entry in data['results']], [profiles[2].id])
+            eq_(data['next'], None)
+
+            data = self._get_changes(cursor=data['cursor'])
+            eq_(data['results'], [])
+
+    def test_changes_deleted(self):
+        since = now()
+        user = UserFactory.create()
+        profile_id = user.userprofile.id
+        user.delete()
+
+        data = self._get_changes(modified_since=since.isoformat())
+        eq_(data['results'][-1]['id'], profile_id)
+        eq_(data['results'][-1]['deleted'], True)
+        ok_(profile_id not in [entry['id'] for entry in data['results'][:-1]])
+
+    def test_changes_deleted_public(self):
+        since = now()
+        user = UserFactory.create()
+        user.delete()
+
+        data = self._get_changes(privacy_level=PUBLIC, modified_since=since.isoformat())
+        eq_(data['results'], [])
+
+    def test_changes_deleted_incomplete(self):
+        since = now()
+        user = UserFactory.create(userprofile={'full_name': ''})
+        user.delete()
+
+        data = self._get_changes(modified_since=since.isoformat())
+        eq_(data['results'], [])
+
+    def test_changes_incomplete(self):
+        profile = UserFactory.create(userprofile={'privacy_full_name': PUBLIC}).userprofile
+        since = now()
+        profile = UserProfile.objects.get(pk=profile.pk)
+        profile.full_name = ''
+        profile.save()
+
+        for privacy_level in (PUBLIC, MOZILLIANS):
+            data = self._get_changes(privacy_level=privacy_level,
+                                     modified_since=since.isoformat())
+            eq_([(entry['id'], entry['deleted']) for entry in data['results']],
+                [(profile.id, True)])
+
+    def test_changes_not_public(self):
+        profile = UserFactory.create(userprofile={'privacy_full_name': PUBLIC}).userprofile
+        since = now()
+        profile = UserProfile.objects.get(pk=profile.pk)
+        profile.privacy_full_name = MOZILLIANS
+        profile.save()
+
+        data = self._get_changes(privacy_level=PUBLIC, modified_since=since.isoformat())
+        eq_([(entry['id'], entry['deleted']) for entry in data['results']], [(profile.id, True)])
+        data = self._get_changes(privacy_level=MOZILLIANS, modified_since=since.isoformat())
+        eq_([(entry['id'], entry['deleted']) for entry in data['results']],
+            [(profile.id, False)])
+
+    def test_changes_invalid_parameters(self):
+        self.assertRaises(ValidationError, self._get_changes)
+        self.assertRaises(ValidationError, self._get_changes, modified_since='foo')
+        self.assertRaises(ValidationError, self._get_changes, cursor='foo')
+
 
 class UserProfileFilterTest(TestCase):
     def setUp(self):
@@ -319,6 +517,17 @@ class UserProfileFilterTest(TestCase):
         eq_(f.qs.count(), 1)
         eq_(f.qs[0], user.userprofile)
 
+    def test_filter_emails_duplicate(self):
+        request = self.factory.get('/', {'email': 'Foo@bar.com'})
+        user = UserFactory.create(email='foo@bar.com')
+        ExternalAccount.objects.create(user=user.userprofile, type=ExternalAccount.TYPE_EMAIL,
+                                       identifier='foo@bar.com')
+        IdpProfile.objects.create(profile=user.userprofile, auth0_user_id='ad|foo@bar.com',
+                                  email='foo@bar.com')
+        f = UserProfileFilter(request.GET, queryset=UserProfile.objects.all())
+        eq_(f.qs.count(), 1)
+        ok_(not f.qs.query.distinct)
+
     def test_filter_group_member(self):
         request = self.factory.get('/', {'group': 'bar'})
         user = UserFactory.create()
@@ -0,0 +1,98 @@
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+from PIL import Image
+
+from mozillians.common.tests import TestCase
+from mozillians.users.management.commands.export_profiles import export_profiles
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.models import NormalizedPhoto
+from mozillians.users.tests import UserFactory
+
+
+class ExportProfilesTests(TestCase):
+    def test_privacy(self):
+        user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC,
+                                               'privacy_email': MOZILLIANS,
+                                               'privacy_country': PUBLIC})
+        UserFactory.create()
+
+        profiles = list(export_profiles(PUBLIC))
+        eq_(len(profiles), 1)
+        eq_(profiles[0]['username'], user.username)
+        eq_(profiles[0]['full_name'], user.userprofile.full_name)
+        eq_(profiles[0]['email'], '')
+        eq_(profiles[0]['country'], 'Greece')
+        eq_(profiles[0]['city'], '')
+
+        profiles = list(export_profiles(MOZILLIANS))
+        eq_(len(profiles), 2)
+        eq_(profiles[0]['email'], user.email)
+
+    def test_chunks(self):
+        users = [UserFactory.create() for i in range(5)]
+        profiles = list(export_profiles(MOZILLIANS, chunk_size=2))
+        eq_([profile['id'] for profile in profiles],
+            sorted(user.userprofile.id for user in users))
+
+    def test_command(self):
+        UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+        stdout = StringIO()
+        call_command('export_profiles', privacy_level='public', stdout=stdout,
+                     stderr=StringIO())
+        lines = stdout.getvalue().splitlines()
+        eq_(len(lines), 2)
+        keys = set(json.loads(lines[0]).keys())
+        eq_(keys & set(['privacy_full_name', 'country__name']), set())
+
+
+class NormalizePhotosTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def _create_photo(self, mode, name):
+        content = StringIO()
+        Image.new(mode, (10, 10)).save(content, 'PNG')
+        name = default_storage.save(name, ContentFile(content.getvalue()))
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            UserFactory.create(userprofile={'photo': name})
+        return name
+
+    def test_command(self):
+        rgba = self._create_photo('RGBA', 'rgba.png')
+        rgb = self._create_photo('RGB', 'rgb.png')
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            UserFactory.create(userprofile={'photo': 'missing.png'})
+
+        call_command('normalize_photos', processes=1, stderr=StringIO())
+        with default_storage.open(rgba) as photo:
+            eq_(Image.open(photo).mode, 'RGB')
+        eq_(dict(NormalizedPhoto.objects.values_list('photo', 'converted')),
+            {rgba: True, rgb: False, 'missing.png': None})
+
+    @patch('mozillians.users.management.commands.normalize_photos.normalize_photo')
+    def test_resume(self, normalize_mock):
+        normalize_mock.side_effect = lambda name: (name, False)
+        done = self._create_photo('RGB', 'done.png')
+        NormalizedPhoto.objects.create(photo=done)
+        pending = self._create_photo('RGB', 'pending.png')
+
+        call_command('normalize_photos', processes=1, stderr=StringIO())
+        normalize_mock.assert_called_once_with(pending)
+        ok_(NormalizedPhoto.objects.filter(photo=pending).exists())
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
+import json
 import unittest
 from datetime import datetime
+from hashlib import md5
 from uuid import uuid4
 
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, update_last_login
 from django.db.models.query import QuerySet
 from django.test import override_settings
 from django.utils.timezone import make_aware, now
@@ -13,13 +15,15 @@ import pytz
 from mock import Mock, patch
 from nose.tools import eq_, ok_
 
+from mozillians.common.templatetags.helpers import absolutify
 from mozillians.common.tests import TestCase
 from mozillians.groups.models import Group, Skill
 from mozillians.groups.tests import (GroupAliasFactory, GroupFactory,
                                      SkillAliasFactory, SkillFactory)
 from mozillians.users.managers import (EMPLOYEES, MOZILLIANS, PUBLIC, PUBLIC_INDEXABLE_FIELDS)
-from mozillians.users.models import (ExternalAccount, IdpProfile, UserProfile,
-                                     _calculate_photo_filename, Vouch)
+from mozillians.users.models import (ExternalAccount, IdpProfile, NormalizedPhoto,
+                                     ProfileEmail, UserProfile, _calculate_photo_filename,
+                                     Vouch)
 from mozillians.users.tests import UserFactory
 
 
@@ -138,6 +142,43 @@ class SignaledFunctionsTests(TestCase):
         eq_(Vouch.objects.filter(vouchee=user.userprofile).count(), 0)
         eq_(user.userprofile.is_vouched, False)
 
+    def test_sync_emails(self):
+        user = UserFactory.create(email='foo@example.com')
+        profile = user.userprofile
+        idp = IdpProfile.objects.create(profile=profile, auth0_user_id='github|Bar@example.com',
+                                        email='Bar@example.com')
+        account = ExternalAccount.objects.create(user=profile, type=ExternalAccount.TYPE_EMAIL,
+                                                 identifier='foo@example.com')
+        emails = lambda: set(ProfileEmail.objects.filter(profile=profile)
+                             .values_list('email', flat=True))
+        eq_(emails(), set(['foo@example.com', 'bar@example.com']))
+
+        user.email = 'baz@example.com'
+        user.save()
+        eq_(emails(), set(['foo@example.com', 'bar@example.com', 'baz@example.com']))
+
+        account.delete()
+        idp.delete()
+        eq_(emails(), set(['baz@example.com']))
+
+    @patch('mozillians.users.models.UserProfile.sync_emails')
+    def test_sync_emails_skipped_on_login(self, sync_emails_mock):
+        user = UserFactory.create(email='foo@example.com')
+        sync_emails_mock.reset_mock()
+        update_last_login(User, user)
+        ok_(not sync_emails_mock.called)
+
+        user.email = 'bar@example.com'
+        user.save(update_fields=['email'])
+        eq_(sync_emails_mock.call_count, 1)
+
+    def test_sync_emails_profile_delete(self):
+        user = UserFactory.create(email='foo@example.com')
+        IdpProfile.objects.create(profile=user.userprofile, auth0_user_id='github|bar@example.com',
+                                  email='bar@example.com')
+        user.delete()
+        ok_(not ProfileEmail.objects.exists())
+
 
 class UserProfileTests(TestCase):
     @patch('mozillians.users.models.UserProfile.privacy_fields')
@@ -429,13 +470,24 @@ class UserProfileTests(TestCase):
     @patch('mozillians.users.models.Image')
     @patch('mozillians.users.models.get_thumbnail')
     def test_get_photo_thumbnail_with_photo(self, get_thumbnail_mock, mock_image, mock_storage):
-        mock_image_obj = Mock()
-        mock_image_obj.mode = 'RGB'
-        mock_image.open.return_value = mock_image_obj
-        mock_storage.exists.return_value = True
-        user = UserFactory.create(userprofile={'photo': 'foo'})
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            user = UserFactory.create(userprofile={'photo': 'foo'})
+        mock_storage.reset_mock()
         user.userprofile.get_photo_thumbnail(geometry='geo', crop='crop')
         get_thumbnail_mock.assert_called_with('foo', 'geo', crop='crop')
+        # The photo is not checked at render time
+        ok_(not mock_storage.method_calls)
+        ok_(not mock_image.method_calls)
+
+    @override_settings(DEFAULT_AVATAR_PATH='bar')
+    @patch('mozillians.users.models.get_thumbnail')
+    def test_get_photo_thumbnail_unreadable_photo(self, get_thumbnail_mock):
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            user = UserFactory.create(userprofile={
+                'photo': 'foo',
+                'photo_thumbnails': json.dumps({'photo': 'foo', 'unreadable': True})})
+        user.userprofile.get_photo_thumbnail(geometry='geo', crop='crop')
+        get_thumbnail_mock.assert_called_with('bar', 'geo', crop='crop')
 
     @override_settings(DEFAULT_AVATAR_PATH='bar')
     @patch('mozillians.users.models.get_thumbnail')
@@ -450,11 +502,130 @@ class UserProfileTests(TestCase):
         user.userprofile.get_photo_url('80x80', firefox='rocks')
         get_photo_thumbnail_mock.assert_called_with('80x80', firefox='rocks')
 
-    @patch('mozillians.users.models.gravatar')
-    def test_get_photo_url_without_photo(self, gravatar_mock):
+    @patch('mozillians.users.models.default_storage')
+    @patch('mozillians.users.models.Image')
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    @patch('mozillians.users.models.get_thumbnail')
+    def test_generate_photo_thumbnails(self, get_thumbnail_mock, helpers_get_thumbnail_mock,
+                                       mock_image, mock_storage):
+        mock_storage.exists.return_value = True
+        helpers_get_thumbnail_mock.side_effect = (
+            lambda source, geometry, format, **kwargs: Mock(
+                url='/thumbs/{0}.{1}'.format(geometry, format.lower())))
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            user = UserFactory.create(userprofile={'photo': 'foo'})
+        user.userprofile.generate_photo_thumbnails()
+        # Five geometries, in two formats at two pixel densities
+        eq_(helpers_get_thumbnail_mock.call_count, 20)
+
+        profile = UserProfile.objects.get(pk=user.userprofile.pk)
+        helpers_get_thumbnail_mock.reset_mock()
+        mock_storage.reset_mock()
+        eq_(profile.get_photo_thumbnail_url('150x150'), '/thumbs/150x150.jpeg')
+        eq_(profile.get_photo_urls(['160x160', '500x500']),
+            {'160x160': absolutify('/thumbs/160x160.jpeg'),
+             '500x500': absolutify('/thumbs/500x500.jpeg')})
+        eq_(profile.get_photo_variants('70x70'),
+            {'src': '/thumbs/70x70.jpeg',
+             'srcset': {'image/webp': '/thumbs/70x70.webp 1x, /thumbs/140x140.webp 2x',
+                        'image/jpeg': '/thumbs/70x70.jpeg 1x, /thumbs/140x140.jpeg 2x'}})
+        ok_(not get_thumbnail_mock.called)
+        ok_(not helpers_get_thumbnail_mock.called)
+        ok_(not mock_storage.method_calls)
+
+        # Other geometries and stale thumbnails fall back to sorl
+        profile.get_photo_thumbnail_url('80x80')
+        eq_(get_thumbnail_mock.call_count, 1)
+        profile.photo = 'bar'
+        profile.get_photo_thumbnail_url('150x150')
+        eq_(get_thumbnail_mock.call_count, 2)
+        # Variants are only generated in the background
+        eq_(profile.get_photo_variants('150x150'), None)
+        ok_(not helpers_get_thumbnail_mock.called)
+
+    @override_settings(DEFAULT_AVATAR_PATH='bar')
+    @patch('mozillians.users.models.default_storage')
+    @patch('mozillians.users.models.Image')
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    def test_generate_photo_thumbnails_unreadable_photo(self, get_thumbnail_mock, mock_image,
+                                                        mock_storage):
+        mock_storage.exists.return_value = True
+        mock_image.open.side_effect = IOError
+        get_thumbnail_mock.side_effect = (
+            lambda source, geometry, format, **kwargs: Mock(
+                url='/thumbs/{0}-{1}.{2}'.format(source, geometry, format.lower())))
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            user = UserFactory.create(userprofile={'photo': 'foo'})
+        user.userprofile.generate_photo_thumbnails()
+
+        profile = UserProfile.objects.get(pk=user.userprofile.pk)
+        eq_(profile.get_photo_thumbnail_url('150x150'), '/thumbs/bar-150x150.jpeg')
+        with patch('mozillians.users.models.get_thumbnail') as models_get_thumbnail_mock:
+            profile.get_photo_thumbnail_url('80x80')
+        models_get_thumbnail_mock.assert_called_with('bar', '80x80', crop='center')
+
+    @patch('mozillians.users.models.default_storage')
+    @patch('mozillians.common.templatetags.helpers.get_thumbnail')
+    def test_generate_photo_thumbnails_normalized_unreadable(self, get_thumbnail_mock,
+                                                             mock_storage):
+        get_thumbnail_mock.return_value.url = '/default.jpeg'
+        NormalizedPhoto.objects.create(photo='foo', converted=None)
+        with patch('mozillians.users.signals.generate_photo_thumbnails'):
+            user = UserFactory.create(userprofile={'photo': 'foo'})
+        mock_storage.reset_mock()
+        user.userprofile.generate_photo_thumbnails()
+
+        ok_(not mock_storage.open.called)
+        profile = UserProfile.objects.get(pk=user.userprofile.pk)
+        ok_(profile._get_stored_photo_thumbnails('unreadable'))
+
+    @patch('mozillians.users.signals.generate_photo_thumbnails.delay')
+    def test_photo_thumbnails_queued_on_upload(self, task_mock):
+        user = UserFactory.create()
+        ok_(not task_mock.called)
+        user.userprofile.photo = 'foo'
+        user.userprofile.save()
+        task_mock.assert_called_with(user.userprofile.id)
+
+    @patch('mozillians.users.models.gravatar_url')
+    def test_get_photo_url_without_photo(self, gravatar_url_mock):
         user = UserFactory.create()
         user.userprofile.get_photo_url('80x80', firefox='rocks')
-        gravatar_mock.assert_called_with(user.email, size='80x80')
+        gravatar_url_mock.assert_called_with(md5(user.email).hexdigest(), size='80x80')
+
+    @patch('mozillians.users.models.gravatar')
+    def test_get_photo_url_without_photo_masked_email(self, gravatar_mock):
+        user = UserFactory.create(userprofile={'privacy_email': MOZILLIANS,
+                                               'privacy_photo': PUBLIC})
+        profile = UserProfile.objects.privacy_level(PUBLIC).get(pk=user.userprofile.pk)
+        profile.get_photo_url('80x80')
+        gravatar_mock.assert_called_with('', size='80x80')
+
+    def test_gravatar_hash_follows_primary_email(self):
+        user = UserFactory.create(email='foo@example.com')
+        profile = user.userprofile
+        eq_(UserProfile.objects.get(pk=profile.pk).gravatar_hash,
+            md5('foo@example.com').hexdigest())
+
+        IdpProfile.objects.create(profile=profile, email='bar@example.com',
+                                  auth0_user_id='email|bar', primary_contact_identity=True)
+        eq_(UserProfile.objects.get(pk=profile.pk).gravatar_hash,
+            md5('bar@example.com').hexdigest())
+
+        IdpProfile.objects.filter(profile=profile).delete()
+        eq_(UserProfile.objects.get(pk=profile.pk).gravatar_hash,
+            md5('foo@example.com').hexdigest())
+
+    def test_gravatar_hash_not_recomputed_on_save(self):
+        profile = UserFactory.create().userprofile
+        with patch.object(UserProfile, '_compute_gravatar_hash',
+                          return_value=md5('foo').hexdigest()) as compute_mock:
+            profile.save()
+            ok_(not compute_mock.called)
+
+            profile.gravatar_hash = ''
+            profile.save()
+            ok_(compute_mock.called)
 
     def test_is_not_public_indexable(self):
         user = UserFactory.create()
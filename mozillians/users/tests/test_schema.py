@@ -0,0 +1,67 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from nose.tools import eq_, ok_
+
+from mozillians.common.tests import TestCase
+from mozillians.schema import schema
+from mozillians.users import schema as users_schema
+from mozillians.users.managers import MOZILLIANS, PUBLIC
+from mozillians.users.models import IdpProfile
+from mozillians.users.tests import UserFactory
+
+
+class LocalProfilesTests(TestCase):
+    def _execute(self, query, user=None):
+        request = RequestFactory().get('/graphql')
+        request.user = user or AnonymousUser()
+        result = schema.execute(query, context_value=request)
+        ok_(not result.errors, result.errors)
+        return result.data['localProfiles']
+
+    def test_public(self):
+        public = UserFactory.create(userprofile={'privacy_full_name': PUBLIC,
+                                                 'privacy_bio': MOZILLIANS,
+                                                 'bio': 'Secret'})
+        UserFactory.create(userprofile={'privacy_full_name': MOZILLIANS})
+
+        profiles = self._execute('{ localProfiles { username fullName bio } }')
+        eq_(len(profiles), 1)
+        eq_(profiles[0]['username'], public.username)
+        eq_(profiles[0]['fullName'], public.userprofile.full_name)
+        eq_(profiles[0]['bio'], '')
+
+    def test_vouched_user(self):
+        user = UserFactory.create(userprofile={'privacy_bio': MOZILLIANS, 'bio': 'Secret'})
+        profiles = self._execute('{ localProfiles(username: "%s") { bio } }' % user.username,
+                                 user=UserFactory.create(vouched=True))
+        eq_(profiles, [{'bio': 'Secret'}])
+
+    def test_identities_bulk_loaded(self):
+        for i in range(3):
+            user = UserFactory.create(userprofile={'privacy_full_name': PUBLIC})
+            IdpProfile.objects.create(profile=user.userprofile, email='foo%s@example.com' % i,
+                                      auth0_user_id='email|%s' % i, privacy=PUBLIC)
+
+        query = '''
+            { localProfiles { ...Profile } }
+            fragment Profile on LocalProfile { identities { email } }'''
+        with CaptureQueriesContext(connection) as queries:
+            profiles = self._execute(query)
+        eq_(len(profiles), 3)
+        eq_(len(queries), 2)
+        eq_(sorted(profile['identities'][0]['email'] for profile in profiles),
+            ['foo0@example.com', 'foo1@example.com', 'foo2@example.com'])
+
+    def test_limit(self):
+        UserFactory.create_batch(3, userprofile={'privacy_full_name': PUBLIC})
+        eq_(len(self._execute('{ localProfiles(limit: 2) { username } }')), 2)
+        eq_(len(self._execute('{ localProfiles(limit: 2, offset: 2) { username } }')), 1)
+
+    def test_optimize_profiles(self):
+        queryset = users_schema.optimize_profiles(users_schema.UserProfile.objects.all(),
+                                                  set(['username', 'city', 'identities']))
+        eq_(set(queryset.query.select_related), set(['user', 'city']))
+        eq_(queryset._prefetch_related_lookups, ('idp_profiles',))
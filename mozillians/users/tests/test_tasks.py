@@ -12,6 +12,7 @@ from nose.tools import eq_, ok_
 from mozillians.common.tests import TestCase
 from mozillians.users.models import AbuseReport
 from mozillians.users.tasks import (delete_reported_spam_accounts,
+                                    generate_missing_photo_thumbnails,
                                     lookup_user_task, remove_incomplete_accounts,
                                     subscribe_user_task, subscribe_user_to_basket,
                                     unsubscribe_from_basket_task,
@@ -42,6 +43,18 @@ class IncompleteAccountsTests(TestCase):
         ok_(not User.objects.filter(id=incomplete_user_old.id).exists())
 
 
+class PhotoThumbnailsTests(TestCase):
+    @patch('mozillians.users.tasks.generate_photo_thumbnails.delay')
+    def test_generate_missing_photo_thumbnails(self, task_mock):
+        with_photo = UserFactory.create(userprofile={'photo': 'foo'})
+        UserFactory.create(userprofile={'photo': 'bar', 'photo_thumbnails': '{"variants": {}}'})
+        UserFactory.create()
+        task_mock.reset_mock()
+
+        generate_missing_photo_thumbnails()
+        task_mock.assert_called_once_with(with_photo.userprofile.id)
+
+
 class BasketTests(TestCase):
 
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)